@@ -0,0 +1,204 @@
+"""
+Distributed evaluation of policy configurations over several hosts, through a job queue in a shared
+directory (see Utils.job_queue). Every job is one (policy, configuration, day), as in Sweep.py.
+
+    python Distributed.py submit  --spool DIR [--days N]              publishes the jobs of Sweep.CONFIGURATIONS
+    python Distributed.py worker  --spool DIR                         runs jobs until stopped (any number, on any host)
+    python Distributed.py collect --spool DIR                         waits for every job and writes the sweep table
+    python Distributed.py local   --spool DIR [--days N] [--workers K]  all of the above with K workers on this host
+
+Workers can be stopped or killed at any time: their job goes back to the queue when its heartbeat stops,
+and submitting again only adds the jobs that are not already in the spool. A job whose run raises an error,
+or that is claimed job_queue.MAX_ATTEMPTS times without finishing, is recorded in failed/ with the error, and
+collect leaves its day out of the table (and lists it).
+"""
+
+from Environment import LOG_FIELDS, merge_results
+from Sweep import CONFIGURATIONS, N_EXPERIMENTS, SEED, check_configurations, run_configuration, summarize_configuration
+from Utils import job_queue
+
+from pathlib import Path
+import argparse
+import json
+import subprocess
+import sys
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+HEARTBEAT_INTERVAL = 10.0  # seconds between heartbeats of a running job
+STALE_TIMEOUT      = 120.0 # seconds without heartbeat before a job is given to another worker
+POLL_INTERVAL      = 1.0   # seconds between checks of an empty queue
+
+
+def make_jobs(configurations, n_experiments, seed=None, scenario_directory=None):
+    """One job per configuration and day, with a job id that identifies both."""
+    return [
+        {
+            "job_id": f"config{config_index:03d}_day{day:05d}",
+            "config_index": config_index,
+            "policy": policy.__name__,
+            "overrides": overrides,
+            "day": day,
+            "seed": seed,
+            "scenario_directory": scenario_directory
+        }
+        for config_index, (policy, overrides) in enumerate(configurations)
+        for day in range(n_experiments)
+    ]
+
+
+def submit(spool_dir, configurations, n_experiments, seed=None, scenario_directory=None):
+    """Publishes the jobs and records their ids in the manifest of the spool (used by collect)."""
+    check_configurations(configurations)
+    jobs = make_jobs(configurations, n_experiments, seed, scenario_directory)
+
+    spool_dir = job_queue.create_spool(spool_dir)
+    manifest_path = spool_dir / "manifest.json"
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else []
+    manifest = sorted(set(manifest) | {job["job_id"] for job in jobs})
+    manifest_path.write_text(json.dumps(manifest))
+
+    submitted = job_queue.submit_jobs(spool_dir, jobs)
+    print(f"{submitted} new jobs submitted to {spool_dir} ({len(jobs) - submitted} already there)")
+
+
+def results_to_json(job, results):
+    """JSON-serializable result of a job (the results of run_environment for its day)."""
+    return {
+        **job,
+        "days": np.asarray(results["days"]).tolist(),
+        "objectives": np.asarray(results["objectives"]).tolist(),
+        "logs": {field: values.tolist() for field, values in results["logs"].items()},
+        "timings": results["timings"]
+    }
+
+
+def results_from_json(result):
+    """Inverse of results_to_json: the results of run_environment for the day of the job."""
+    return {
+        "days": np.asarray(result["days"], dtype=int),
+        "objectives": np.asarray(result["objectives"], dtype=float),
+        "logs": {field: np.asarray(result["logs"][field], dtype=dtype) for field, dtype in LOG_FIELDS.items()},
+        "timings": result["timings"]
+    }
+
+
+def run_worker(spool_dir, exit_when_idle=False):
+    """
+    Claims and runs jobs until stopped. With exit_when_idle=True, returns when no job is pending or running.
+    Stale jobs (of crashed workers) are requeued by every idle worker, so no coordinator has to be running.
+    """
+    worker = job_queue.worker_id()
+    print(f"Worker {worker} polling {spool_dir}")
+
+    while True:
+        job_queue.requeue_stale_jobs(spool_dir, STALE_TIMEOUT)
+        job = job_queue.claim_job(spool_dir)
+
+        if job is None:
+            counts = job_queue.count_jobs(spool_dir)
+            if exit_when_idle and counts["pending"] == 0 and counts["running"] == 0:
+                print(f"Worker {worker}: queue empty, exiting")
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        print(f"Worker {worker}: {job['job_id']} (attempt {job['attempts']})", flush=True)
+        try:
+            with job_queue.Heartbeat(spool_dir, job["job_id"], HEARTBEAT_INTERVAL):
+                _, results = run_configuration(
+                    job["policy"], job["overrides"], job["day"], job["day"] + 1,
+                    seed=job["seed"], scenario_directory=job["scenario_directory"]
+                )
+        except Exception:
+            print(f"Worker {worker}: {job['job_id']} failed", flush=True)
+            job_queue.fail_job(spool_dir, job, traceback.format_exc())
+            continue
+        job_queue.complete_job(spool_dir, job["job_id"], results_to_json(job, results))
+
+
+def collect(spool_dir, confidence=0.95):
+    """
+    Waits until every job of the manifest is done or failed (requeuing the jobs of crashed workers meanwhile),
+    then returns the sweep table with one row per configuration, as Sweep.run_sweep, over the days that are done.
+    """
+    spool_dir = Path(spool_dir)
+    job_ids = json.loads((spool_dir / "manifest.json").read_text())
+
+    while True:
+        job_queue.requeue_stale_jobs(spool_dir, STALE_TIMEOUT)
+        missing = [
+            job_id for job_id in job_ids
+            if not any((spool_dir / subdirectory / f"{job_id}.json").exists() for subdirectory in ("done", "failed"))
+        ]
+        if not missing:
+            break
+        print(f"Waiting for {len(missing)} of {len(job_ids)} jobs ({job_queue.count_jobs(spool_dir)})", flush=True)
+        time.sleep(max(POLL_INTERVAL, 5.0))
+
+    # Group the days of every configuration (job ids sort by configuration, then day)
+    configurations = {}
+    for job_id in job_ids:
+        result = job_queue.load_result(spool_dir, job_id)
+        if result is None:
+            failure = job_queue.load_result(spool_dir, job_id, "failed")
+            print(f"Job {job_id} failed on {failure['worker']} (left out):\n{failure['error']}")
+            continue
+        configuration = configurations.setdefault(result["config_index"], (result["policy"], result["overrides"], []))
+        configuration[2].append(results_from_json(result))
+
+    rows = []
+    for config_index in sorted(configurations):
+        policy_name, overrides, day_results = configurations[config_index]
+        _, results = merge_results(day_results)
+        rows.append(summarize_configuration(policy_name, overrides, results, confidence))
+
+    return pd.DataFrame(rows)
+
+
+def run_local(spool_dir, configurations, n_experiments, n_workers, seed=None):
+    """Submits the jobs, runs n_workers worker processes on this host and collects the results."""
+    submit(spool_dir, configurations, n_experiments, seed)
+
+    workers = [
+        subprocess.Popen([sys.executable, __file__, "worker", "--spool", str(spool_dir), "--exit-when-idle"])
+        for _ in range(n_workers)
+    ]
+    try:
+        table = collect(spool_dir)
+    finally:
+        for worker in workers:
+            worker.wait()
+
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed evaluation through a job queue in a shared directory")
+    parser.add_argument("mode", choices=["submit", "worker", "collect", "local"])
+    parser.add_argument("--spool", required=True, help="spool directory shared by all the hosts")
+    parser.add_argument("--days", type=int, default=N_EXPERIMENTS, help="number of days per configuration")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workers", type=int, default=2, help="worker processes (local mode)")
+    parser.add_argument("--exit-when-idle", action="store_true", help="worker stops when the queue is empty")
+    parser.add_argument("--output", default="results/sweep.csv")
+    args = parser.parse_args()
+
+    if args.mode == "submit":
+        submit(args.spool, CONFIGURATIONS, args.days, args.seed)
+
+    elif args.mode == "worker":
+        run_worker(args.spool, exit_when_idle=args.exit_when_idle)
+
+    else:
+        if args.mode == "local":
+            sweep_table = run_local(args.spool, CONFIGURATIONS, args.days, args.workers, args.seed)
+        else:
+            sweep_table = collect(args.spool)
+
+        sweep_table.to_csv(args.output, index=False)
+        print(sweep_table.to_string(index=False))
+        print(f"\nSweep saved to {args.output}")
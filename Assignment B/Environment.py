@@ -1,4 +1,4 @@
-from Utils import v2_SystemCharacteristics, v2_Checks, plotting
+from Utils import v2_SystemCharacteristics, v2_Checks, plotting, checkpoint, dataset, seeding, timing
 import numpy as np
 import warnings
 import sys
@@ -115,22 +115,202 @@ def verify_heater_actions(decision_P, data, temperature_room, is_override_room,
         sys.exit(1)
     
 
+def update_overrule_controler_states(overrule_states, temperatures, data):
+    """
+    Vectorized version of update_overrule_controler_state, for a batch of days.
+    An active controller stays on while the temperature is below the OK threshold,
+    an inactive controller turns on when the temperature drops below the minimum comfort threshold.
+    Inputs:
+    - overrule_states: boolean array with the current state of the overrule controller of each day
+    - temperatures: array with the current temperature of each day
+    - data: system data dictionary containing the thresholds
+    """
+    return np.where(
+        overrule_states,
+        temperatures < data["temp_OK_threshold"],
+        temperatures < data["temp_min_comfort_threshold"]
+    )
+
+
+def verify_ventilation_actions_batch(decision_V, data, humidity, vent_counter, VENT_MIN_UP_TIME, days):
+    """
+    Vectorized version of verify_ventilation_actions, for a batch of days.
+    Terminates the program at the first day whose ventilation action does not comply with the overrule controller.
+    """
+    forced_on = (humidity > data["humidity_threshold"]) | ((0 < vent_counter) & (vent_counter < VENT_MIN_UP_TIME))
+    V = np.where(forced_on, 1, decision_V)
+
+    illegal = np.flatnonzero(decision_V != V)
+    if illegal.size > 0:
+        i = illegal[0]
+        print(f"\nIllegal ventilation action on day {days[i] + 1}")
+        verify_ventilation_actions(decision_V[i], data, humidity[i], vent_counter[i], VENT_MIN_UP_TIME)
+
+
+def verify_heater_actions_batch(decision_P, data, temperature_room, is_override_room, HEATING_MAX_POWER, days):
+    """
+    Vectorized version of verify_heater_actions, for a batch of days.
+    Terminates the program at the first day whose heating action does not comply with the overrule controllers.
+    """
+    P = np.where(is_override_room, HEATING_MAX_POWER, decision_P)
+    P = np.where(temperature_room >= data["temp_max_comfort_threshold"], 0, P)
+
+    illegal = np.flatnonzero(decision_P != P)
+    if illegal.size > 0:
+        i = illegal[0]
+        print(f"\nIllegal heating action on day {days[i] + 1}")
+        verify_heater_actions(decision_P[i], data, temperature_room[i], is_override_room[i], HEATING_MAX_POWER)
+
+
+def load_simulation_data(scenario_directory=None):
+    """
+    Loads the occupancy and price matrices of the evaluation days (memory-mapped from the binary cache),
+    or of the days generated in scenario_directory by Utils.scenario_generator.
+    Returns (occupancy1_matrix, occupancy2_matrix, price_data), where the first column of price_data
+    holds the previous price at the first timeslot of each day.
+    """
+    if scenario_directory is None:
+        simulation_data = dataset.load_dataset(DATA_DIRECTORY)
+    else:
+        simulation_data = dataset.load_generated_dataset(scenario_directory)
+
+    return simulation_data["occupancy1"], simulation_data["occupancy2"], simulation_data["price_data"]
+
+
+def print_daily_summary(day, objective_value, running_mean, oih_daily_costs):
+    """
+    Prints the daily cost of the policy next to the OIH cost of the same day,
+    and terminates the program if the policy beats the OIH (which should be impossible).
+    Days without OIH cost (oih_daily_costs is None for generated days) only print the policy's cost.
+    """
+    if oih_daily_costs is None:
+        print(
+            f"Day {day + 1:>3}: "
+            f"daily cost = {objective_value:>7.2f}"
+            f" | running average = {running_mean:>7.2f}",
+            flush=True
+        )
+        return
+
+    # Deviation from OIH cost in percentage (How much margin of improvement is left compared to OIH, in percentage)
+    deviation = ((round(objective_value, 2) - round(oih_daily_costs[day], 2))/round(oih_daily_costs[day], 2))*100
+
 
-def run_environment(policy, start, end, plot=False):  
+    print(
+        f"Day {day + 1:>3}: "
+        f"daily cost = {objective_value:>7.2f}"
+        f" | Improvement margin = {deviation:>7.2f}%"
+        f" | OIH daily cost = {oih_daily_costs[day]:>7.2f}"
+        f" | running average = {running_mean:>7.2f}",
+        flush=True
+    )
+
+    if round(objective_value, 2) < round(oih_daily_costs[day], 2):
+        print("\nSomething went wrong, the policy's daily cost is below the OIH cost, which should be impossible")
+        sys.exit(1)
+
+
+# Fields of the hourly logs, stored as preallocated (days, hours) arrays
+LOG_FIELDS = {
+    "V"    : np.int8,
+    "P1"   : np.float64,
+    "P2"   : np.float64,
+    "T1"   : np.float64,
+    "T2"   : np.float64,
+    "H"    : np.float64,
+    "price": np.float64,
+    "occ1" : np.float64,
+    "occ2" : np.float64,
+    "cost" : np.float64
+}
+
+
+def allocate_logs(num_days):
+    """Returns the hourly logs of num_days days, one (num_days, NUM_TIMESLOTS) array per field of LOG_FIELDS."""
+    return {field: np.zeros((num_days, NUM_TIMESLOTS), dtype=dtype) for field, dtype in LOG_FIELDS.items()}
+
+
+def get_day_log(logs, i):
+    """Returns the log of the i-th day of the logs as a dictionary of hourly arrays (as used by the plots and the checkpoints)."""
+    day_log = {field: values[i] for field, values in logs.items()}
+    day_log["hour"] = np.arange(NUM_TIMESLOTS)
+    return day_log
+
+
+def merge_results(results_list):
+    """
+    Concatenates the result dictionaries of several runs of run_environment (e.g. one per worker).
+    Returns the average daily cost and the merged dictionary of results.
+    """
+    merged = {
+        "days": np.concatenate([results["days"] for results in results_list]),
+        "objectives": np.concatenate([results["objectives"] for results in results_list]),
+        "logs": {
+            field: np.concatenate([results["logs"][field] for results in results_list])
+            for field in results_list[0]["logs"]
+        },
+        "timings": [record for results in results_list for record in results.get("timings", [])]
+    }
+
+    return np.mean(merged["objectives"]), merged
+
+
+def plot_day(day, day_log, price_series, data):
+    """Plots the log of a day with the comfort and humidity thresholds."""
+    temp_thresholds = (
+        data["temp_min_comfort_threshold"],
+        data["temp_OK_threshold"]
+    )
+
+    humidity_threshold = data.get("humidity_threshold", None)
+
+    plotting.plot_experiment(
+        day,
+        day_log,
+        price_series=price_series,
+        temp_thresholds=temp_thresholds,
+        humidity_threshold=humidity_threshold
+    )
+
+
+def run_environment(policy, start, end, plot=False, checkpoint_dir=None, scenario_directory=None, seed=None, hard_timeout=False):
     """
     Run the environment simulation for a given policy.
     Prints the running average daily cost during the simulation.
+    If checkpoint_dir is given, every completed day is appended to a checkpoint in that directory,
+    and the days already found there (from a previous run that crashed) are not simulated again
+    (a ValueError is raised if they were simulated with other settings, see Utils.checkpoint).
+    If scenario_directory is given, the days are read (lazily) from the scenarios generated there
+    by Utils.scenario_generator instead of the evaluation dataset.
+    If seed is given, the policy call of every day and hour gets its own random stream spawned from this
+    master seed (see Utils.seeding): the run is the same whatever the days simulated before (so parallel
+    runs match sequential ones) and different policies are evaluated with common random numbers.
+    If hard_timeout is True, the policy runs in a supervised subprocess that is killed when a decision
+    exceeds the time limit (see v2_Checks.SupervisedPolicy), instead of waiting for the late decision.
+    Returns the average daily cost and a dictionary with the simulated "days", their "objectives",
+    the hourly "logs" (one (days, hours) array per field of LOG_FIELDS) and the "timings" of the
+    policy calls (see Utils.timing, days resumed from a checkpoint have none).
     """
-    # Import OIH results for comparison
-    oih_daily_costs = np.genfromtxt("results/OIH_daily_costs.csv", delimiter=",")
+    timing.pop_records() # discard the decisions timed outside of this run
+
+    # Import OIH results for comparison (only known for the evaluation dataset)
+    oih_daily_costs = dataset.load_matrix("results/OIH_daily_costs.csv", skip_header=0) if scenario_directory is None else None
 
     # Import data
     data = v2_SystemCharacteristics.get_fixed_data()
-    occupancy1_matrix = np.genfromtxt(DATA_DIRECTORY + "OccupancyRoom1.csv", delimiter=",", skip_header=1)
-    occupancy2_matrix = np.genfromtxt(DATA_DIRECTORY + "OccupancyRoom2.csv", delimiter=",", skip_header=1)
-    price_data        = np.genfromtxt(DATA_DIRECTORY + "v2_PriceData.csv"  , delimiter=",", skip_header=1)
+    occupancy1_matrix, occupancy2_matrix, price_data = load_simulation_data(scenario_directory)
 
-    # Vector with initial values of price data
+    # Days completed by a previous run with the same settings
+    if checkpoint_dir:
+        checkpoint.open_checkpoint(checkpoint_dir, checkpoint.run_metadata(policy, scenario_directory, seed))
+    completed_days = checkpoint.load_checkpoint(checkpoint_dir) if checkpoint_dir else {}
+    if any(start <= day < end for day in completed_days):
+        print(f"Resuming from checkpoint in {checkpoint_dir}")
+
+    if hard_timeout:
+        policy = v2_Checks.SupervisedPolicy(policy)
+
+    # Vector with initial values of price data (views of the memory-mapped data, rows are only read when used)
     initial_previous_prices = price_data[:, 0]
 
     # Matrix with rest of price data
@@ -140,31 +320,25 @@ def run_environment(policy, start, end, plot=False):
     outside_temperature_vector = data["outdoor_temperature"]
 
     # Logs and results storage
-    daily_objective_values = []
-    daily_logs = [] 
+    days = np.arange(start, end)
+    daily_objective_values = np.zeros(len(days))
+    logs = allocate_logs(len(days))
          
     # Simulation
-    for day in range(start, end): 
+    for i, day in enumerate(days): 
+        if day in completed_days:
+            objective_value, day_log = completed_days[day]
+            daily_objective_values[i] = objective_value
+            for field in LOG_FIELDS:
+                logs[field][i] = day_log[field]
+            print_daily_summary(day, objective_value, np.mean(daily_objective_values[:i + 1]), oih_daily_costs)
+            continue
+
         vent_counter = 0
         is_override_room1 = False
         is_override_room2 = False
         objective_value = 0
 
-        day_log = {
-            "hour": [],
-            "V": [],
-            "P1": [],
-            "P2": [],
-            "T1": [],
-            "T2": [],
-            "H": [],
-            "objective": [],
-            "price": [],
-            "occ1": [],
-            "occ2": [],
-            "cost": []
-        }
-
         for hour in range(NUM_TIMESLOTS):
             if hour == 0:
                 previous_price = initial_previous_prices[day]
@@ -244,6 +418,9 @@ def run_environment(policy, start, end, plot=False):
 
 
             # Evaluate policy's decisions
+            if seed is not None:
+                seeding.seed_policy_call(seed, day, hour)
+
             POWER_MAX = {1: HEATING_MAX_POWER, 2: HEATING_MAX_POWER}
             decision = v2_Checks.check_and_sanitize_action(policy, state, POWER_MAX) # change the input of the policy to just receive the state and day, not the whole data dictionary, and change the policy's expected input accordingly in all policies
 
@@ -264,68 +441,383 @@ def run_environment(policy, start, end, plot=False):
             objective_value += hourly_cost
 
             # Save hourly logs
-            day_log["hour"].append(hour)
-            day_log["V"].append(V)
-            day_log["P1"].append(P1)
-            day_log["P2"].append(P2)
-            day_log["T1"].append(temperature_room1)
-            day_log["T2"].append(temperature_room2)
-            day_log["H"].append(humidity)
-            day_log["objective"].append(hourly_cost)
-            day_log["price"].append(state["price_t"])
-            day_log["occ1"].append(state["Occ1"])
-            day_log["occ2"].append(state["Occ2"])
-            day_log["cost"].append(hourly_cost)
+            logs["V"][i, hour]     = V
+            logs["P1"][i, hour]    = P1
+            logs["P2"][i, hour]    = P2
+            logs["T1"][i, hour]    = temperature_room1
+            logs["T2"][i, hour]    = temperature_room2
+            logs["H"][i, hour]     = humidity
+            logs["price"][i, hour] = state["price_t"]
+            logs["occ1"][i, hour]  = state["Occ1"]
+            logs["occ2"][i, hour]  = state["Occ2"]
+            logs["cost"][i, hour]  = hourly_cost
 
 
-        # Collect daily logs
-        daily_objective_values.append(objective_value)
-        daily_logs.append({"day": day, "log": day_log})
+        # Collect daily results
+        daily_objective_values[i] = objective_value
+
+        if checkpoint_dir:
+            checkpoint.append_day(checkpoint.checkpoint_file(checkpoint_dir, start, end), day, objective_value, get_day_log(logs, i))
 
 
         # Show daily results and plots
-        running_mean = np.mean(daily_objective_values)
+        running_mean = np.mean(daily_objective_values[:i + 1])
+        print_daily_summary(day, objective_value, running_mean, oih_daily_costs)
 
-        # Deviation from OIH cost in percentage (How much margin of improvement is left compared to OIH, in percentage)
-        deviation = ((round(objective_value, 2) - round(oih_daily_costs[day], 2))/round(oih_daily_costs[day], 2))*100
+        if plot:
+            plot_day(day, get_day_log(logs, i), price_matrix[day][:NUM_TIMESLOTS], data)
 
+    
+    if hard_timeout:
+        print(f"Policy calls preempted: {policy.timeouts}")
+        policy.close()
 
-        print(
-            f"Day {day + 1:>3}: "
-            f"daily cost = {objective_value:>7.2f}"
-            f" | Improvement margin = {deviation:>7.2f}%"
-            f" | OIH daily cost = {oih_daily_costs[day]:>7.2f}"
-            f" | running average = {running_mean:>7.2f}",
-            flush=True
-        )
+    seeding.set_call_rng(None) # later calls outside of this run use the global NumPy RNG again
+
+    # Calculate average objective value across experiments
+    avg_objective_value = np.mean(daily_objective_values)
+
+    return avg_objective_value, {
+        "days": days,
+        "objectives": daily_objective_values,
+        "logs": logs,
+        "timings": timing.pop_records()
+    }
 
-        if round(objective_value, 2) < round(oih_daily_costs[day], 2):
-            print("\nSomething went wrong, the policy's daily cost is below the OIH cost, which should be impossible")
-            sys.exit(1)
 
-        if plot:
-            temp_thresholds = (
-                data["temp_min_comfort_threshold"],
-                data["temp_OK_threshold"]
-            )
+def select_actions_batch(policy, states, POWER_MAX):
+    """
+    Asks the policy for the decisions of every day in the batch.
+    Policies exposing select_actions(states) are called once for all days, with a dictionary of arrays
+    (same keys as the scalar state). Scalar policies are called day by day with the usual state dictionary.
+    Returns the arrays (V, P1, P2).
+    """
+    if hasattr(policy, "select_actions"):
+        decision = v2_Checks.check_and_sanitize_actions(policy, states, POWER_MAX)
+        return decision["VentilationON"], decision["HeatPowerRoom1"], decision["HeatPowerRoom2"]
+
+    # Adapter for scalar policies
+    num_days = len(states["T1"])
+    V  = np.zeros(num_days, dtype=int)
+    P1 = np.zeros(num_days)
+    P2 = np.zeros(num_days)
+
+    for i in range(num_days):
+        state = {
+            key: (values[i].item() if isinstance(values, np.ndarray) else values)
+            for key, values in states.items()
+        }
+        decision = v2_Checks.check_and_sanitize_action(policy, state, POWER_MAX)
+
+        V[i]  = decision["VentilationON"]
+        P1[i] = decision["HeatPowerRoom1"]
+        P2[i] = decision["HeatPowerRoom2"]
+
+    return V, P1, P2
+
+
+def run_environment_batch(policy, start, end, plot=False, scenario_directory=None):
+    """
+    Batch version of run_environment: all the days in [start, end) are simulated at once,
+    advancing every day one hour at a time with vectorized dynamics, overrule checks and cost accounting.
+    Returns the same output as run_environment.
+    """
+    timing.pop_records() # discard the decisions timed outside of this run
+
+    # Import OIH results for comparison (only known for the evaluation dataset)
+    oih_daily_costs = dataset.load_matrix("results/OIH_daily_costs.csv", skip_header=0) if scenario_directory is None else None
+
+    # Import data
+    data = v2_SystemCharacteristics.get_fixed_data()
+    occupancy1_matrix, occupancy2_matrix, price_data = load_simulation_data(scenario_directory)
+
+    days = np.arange(start, end)
+    num_days = len(days)
 
-            humidity_threshold = data.get("humidity_threshold", None)
+    occupancy1_matrix = occupancy1_matrix[days]
+    occupancy2_matrix = occupancy2_matrix[days]
+    initial_previous_prices = price_data[days, 0]
+    price_matrix = price_data[days, 1:]
 
-            plotting.plot_experiment(
-                day,
-                day_log,
-                price_series=price_matrix[day][:NUM_TIMESLOTS],
-                temp_thresholds=temp_thresholds,
-                humidity_threshold=humidity_threshold
+    # Outside temperature vector
+    outside_temperature_vector = data["outdoor_temperature"]
+
+    # State of every day
+    temperature_room1 = np.full(num_days, data["T1"])
+    temperature_room2 = np.full(num_days, data["T2"])
+    humidity          = np.full(num_days, data["H"])
+    vent_counter      = np.zeros(num_days, dtype=int)
+    is_override_room1 = np.zeros(num_days, dtype=bool)
+    is_override_room2 = np.zeros(num_days, dtype=bool)
+    objective_values  = np.zeros(num_days)
+
+    logs = allocate_logs(num_days)
+
+    POWER_MAX = {1: HEATING_MAX_POWER, 2: HEATING_MAX_POWER}
+
+    for hour in range(NUM_TIMESLOTS):
+        if hour == 0:
+            previous_price = initial_previous_prices
+        else:
+            previous_price = price_matrix[:, hour - 1]
+
+            old_T1 = temperature_room1
+            old_T2 = temperature_room2
+
+            temperature_room1 = calculate_room_temperature(
+                P1, occupancy1_matrix[:, hour - 1], old_T1, old_T2, V, outside_temperature_vector[hour - 1]
+            )
+            temperature_room2 = calculate_room_temperature(
+                P2, occupancy2_matrix[:, hour - 1], old_T2, old_T1, V, outside_temperature_vector[hour - 1]
             )
 
-    
+            humidity = (
+                humidity
+                + eta_occ * (occupancy1_matrix[:, hour - 1] + occupancy2_matrix[:, hour - 1])
+                - eta_vent * V
+            )
+
+            # Update consecutive ventilation counter
+            vent_counter = np.where(V == 0, 0, vent_counter + 1)
+
+        # Update overrule controllers state
+        is_override_room1 = update_overrule_controler_states(is_override_room1, temperature_room1, data)
+        is_override_room2 = update_overrule_controler_states(is_override_room2, temperature_room2, data)
+
+        # Update state of all days
+        states = {
+            "T1"             : temperature_room1,
+            "T2"             : temperature_room2,
+            "H"              : humidity,
+            "Occ1"           : occupancy1_matrix[:, hour],
+            "Occ2"           : occupancy2_matrix[:, hour],
+            "price_t"        : price_matrix[:, hour],
+            "price_previous" : previous_price,
+            "vent_counter"   : vent_counter,
+            "low_override_r1": is_override_room1,
+            "low_override_r2": is_override_room2,
+            "current_time"   : hour
+        }
+
+        # Evaluate policy's decisions
+        V, P1, P2 = select_actions_batch(policy, states, POWER_MAX)
+
+        # Terminates the program if the policy's decisions violate overrule controlers
+        verify_ventilation_actions_batch(V, data, humidity, vent_counter, VENT_MIN_UP_TIME, days)
+        verify_heater_actions_batch(P1, data, temperature_room1, is_override_room1, HEATING_MAX_POWER, days)
+        verify_heater_actions_batch(P2, data, temperature_room2, is_override_room2, HEATING_MAX_POWER, days)
+
+        # Calculate objective function (electricity cost)
+        hourly_cost = price_matrix[:, hour] * (V * data["ventilation_power"] + P1 + P2)
+        objective_values += hourly_cost
+
+        # Save hourly logs
+        logs["V"][:, hour]     = V
+        logs["P1"][:, hour]    = P1
+        logs["P2"][:, hour]    = P2
+        logs["T1"][:, hour]    = temperature_room1
+        logs["T2"][:, hour]    = temperature_room2
+        logs["H"][:, hour]     = humidity
+        logs["price"][:, hour] = price_matrix[:, hour]
+        logs["occ1"][:, hour]  = occupancy1_matrix[:, hour]
+        logs["occ2"][:, hour]  = occupancy2_matrix[:, hour]
+        logs["cost"][:, hour]  = hourly_cost
+
+    # Show daily results and plots
+    running_means = np.cumsum(objective_values) / np.arange(1, num_days + 1)
+
+    for i, day in enumerate(days):
+        print_daily_summary(day, objective_values[i], running_means[i], oih_daily_costs)
+
+        if plot:
+            plot_day(day, get_day_log(logs, i), price_matrix[i][:NUM_TIMESLOTS], data)
+
     # Calculate average objective value across experiments
-    avg_objective_value = np.mean(daily_objective_values)
+    avg_objective_value = np.mean(objective_values)
 
     return avg_objective_value, {
-        "objectives": daily_objective_values,
-        "logs": daily_logs
+        "days": days,
+        "objectives": objective_values,
+        "logs": logs,
+        "timings": timing.pop_records()
     }
 
 
+# Layout of the array-backed state of RestaurantEnvironment (same keys as the state dictionary given to the policies)
+STATE_FIELDS = (
+    "T1", "T2", "H", "Occ1", "Occ2", "price_t", "price_previous",
+    "vent_counter", "low_override_r1", "low_override_r2", "current_time"
+)
+STATE_INDEX = {field: i for i, field in enumerate(STATE_FIELDS)}
+
+
+class RestaurantEnvironment:
+    """
+    Step-wise version of run_environment, with the same dynamics, overrule checks and costs.
+    A day is started with reset(day) and advanced one hour at a time with step(action), so it can be
+    driven by any loop (several policies, training rollouts, ...).
+    The state lives in a single float array laid out as STATE_FIELDS; the usual state dictionary
+    is only built when asked for, and snapshot/restore copy just that array, so a rollout can branch
+    from any hour of the day without replaying it from hour 0.
+
+    Example use:
+        env = RestaurantEnvironment()
+        state = env.reset(day=0)
+        done = False
+        while not done:
+            action = policy.select_action(state)
+            state, cost, done = env.step(action)
+
+    step() raises a RuntimeError once the episode is done (or before the first reset()).
+    """
+
+    def __init__(self, scenario_directory=None):
+        self.data = v2_SystemCharacteristics.get_fixed_data()
+        self.occupancy1_matrix, self.occupancy2_matrix, self.price_data = load_simulation_data(scenario_directory)
+        self.outside_temperature_vector = self.data["outdoor_temperature"]
+        self.POWER_MAX = {1: HEATING_MAX_POWER, 2: HEATING_MAX_POWER}
+
+        self.x = np.zeros(len(STATE_FIELDS))
+        self.day = None
+        self.objective_value = 0.0
+        self.done = True # no episode before reset()
+
+    def reset(self, day=None, state=None):
+        """
+        Starts a new episode and returns its initial state dictionary.
+        Inputs:
+        - day: index of the evaluation day providing the prices and occupancies (None to run without data)
+        - state: optional state dictionary to start from instead of the initial state of the day
+                 (without a day, step() then needs the exogenous values of every next hour)
+        """
+        self.day = day
+        self.objective_value = 0.0
+        self.done = False
+
+        if state is not None:
+            for field in STATE_FIELDS:
+                self.x[STATE_INDEX[field]] = state[field]
+            return self.state()
+
+        if day is None:
+            raise ValueError("reset() needs a day or an initial state")
+
+        self.x[:] = 0.0
+        self.x[STATE_INDEX["T1"]]             = self.data["T1"]
+        self.x[STATE_INDEX["T2"]]             = self.data["T2"]
+        self.x[STATE_INDEX["H"]]              = self.data["H"]
+        self.x[STATE_INDEX["Occ1"]]           = self.occupancy1_matrix[day][0]
+        self.x[STATE_INDEX["Occ2"]]           = self.occupancy2_matrix[day][0]
+        self.x[STATE_INDEX["price_t"]]        = self.price_data[day][1]
+        self.x[STATE_INDEX["price_previous"]] = self.price_data[day][0]
+
+        # Overrule controllers at the first hour (both start OFF)
+        self._update_overrule_controlers()
+
+        return self.state()
+
+    def state(self):
+        """Returns the current state as the dictionary expected by the policies."""
+        x = self.x
+        return {
+            "T1"             : x[0],
+            "T2"             : x[1],
+            "H"              : x[2],
+            "Occ1"           : x[3],
+            "Occ2"           : x[4],
+            "price_t"        : x[5],
+            "price_previous" : x[6],
+            "vent_counter"   : int(x[7]),
+            "low_override_r1": bool(x[8]),
+            "low_override_r2": bool(x[9]),
+            "current_time"   : int(x[10])
+        }
+
+    def snapshot(self):
+        """Returns a copy of the current episode, to be given back to restore()."""
+        return self.day, self.x.copy(), self.objective_value, self.done
+
+    def restore(self, snapshot):
+        """Goes back to an episode saved with snapshot()."""
+        self.day, x, self.objective_value, self.done = snapshot
+        self.x[:] = x
+
+    def select_action(self, policy):
+        """Asks the policy for its (sanitized) decision at the current state."""
+        return v2_Checks.check_and_sanitize_action(policy, self.state(), self.POWER_MAX)
+
+    def step(self, action, exogenous=None):
+        """
+        Applies the action at the current hour and moves to the next one.
+        Inputs:
+        - action: dictionary with "HeatPowerRoom1", "HeatPowerRoom2" and "VentilationON"
+        - exogenous: optional dictionary with "price_t", "Occ1" and "Occ2" of the next hour,
+                     replacing the values of the day (needed when the episode has no day)
+        Returns (state, hourly_cost, done), where done is True after the last hour of the day.
+        """
+        if self.done:
+            raise RuntimeError("step() called on a finished episode: call reset() to start a new one")
+
+        x = self.x
+        data = self.data
+        hour = int(x[STATE_INDEX["current_time"]])
+
+        V  = action["VentilationON"]
+        P1 = action["HeatPowerRoom1"]
+        P2 = action["HeatPowerRoom2"]
+
+        # Terminates the program if the policy's decisions violate overrule controlers
+        verify_ventilation_actions(V, data, x[STATE_INDEX["H"]], x[STATE_INDEX["vent_counter"]], VENT_MIN_UP_TIME)
+        verify_heater_actions(P1, data, x[STATE_INDEX["T1"]], bool(x[STATE_INDEX["low_override_r1"]]), HEATING_MAX_POWER)
+        verify_heater_actions(P2, data, x[STATE_INDEX["T2"]], bool(x[STATE_INDEX["low_override_r2"]]), HEATING_MAX_POWER)
+
+        # Calculate objective function (electricity cost)
+        hourly_cost = x[STATE_INDEX["price_t"]] * (V * data["ventilation_power"] + P1 + P2)
+        self.objective_value += hourly_cost
+
+        if hour == NUM_TIMESLOTS - 1:
+            self.done = True
+            return self.state(), hourly_cost, True
+
+        # System dynamics
+        old_T1 = x[STATE_INDEX["T1"]]
+        old_T2 = x[STATE_INDEX["T2"]]
+        occ1   = x[STATE_INDEX["Occ1"]]
+        occ2   = x[STATE_INDEX["Occ2"]]
+        outside_temperature = self.outside_temperature_vector[hour]
+
+        x[STATE_INDEX["T1"]] = calculate_room_temperature(P1, occ1, old_T1, old_T2, V, outside_temperature)
+        x[STATE_INDEX["T2"]] = calculate_room_temperature(P2, occ2, old_T2, old_T1, V, outside_temperature)
+        x[STATE_INDEX["H"]] += eta_occ * (occ1 + occ2) - eta_vent * V
+
+        # Update consecutive ventilation counter
+        x[STATE_INDEX["vent_counter"]] = 0 if V == 0 else x[STATE_INDEX["vent_counter"]] + 1
+
+        # Exogenous values of the next hour
+        x[STATE_INDEX["price_previous"]] = x[STATE_INDEX["price_t"]]
+        if exogenous is None:
+            if self.day is None:
+                raise ValueError("step() needs the exogenous values when the episode has no day")
+            x[STATE_INDEX["price_t"]] = self.price_data[self.day][hour + 2]
+            x[STATE_INDEX["Occ1"]]    = self.occupancy1_matrix[self.day][hour + 1]
+            x[STATE_INDEX["Occ2"]]    = self.occupancy2_matrix[self.day][hour + 1]
+        else:
+            x[STATE_INDEX["price_t"]] = exogenous["price_t"]
+            x[STATE_INDEX["Occ1"]]    = exogenous["Occ1"]
+            x[STATE_INDEX["Occ2"]]    = exogenous["Occ2"]
+
+        x[STATE_INDEX["current_time"]] = hour + 1
+
+        # Update overrule controllers state
+        self._update_overrule_controlers()
+
+        return self.state(), hourly_cost, False
+
+    def _update_overrule_controlers(self):
+        x = self.x
+        x[STATE_INDEX["low_override_r1"]] = update_overrule_controler_state(
+            bool(x[STATE_INDEX["low_override_r1"]]), x[STATE_INDEX["T1"]], self.data
+        )
+        x[STATE_INDEX["low_override_r2"]] = update_overrule_controler_state(
+            bool(x[STATE_INDEX["low_override_r2"]]), x[STATE_INDEX["T2"]], self.data
+        )
@@ -0,0 +1,186 @@
+"""
+Evaluation modes built on top of run_environment.
+
+Paired comparison: all the policies are evaluated on the same days with common random numbers
+(every day and hour gets the same random stream in every policy, see Utils.seeding), and the daily
+cost differences with respect to a baseline policy are reported with confidence intervals.
+Since the noise shared by both policies cancels out in the differences, far fewer days are needed
+to tell two policies apart than when comparing their average costs.
+
+Adaptive evaluation: days are dispatched to the workers as they become free until the confidence interval of
+the average daily cost (or of the average gap to the OIH cost of the same days) is narrow enough, or a day or
+time cap is reached.
+"""
+
+from Policies import SP_policy_30, Hybrid_policy_30, Two_stage, ADP_policy_30
+from Environment import run_environment, merge_results
+from main import run_environment_in_parallel, run_environment_with_policy_name
+from Utils.statistics import mean_confidence_interval, paired_difference
+from Utils.dataset import load_matrix
+from Utils.worker_pool import get_pool
+
+from concurrent.futures import wait, FIRST_COMPLETED
+import numpy as np
+import pandas as pd
+import time
+
+
+def run_paired_comparison(policies, n_experiments, seed=0, n_workers=1, confidence=0.95):
+    """
+    Evaluates every policy on days [0, n_experiments) with common random numbers and compares them
+    day by day with the first policy of the list (the baseline).
+    Returns a DataFrame with one row per policy: average daily cost and its confidence interval, and the
+    paired mean difference with the baseline and its confidence interval (negative = cheaper than the baseline).
+    """
+    daily_costs = {}
+
+    for policy in policies:
+        print(f"\nEvaluating {policy.__name__} (seed {seed})")
+        if n_workers > 1:
+            _, results = run_environment_in_parallel(policy, n_experiments, n_workers, seed=seed)
+        else:
+            _, results = run_environment(policy, 0, n_experiments, seed=seed)
+        daily_costs[policy.__name__] = np.asarray(results["objectives"])
+
+    baseline = policies[0].__name__
+    rows = []
+
+    for name, costs in daily_costs.items():
+        mean, half_width = mean_confidence_interval(costs, confidence)
+        comparison = paired_difference(costs, daily_costs[baseline], confidence)
+
+        rows.append({
+            "policy": name,
+            "mean_cost": mean,
+            "cost_half_width": half_width,
+            "mean_difference_vs_baseline": comparison["mean_difference"],
+            "difference_half_width": comparison["half_width"],
+            "difference_ci_low": comparison["ci_low"],
+            "difference_ci_high": comparison["ci_high"],
+            "n_days": comparison["n_days"]
+        })
+
+    comparison_table = pd.DataFrame(rows)
+
+    print(f"\nPaired comparison against {baseline} ({int(confidence * 100)}% confidence intervals):")
+    for row in rows:
+        print(
+            f"{row['policy']:<30} cost = {row['mean_cost']:>7.2f} ± {row['cost_half_width']:>5.2f}"
+            f" | difference = {row['mean_difference_vs_baseline']:>7.2f} ± {row['difference_half_width']:>5.2f}"
+        )
+
+    return comparison_table
+
+
+def run_environment_adaptive(policy, target_half_width, relative_to_oih=False, confidence=0.95,
+                             min_days=10, max_days=100, max_seconds=None, n_workers=1, seed=None,
+                             scenario_directory=None):
+    """
+    Evaluates the policy day after day until the half-width of the confidence interval of the average daily
+    cost drops below target_half_width (with at least min_days days), or max_days days have been simulated,
+    or max_seconds have passed. With n_workers > 1, every worker gets a new day as soon as it finishes one and
+    the stopping rule is checked after every day; once it is met no new day is started, and the days being
+    simulated are finished and included.
+    With relative_to_oih=True the stopping rule is applied to the average daily gap to the OIH cost
+    (results/OIH_daily_costs.csv), which has a much smaller variance than the cost itself.
+    Returns the average daily cost and the results of run_environment (days in increasing order), plus the
+    "half_width" reached and the "stop_reason".
+    """
+    if relative_to_oih and scenario_directory is not None:
+        raise ValueError("The OIH costs are only known for the days of the evaluation dataset")
+
+    oih_daily_costs = load_matrix("results/OIH_daily_costs.csv", skip_header=0) if relative_to_oih else None
+    if relative_to_oih:
+        max_days = min(max_days, len(oih_daily_costs))
+
+    if not max_days >= min_days >= 2:
+        raise ValueError(
+            f"The adaptive evaluation needs max_days >= min_days >= 2 (a confidence interval needs two days), "
+            f"got min_days = {min_days} and max_days = {max_days}"
+        )
+
+    policy_name = policy.__name__ if hasattr(policy, '__name__') else str(policy)
+    start_time = time.time()
+    day_results = []
+    half_width = np.inf
+    stop_reason = None
+
+    def check_stop():
+        """Confidence interval of the quantity used as stopping rule, and the reason to stop (None to go on)."""
+        nonlocal half_width
+        objectives = np.concatenate([results["objectives"] for results in day_results])
+        if relative_to_oih:
+            days = np.concatenate([results["days"] for results in day_results])
+            mean, half_width = mean_confidence_interval(objectives - oih_daily_costs[days], confidence)
+        else:
+            mean, half_width = mean_confidence_interval(objectives, confidence)
+
+        print(f"  {len(objectives)} days: {'gap to OIH' if relative_to_oih else 'daily cost'} = {mean:.2f} ± {half_width:.2f}", flush=True)
+
+        if len(objectives) >= min_days and half_width <= target_half_width:
+            return "target half-width reached"
+        if max_seconds is not None and time.time() - start_time > max_seconds:
+            return "time cap"
+        return None
+
+    if n_workers <= 1:
+        for day in range(max_days):
+            day_results.append(run_environment(policy, day, day + 1, scenario_directory=scenario_directory, seed=seed)[1])
+            stop_reason = check_stop()
+            if stop_reason is not None:
+                break
+    else:
+        executor = get_pool(n_workers, [policy_name], scenario_directory)
+        next_day = 0
+        in_flight = set()
+
+        while True:
+            # Keep one day in flight per worker until the stopping rule is met
+            while stop_reason is None and next_day < max_days and len(in_flight) < n_workers:
+                in_flight.add(executor.submit(
+                    run_environment_with_policy_name, policy_name, next_day, next_day + 1, False, None, scenario_directory, seed
+                ))
+                next_day += 1
+            if not in_flight:
+                break
+
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            day_results.extend(future.result()[1] for future in finished)
+            reason = check_stop() # the days finished after the stop still count in the interval
+            stop_reason = reason if stop_reason is None else stop_reason
+
+    stop_reason = "day cap" if stop_reason is None else stop_reason
+    day_results.sort(key=lambda results: results["days"][0])
+    avg_objective_value, results = merge_results(day_results)
+    print(f"\nStopped after {len(results['days'])} days ({stop_reason}), half-width = {half_width:.2f}")
+
+    results["half_width"] = half_width
+    results["stop_reason"] = stop_reason
+
+    return avg_objective_value, results
+
+
+# Variables to set before running the comparison:
+POLICIES      = [Hybrid_policy_30, SP_policy_30, Two_stage, ADP_policy_30] # the first one is the baseline
+N_EXPERIMENTS = 100
+SEED          = 0
+N_WORKERS     = 8
+
+# Set to a half-width (in the units of the daily cost) to evaluate POLICIES[0] adaptively instead
+TARGET_HALF_WIDTH = None
+RELATIVE_TO_OIH   = True
+MAX_SECONDS       = None
+
+
+if __name__ == "__main__":
+    if TARGET_HALF_WIDTH is not None:
+        avg_objective_value, results = run_environment_adaptive(
+            POLICIES[0], TARGET_HALF_WIDTH, relative_to_oih=RELATIVE_TO_OIH, max_days=N_EXPERIMENTS,
+            max_seconds=MAX_SECONDS, n_workers=N_WORKERS, seed=SEED
+        )
+        print(f"Average daily cost of {POLICIES[0].__name__}: {avg_objective_value:.2f}")
+        raise SystemExit
+
+    comparison_table = run_paired_comparison(POLICIES, N_EXPERIMENTS, seed=SEED, n_workers=N_WORKERS)
+    comparison_table.to_csv("results/paired_comparison.csv", index=False)
+    print("\nComparison saved to results/paired_comparison.csv")
@@ -17,9 +17,9 @@ import pandas as pd
 # solve_hybrid() and terminal_vfa() use module-level eta_weights.
 import Policies.Hybrid_policy_30 as hybrid_module
 
-from Utils.PriceProcessRestaurant import price_model
-from Utils.OccupancyProcessRestaurant import next_occupancy_levels
+from Utils.batch_processes import price_model_batch, next_occupancy_levels_batch
 from Utils.v2_SystemCharacteristics import get_fixed_data
+from Utils import seeding
 
 
 # DATA AND PARAMETERS
@@ -44,8 +44,14 @@ eta_occ     = data["humidity_occupancy_coeff"]
 eta_vent    = data["humidity_vent_coeff"]
 min_up_time = data["vent_min_up_time"]
 
-np.random.seed(42)
+# Single random stream of the training (initial states, exogenous process and scenario trees)
+rng = seeding.make_rng(42)
 
+# The rollouts keep meeting close roots: reuse the scenario tree of their grid cell, shifted to the root,
+# instead of sampling and clustering a new one (see Utils.tree_cache for the error bound)
+hybrid_module.TREE_CACHE_SIZE = 4096
+
+# The random initial occupancies and prices of get_fixed_data, drawn from the training stream
 initial_state = {
     "T1":              data["T1"],
     "T2":              data["T2"],
@@ -54,10 +60,10 @@ initial_state = {
     "low_override_r1": data["low_override_r1"],
     "low_override_r2": data["low_override_r2"],
     "current_time":    0,
-    "Occ1":            data["Occ1"],
-    "Occ2":            data["Occ2"],
-    "price_t":         data["price_t"],
-    "price_previous":  data["price_previous"],
+    "Occ1":            rng.uniform(25, 35),
+    "Occ2":            rng.uniform(15, 25),
+    "price_t":         rng.uniform(2, 8),
+    "price_previous":  rng.uniform(2, 8),
 }
 
 
@@ -81,8 +87,8 @@ def phi(state):
 
 # EXOGENOUS PROCESS
 def generate_exogenous(state):
-    price_new = price_model(state["price_t"], state["price_previous"])
-    occ1_new, occ2_new = next_occupancy_levels(state["Occ1"], state["Occ2"])
+    price_new = float(price_model_batch(state["price_t"], state["price_previous"], rng=rng))
+    occ1_new, occ2_new = map(float, next_occupancy_levels_batch(state["Occ1"], state["Occ2"], rng=rng))
 
     return {
         "price_t":        price_new,
@@ -226,14 +232,15 @@ def solve_hybrid_for_training(
         return {"p1": 0.0, "p2": 0.0, "v": 0}
 
     try:
-        nodes = hybrid_module.build_tree(
+        tree = hybrid_module.build_tree(
             state,
             L=L_eff,
             B=B,
             N_samples=N_samples_tree,
+            rng=rng,
         )
 
-        p1, p2, v = hybrid_module.solve_hybrid(state, nodes)
+        p1, p2, v = hybrid_module.solve_hybrid(state, tree)
 
         return {
             "p1": float(p1),
@@ -261,10 +268,10 @@ def forward_pass(eta, initial_state):
         state = initial_state.copy()
 
         # Randomize initial exogenous components for better state coverage.
-        state["Occ1"] = np.random.uniform(25, 35)
-        state["Occ2"] = np.random.uniform(15, 25)
-        state["price_t"] = np.random.uniform(2, 8)
-        state["price_previous"] = np.random.uniform(2, 8)
+        state["Occ1"] = rng.uniform(25, 35)
+        state["Occ2"] = rng.uniform(15, 25)
+        state["price_t"] = rng.uniform(2, 8)
+        state["price_previous"] = rng.uniform(2, 8)
 
         for t in range(T):
             states[n][t] = state.copy()
@@ -460,6 +467,7 @@ print("\nFinal eta:")
 print(df)
 
 print(f"\nBest fit error: {best_error:.4f}")
+print(f"Scenario tree cache: {hybrid_module.tree_cache.stats()}")
 print("Saved:")
 print("  eta_weights_hybrid.npy")
 print("  eta_weights_hybrid_best.npy")
@@ -5,14 +5,16 @@ import pandas as pd
 from pyomo.environ import * 
 from pathlib import Path
 from Utils.v2_SystemCharacteristics import get_fixed_data 
+from Utils.dataset import load_dataset
 
 
 # load data 
 FILE_DIR = Path(__file__).parent  # directory where this file is located
 DATA_DIR = FILE_DIR / 'Data'  # name of the folder containing csv to be imported
-price_data = pd.read_csv(DATA_DIR / 'v2_PriceData.csv') 
-occupancy_r1 = pd.read_csv(DATA_DIR / "OccupancyRoom1.csv")
-occupancy_r2 = pd.read_csv(DATA_DIR / "OccupancyRoom2.csv")
+dataset = load_dataset(DATA_DIR)
+price_data = dataset["price_data"]
+occupancy_r1 = dataset["occupancy1"]
+occupancy_r2 = dataset["occupancy2"]
 
 # parameters extraction from system characteristics
 data = get_fixed_data()
@@ -191,9 +193,9 @@ all_rows = [] # create empty list to store results for all days
 
 # solve the optimization problem for each day and store results
 for day in range(100):
-    price  = price_data.iloc[day].values
-    occ_r1 = occupancy_r1.iloc[day].values
-    occ_r2 = occupancy_r2.iloc[day].values
+    price  = price_data[day]
+    occ_r1 = occupancy_r1[day]
+    occ_r2 = occupancy_r2[day]
 
     p_opt, v_opt, temp_opt, hum_opt, cost = solve_milp(price, occ_r1, occ_r2)
     daily_costs.append(cost)
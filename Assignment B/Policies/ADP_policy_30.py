@@ -1,12 +1,12 @@
 from pyomo.environ import *
-from sklearn.cluster import KMeans
 import numpy as np
 import time
 import csv
 
-from Utils.PriceProcessRestaurant import price_model
-from Utils.OccupancyProcessRestaurant import next_occupancy_levels
+from Utils.batch_processes import price_model_batch, next_occupancy_levels_batch
 from Utils.v2_SystemCharacteristics import get_fixed_data
+from Utils import timing, seeding, precompute
+from Utils.scenario_reduction import reduce_scenarios
 
 
 # Parameters extraction from system characteristics
@@ -32,33 +32,31 @@ L           = data["num_timeslots"]
 M_temp = 50
 M_hum  = 100
 
+# Tunable parameters (can be overridden by Sweep.py)
+BRANCHING = 5    # scenarios of the next hour kept after clustering
+N_SAMPLES = 500  # raw samples before clustering
+REDUCTION = "sklearn"  # clustering of the samples: "sklearn" (the k-means of the original policy), "batch" or "quantile" (see Utils.scenario_reduction)
+PRECOMPUTED_STORE = None  # store of Utils.precompute (e.g. "Data/precomputed.npz"): seeded evaluation runs read their clusters from it
+
 # eta_weights = np.load("eta_weights.npy")
 eta_weights = np.load("eta_weights_best.npy")
 
 def generate_samples(state, B, N_samples):
-    sample_prices = []
-    sample_occ1s  = []
-    sample_occ2s  = []
-
-    for _ in range(N_samples):
-        p = price_model(state["price_t"], state["price_previous"])
-        o1, o2 = next_occupancy_levels(state["Occ1"], state["Occ2"])
-
-        sample_prices.append(p)
-        sample_occ1s.append(o1)
-        sample_occ2s.append(o2)
+    sample_prices              = price_model_batch(state["price_t"], state["price_previous"], N_samples, seeding.get_rng())
+    sample_occ1s, sample_occ2s = next_occupancy_levels_batch(state["Occ1"], state["Occ2"], N_samples, seeding.get_rng())
 
     # Reduce Monte Carlo samples to B representative scenarios
-    X = np.column_stack([sample_prices, sample_occ1s, sample_occ2s])
+    X = np.column_stack([sample_prices, sample_occ1s, sample_occ2s])[None]
 
-    km = KMeans(n_clusters=B, random_state=0, n_init=10).fit(X)
-    labels = km.labels_
-    centroids = km.cluster_centers_
+    with timing.phase("reduction"):
+        centroids, cluster_probs, distances = reduce_scenarios(X, B, REDUCTION)
+    timing.add_metric("reduction_w1", distances.mean())
+    centroids, cluster_probs = centroids[0], cluster_probs[0]
 
     clusters = []
 
     for b in range(B):
-        cluster_prob = np.sum(labels == b) / N_samples
+        cluster_prob = cluster_probs[b]
 
         data = {
             "price": float(centroids[b, 0]),
@@ -112,6 +110,8 @@ def value_function(model, s_idx, scenarios, state):
 
 
 def solve_MILP(state, scenarios):
+    build_start = time.perf_counter()
+
     # State variables at time t
     current_temp = [state["T1"], state["T2"]]
     current_humidity = state["H"]
@@ -368,8 +368,10 @@ def solve_MILP(state, scenarios):
             sense=minimize
         )
 
+    timing.add_phase("model", time.perf_counter() - build_start)
     solver = SolverFactory("gurobi")
-    result = solver.solve(model, options={"OutputFlag": 0})
+    with timing.phase("solve"):
+        result = solver.solve(model, options={"OutputFlag": 0})
 
     if result.solver.termination_condition != TerminationCondition.optimal:
         return 0.0, 0.0, 0
@@ -394,7 +396,11 @@ def select_action(state):
     if t == L - 1:
         scenarios = []
     else:
-        scenarios = generate_samples(state, B=5, N_samples=500)
+        with timing.phase("samples"):
+            config = {"N_samples": N_SAMPLES, "reduction": REDUCTION}
+            scenarios = precompute.lookup(PRECOMPUTED_STORE, "clusters", state, 1, BRANCHING, config)
+            if scenarios is None:
+                scenarios = generate_samples(state, B=BRANCHING, N_samples=N_SAMPLES)
 
     try:
         p1, p2, v = solve_MILP(state, scenarios)
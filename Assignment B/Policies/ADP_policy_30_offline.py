@@ -2,9 +2,9 @@ from pathlib import Path
 from pyomo.environ import *
 import numpy as np
 import pandas as pd
-from Utils.PriceProcessRestaurant import price_model
-from Utils.OccupancyProcessRestaurant import next_occupancy_levels
+from Utils.batch_processes import price_model_batch, next_occupancy_levels_batch
 from Utils.v2_SystemCharacteristics import get_fixed_data
+from Utils import seeding
 
 data = get_fixed_data()
 N               = 50
@@ -26,8 +26,9 @@ eta_vent        = data['humidity_vent_coeff']
 min_up_time     = data['vent_min_up_time']
 M_temp = 50   # big-M for temperature constraints
 M_hum  = 100  # big-M for humidity constraints
-np.random.seed(42)
+rng = seeding.make_rng(42) # random stream of the training
 
+# The random initial occupancies and prices of get_fixed_data, drawn from the training stream
 initial_state = {
     'T1'             : data['T1'],
     'T2'             : data['T2'],
@@ -36,10 +37,10 @@ initial_state = {
     'low_override_r1': data['low_override_r1'],
     'low_override_r2': data['low_override_r2'],
     'current_time'   : 0,
-    'Occ1'           : data['Occ1'],
-    'Occ2'           : data['Occ2'],
-    'price_t'        : data['price_t'],
-    'price_previous' : data['price_previous']
+    'Occ1'           : rng.uniform(25, 35),
+    'Occ2'           : rng.uniform(15, 25),
+    'price_t'        : rng.uniform(2, 8),
+    'price_previous' : rng.uniform(2, 8)
 }
 
 def phi(state):
@@ -58,8 +59,8 @@ def phi(state):
     ])
 
 def generate_exogenous(state):
-    price_new          = price_model(state["price_t"], state["price_previous"])
-    occ1_new, occ2_new = next_occupancy_levels(state["Occ1"], state["Occ2"])
+    price_new          = float(price_model_batch(state["price_t"], state["price_previous"], rng=rng))
+    occ1_new, occ2_new = map(float, next_occupancy_levels_batch(state["Occ1"], state["Occ2"], rng=rng))
     return {
         "price_t":       price_new,
         "price_previous": state["price_t"],
@@ -364,10 +365,10 @@ def forward_pass(eta, initial_state):
     for n in range(N):
         state = initial_state.copy()
         # Randomize initial exogenous state across trajectories
-        state["Occ1"]           = np.random.uniform(25, 35)
-        state["Occ2"]           = np.random.uniform(15, 25)
-        state["price_t"]        = np.random.uniform(2, 8)
-        state["price_previous"] = np.random.uniform(2, 8)
+        state["Occ1"]           = rng.uniform(25, 35)
+        state["Occ2"]           = rng.uniform(15, 25)
+        state["price_t"]        = rng.uniform(2, 8)
+        state["price_previous"] = rng.uniform(2, 8)
 
         for t in range(L):
             states[n][t]  = state.copy()
@@ -2,9 +2,11 @@ import time
 from pyomo.environ import *
 import numpy as np
 from Policies.ADP_policy_30 import generate_samples
-from Utils.PriceProcessRestaurant import price_model
+from Utils.batch_processes import price_model_batch
 from Utils.OccupancyProcessRestaurant import next_occupancy_levels
 from Utils.v2_SystemCharacteristics import get_fixed_data
+from Utils.dataset import load_dataset
+from Utils import timing, seeding, precompute
 
 # parameters extraction from system characteristics
 data        = get_fixed_data()
@@ -30,6 +32,9 @@ M_hum = 100   # big-M constant for humidity
 
 epsilon = 1e-9 # small constant to prevent decimal precision issues in constraints
 
+PRECOMPUTED_STORE = None # store of Utils.precompute (e.g. "Data/precomputed.npz"): seeded evaluation runs read their forecasts from it
+FORECAST_SAMPLES  = 10_000 # price samples per hour of the forecast
+
 
 def forecast_uncertainties(state: dict, L: int, n_samples: int):    
     # Obtain current state variables
@@ -45,20 +50,9 @@ def forecast_uncertainties(state: dict, L: int, n_samples: int):
     }
 
     for _ in range(L):
-        list_of_prices = []
-        list_of_occ1   = []
-        list_of_occ2   = []
-
-        # Generate n_samples for the next time step
-        for _ in range(n_samples):
-            list_of_prices.append(price_model(current_price, previous_price))
-            list_of_occ1.append(occ1)
-            list_of_occ2.append(occ2)
-
-        # Calculate the expected next values
-        next_price = np.mean(list_of_prices)
-        occ1 = np.mean(list_of_occ1)
-        occ2 = np.mean(list_of_occ2)
+        # Generate n_samples for the next time step and calculate the expected next price
+        # (the occupancies are kept at their current values)
+        next_price = np.mean(price_model_batch(current_price, previous_price, n_samples, seeding.get_rng()))
 
         # Append forecasts for the current time step
         forecast["price"].append(float(next_price))
@@ -74,9 +68,10 @@ def forecast_uncertainties(state: dict, L: int, n_samples: int):
 
 def provide_real_future(day: int, t: int, L: int):    
     """Use this one to simulate the OIH"""
-    occupancy1_matrix = np.genfromtxt("Data/OccupancyRoom1.csv", delimiter=",", skip_header=1)
-    occupancy2_matrix = np.genfromtxt("Data/OccupancyRoom2.csv", delimiter=",", skip_header=1)
-    raw_price_data = np.genfromtxt("Data/v2_PriceData.csv", delimiter=",", skip_header=1)
+    dataset = load_dataset()
+    occupancy1_matrix = dataset["occupancy1"]
+    occupancy2_matrix = dataset["occupancy2"]
+    raw_price_data = dataset["price_data"]
     price_data     = raw_price_data[:, 1:]  
 
 
@@ -90,6 +85,8 @@ def provide_real_future(day: int, t: int, L: int):
 
 
 def solve_MILP(state: dict, forecast: dict, L: int) -> tuple:
+    build_start = time.perf_counter()
+
     # Extract current state variables
     temperature = [state["T1"], state["T2"]]
     humidity = state["H"]
@@ -219,8 +216,10 @@ def solve_MILP(state: dict, forecast: dict, L: int) -> tuple:
 
 
     # Solve model
+    timing.add_phase("model", time.perf_counter() - build_start)
     solver = SolverFactory("gurobi")
-    result = solver.solve(model, options={"OutputFlag": 0})
+    with timing.phase("solve"):
+        result = solver.solve(model, options={"OutputFlag": 0})
 
     if result.solver.termination_condition != TerminationCondition.optimal:
         return 0.0, 0.0, 0
@@ -276,7 +275,10 @@ def select_action(state):
     L = min(10, T - state["current_time"])
 
     # Forecast uncertainties across the lookahead horizon
-    forecast = forecast_uncertainties(state, L, n_samples=10_000)
+    with timing.phase("forecast"):
+        forecast = precompute.lookup(PRECOMPUTED_STORE, "forecast", state, L, 0, {"n_samples": FORECAST_SAMPLES})
+        if forecast is None:
+            forecast = forecast_uncertainties(state, L, n_samples=FORECAST_SAMPLES)
     # forecast = provide_real_future(day, state["current_time"], L)
 
     # Solve MILP to get optimal actions
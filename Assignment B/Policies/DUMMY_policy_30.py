@@ -1,3 +1,4 @@
+import numpy as np
 from Utils.v2_SystemCharacteristics import get_fixed_data
 
 # Parameters extraction from system characteristics
@@ -36,4 +37,22 @@ def select_action(state):
     "HeatPowerRoom2" : p2,
     "VentilationON" : v
     }
-    return HereAndNowActions
\ No newline at end of file
+    return HereAndNowActions
+
+
+def select_actions(states):
+    """Batch version of select_action: states is a dictionary of arrays, one entry per day."""
+    p1 = np.where(states["low_override_r1"], HEATING_MAX_POWER, 0)
+    p2 = np.where(states["low_override_r2"], HEATING_MAX_POWER, 0)
+
+    vent_counter = states["vent_counter"]
+    v = (
+        (states["H"] > data["humidity_threshold"]) | ((0 < vent_counter) & (vent_counter < VENT_MIN_UP_TIME))
+    ).astype(int)
+
+    HereAndNowActions = {
+    "HeatPowerRoom1" : p1,
+    "HeatPowerRoom2" : p2,
+    "VentilationON" : v
+    }
+    return HereAndNowActions
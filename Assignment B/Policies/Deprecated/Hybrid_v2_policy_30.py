@@ -7,6 +7,7 @@ import csv
 from Utils.PriceProcessRestaurant import price_model
 from Utils.OccupancyProcessRestaurant import next_occupancy_levels
 from Utils.v2_SystemCharacteristics import get_fixed_data
+from Utils.dataset import load_dataset
 
 
 #### TRYING TO COMBINE DL + ADP
@@ -40,9 +41,10 @@ eta_weights = np.load("eta_weights.npy")
 
 def provide_real_future(day: int, t: int):    
     """Use this one to simulate the OIH"""
-    occupancy1_matrix = np.genfromtxt("Data/OccupancyRoom1.csv", delimiter=",", skip_header=1)
-    occupancy2_matrix = np.genfromtxt("Data/OccupancyRoom2.csv", delimiter=",", skip_header=1)
-    raw_price_data = np.genfromtxt("Data/v2_PriceData.csv", delimiter=",", skip_header=1)
+    dataset = load_dataset()
+    occupancy1_matrix = dataset["occupancy1"]
+    occupancy2_matrix = dataset["occupancy2"]
+    raw_price_data = dataset["price_data"]
     price_data     = raw_price_data[:, 1:]  
 
 
@@ -6,11 +6,8 @@ Created on Mon Nov 17 11:14:31 2025
 """
 import time
 from pyomo.environ import *
-from sklearn.cluster import KMeans
-import numpy as np
-from Utils.PriceProcessRestaurant import price_model
-from Utils.OccupancyProcessRestaurant import next_occupancy_levels
 from Utils.v2_SystemCharacteristics import get_fixed_data
+from Utils.scenario_tree import build_levels, levels_to_nodes
 
 # parameters extraction from system characteristics
 data        = get_fixed_data()
@@ -67,67 +64,8 @@ def build_tree(state, L, B, N_samples = 100):
         list of node dictionaries representing the full scenario tree
     """
 
-    # root node (tau=0) - current state (no uncertainty)
-    root = {
-        "id":         0,
-        "tau":        0,
-        "parent_id":  None,
-        "price":      state["price_t"],
-        "price_prev": state["price_previous"],
-        "occ1":       state["Occ1"],
-        "occ2":       state["Occ2"],
-        "prob":       1.0 # certain
-    }
-
-    nodes = [root]   # list of dictionaries, each representing a node in the scenario tree with its features and probability
-    queue = [root]   # BFS queue (breadth-first search)
-    next_id = 1      # initialization of the next_id counter
-
-    while queue: # branching until the queue is empty (all nodes have been processed)
-        parent = queue.pop(0) # takes the first element of the queue list (parent node) and removes it (so the queue is updated to contain only the children)
-
-        if parent["tau"] >= L: # when we go beyond the lookahead horizon, we don't create children. When H becomes 0 (hour 10), we don't create any children
-            continue   # leaf node - no children
-
-        # BRANCHING: generate N_samples random children from this parent
-        # define the features of the child nodes: price, occ1, occ2
-        sample_prices = []
-        sample_occ1s  = []
-        sample_occ2s  = []
-
-        for _ in range(N_samples):
-            p = price_model(parent["price"], parent["price_prev"]) # price model needs the current price and the previous to generate a hypothetical price for the child node
-            o1, o2 = next_occupancy_levels(parent["occ1"], parent["occ2"]) # occupancy model needs the current values of room occupancies
-            sample_prices.append(p)
-            sample_occ1s.append(o1)
-            sample_occ2s.append(o2)
-
-        # CLUSTERING: reduce N_samples to B representative centroids
-        X         = np.column_stack([sample_prices, sample_occ1s, sample_occ2s]) # feature matrix with all the N samples rows
-        km        = KMeans(n_clusters=B, random_state=0, n_init=10).fit(X)
-        labels    = km.labels_
-        centroids = km.cluster_centers_   # reduced matrix of shape (B, 3)
-
-        # CREATING B child nodes from centroids
-        for b in range(B):
-            cluster_prob = np.sum(labels == b) / N_samples     # conditional probability
-
-            child = {
-                "id":         next_id,                         # unique ID for the child node
-                "tau":        parent["tau"] + 1,               # deep level in the tree
-                "parent_id":  parent["id"],                    # ID of the parent node
-                "price":      centroids[b, 0],                 # centroid price
-                "price_prev": parent["price"],                 # parent price becomes prev
-                "occ1":       centroids[b, 1],                 # centroid occ1
-                "occ2":       centroids[b, 2],                 # centroid occ2
-                "prob":       parent["prob"] * cluster_prob    # probability of the child according to the chain rule
-            }
-
-            nodes.append(child) # update the full list of nodes with the new child
-            queue.append(child) # updated the queue list with the new child, which will become the next parent for the next iteration of the while loop
-            next_id += 1
-
-    return nodes
+    # one level at a time, all the parents of a level sampled and clustered at once (see Utils.scenario_tree)
+    return levels_to_nodes(build_levels(state, L, B, N_samples, reduction="sklearn"))
 
 
 # SP MILP SOLVER 
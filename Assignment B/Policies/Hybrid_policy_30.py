@@ -1,9 +1,11 @@
+import time
 from pyomo.environ import *
-from sklearn.cluster import KMeans
 import numpy as np
-from Utils.PriceProcessRestaurant import price_model
-from Utils.OccupancyProcessRestaurant import next_occupancy_levels
 from Utils.v2_SystemCharacteristics import get_fixed_data
+from Utils import timing, precompute
+from Utils.anytime import solve_anytime
+from Utils.scenario_tree import RollingTree, ScenarioTree, as_tree, build_levels, expand_level
+from Utils.tree_cache import TreeCache
 
 # Parameter extraction from system characteristics
 data        = get_fixed_data()
@@ -28,90 +30,99 @@ M_temp = 50                    # big-M for temperature constraints
 M_hum  = 100                   # big-M for humidity constraints
 M_vc   = min_up_time + 1       # upper bound on vent_counter (resets to 0 when v=0)
 
+# Tunable parameters (can be overridden by Sweep.py)
+LOOKAHEAD = 4    # lookahead horizon L (shortened near the end of the day)
+BRANCHING = 3    # branching factor B
+N_SAMPLES = 100  # raw samples per node before clustering
+CHILD_GENERATOR = "sampling"  # "sampling" (N_SAMPLES samples + clustering), "quadrature" or "lattice" (deterministic, see Utils.quadrature and Utils.lattice)
+REDUCTION       = "batch"     # clustering of the samples: "batch", "quantile" or "sklearn" (see Utils.scenario_reduction)
+REUSE_TREE      = False       # keep the tree of the previous hour and reuse the subtree of the child closest to the realized state (changes the decisions, see RollingTree)
+REUSE_DISTANCE  = 1.5         # largest distance to that child, in one-step noise standard deviations, otherwise the tree is rebuilt
+PRECOMPUTED_STORE = None      # store of Utils.precompute (e.g. "Data/precomputed.npz"): seeded evaluation runs read their trees from it (before REUSE_TREE and the tree cache)
+TREE_CACHE_SIZE   = 0         # trees kept by the cache of quantized roots (see Utils.tree_cache), 0 disables it
+TREE_CACHE_RESOLUTION = (0.1, 0.1, 0.5, 0.5) # grid cells of the cache: price_t, price_previous, Occ1, Occ2
+
+# Anytime mode: if set, each decision grows the tree level by level and returns the
+# deepest solution found within this many seconds (instead of the fixed L below)
+TIME_BUDGET = None
+
+# Tree of the previous hour, reused by select_action when REUSE_TREE is set (see Utils.scenario_tree.RollingTree)
+rolling_tree = RollingTree()
+
+# Trees of recently met roots, used by build_tree when TREE_CACHE_SIZE > 0 (see Utils.tree_cache.TreeCache)
+tree_cache = TreeCache()
+
 # Load offline-trained ADP value function weights, shape (T, 11)
 eta_weights = np.load("eta_weights_best.npy")
 
 
 # SCENARIO TREE BUILDER (iterative Branch & Cluster)
-def build_tree(state, L, B, N_samples=100):
+def build_tree(state, L, B, N_samples=100, rng=None):
     """
     Builds the multi-stage scenario tree via iterative Branch & Cluster.
     At each parent node, N_samples raw children are sampled from the exogenous
-    process, then reduced to B representative scenarios via KMeans clustering.
+    process, then reduced to B representative scenarios by clustering.
 
     Args:
         state:     current state dictionary from the environment
         L:         lookahead horizon (number of future steps)
         B:         branching factor (number of clusters per node)
         N_samples: raw samples generated per node before clustering
+        rng:       random stream of the samples (default: the stream of the current policy call, see Utils.seeding)
 
     Returns:
-        list of node dictionaries representing the full scenario tree
+        ScenarioTree (structure of arrays, see Utils.scenario_tree) representing the full scenario tree
     """
-    # Root node (tau=0) — current state, no uncertainty
-    root = {
-        "id":         0,
-        "tau":        0,
-        "parent_id":  None,
-        "price":      state["price_t"],
-        "price_prev": state["price_previous"],
-        "occ1":       state["Occ1"],
-        "occ2":       state["Occ2"],
-        "prob":       1.0
-    }
-
-    nodes   = [root]
-    queue   = [root]
-    next_id = 1
-
-    while queue:
-        parent = queue.pop(0)
-
-        # Stop branching at the lookahead horizon — these are leaf nodes
-        if parent["tau"] >= L:
-            continue
-
-        # BRANCHING: generate N_samples raw children from this parent
-        sample_prices = []
-        sample_occ1s  = []
-        sample_occ2s  = []
-        for _ in range(N_samples):
-            p      = price_model(parent["price"], parent["price_prev"])
-            o1, o2 = next_occupancy_levels(parent["occ1"], parent["occ2"])
-            sample_prices.append(p)
-            sample_occ1s.append(o1)
-            sample_occ2s.append(o2)
-
-        # CLUSTERING: reduce N_samples to B representative centroids
-        X         = np.column_stack([sample_prices, sample_occ1s, sample_occ2s])
-        km        = KMeans(n_clusters=B, random_state=0, n_init=10).fit(X)
-        labels    = km.labels_
-        centroids = km.cluster_centers_
-
-        # Create B child nodes from centroids
-        for b in range(B):
-            cluster_prob = np.sum(labels == b) / N_samples
-
-            child = {
-                "id":         next_id,
-                "tau":        parent["tau"] + 1,
-                "parent_id":  parent["id"],
-                "price":      float(centroids[b, 0]),
-                "price_prev": parent["price"],
-                "occ1":       float(centroids[b, 1]),
-                "occ2":       float(centroids[b, 2]),
-                "prob":       parent["prob"] * cluster_prob  # chain rule
-            }
-
-            nodes.append(child)
-            queue.append(child)
-            next_id += 1
-
-    return nodes
+    # One level per lookahead step, each level built at once from arrays (see Utils.scenario_tree)
+    def build(root):
+        return ScenarioTree.from_levels(build_levels(root, L, B, N_samples, rng, CHILD_GENERATOR, REDUCTION))
+
+    if TREE_CACHE_SIZE > 0:
+        return tree_cache.get(
+            state, L, B, build, settings=(N_samples, CHILD_GENERATOR, REDUCTION),
+            maxsize=TREE_CACHE_SIZE, resolution=TREE_CACHE_RESOLUTION
+        )
+    return build(state)
+
+
+def deepen_tree(tree, B, N_samples=100, rng=None):
+    """
+    Adds one level to the scenario tree: every node of the deepest level gets B
+    children (Branch & Cluster). Nodes are processed in order of index, so growing
+    the tree level by level gives the same tree as building it at once.
+    """
+    level = expand_level(tree.level(tree.depth), B, N_samples, rng, CHILD_GENERATOR, REDUCTION)
+
+    return tree.extend(level)
+
+
+def forecast_tree(state, L, B):
+    """
+    Scenario tree of the decision: the precomputed tree of the call if the store has it (PRECOMPUTED_STORE),
+    otherwise the subtree of the previous hour's tree grown by one level when possible (REUSE_TREE), otherwise a
+    tree built from scratch (through the tree cache if TREE_CACHE_SIZE > 0). The store holds the trees built from
+    scratch, so with a store the decisions are those of a run without REUSE_TREE nor tree cache on every hour it
+    covers; the previous tree is dropped when a stored tree is used, so that the next hour does not re-root it.
+    """
+    config = {"N_samples": N_SAMPLES, "generator": CHILD_GENERATOR, "reduction": REDUCTION}
+    tree = precompute.lookup(PRECOMPUTED_STORE, "tree", state, L, B, config)
+    if tree is not None:
+        rolling_tree.reset()
+        return tree
+
+    if REUSE_TREE:
+        return rolling_tree.get(
+            state, L, B,
+            build=lambda: build_tree(state, L=L, B=B, N_samples=N_SAMPLES),
+            deepen=lambda tree: deepen_tree(tree, B, N_SAMPLES),
+            max_distance=REUSE_DISTANCE
+        )
+
+    return build_tree(state, L=L, B=B, N_samples=N_SAMPLES)
 
 
 # TERMINAL VFA: phi(s_leaf)^T eta_{t+L}
-def terminal_vfa(model, n, node_by_id, t_now, L_horizon):
+def terminal_vfa(model, tree, nid, t_now, L_horizon):
     """
     Returns the ADP terminal cost phi(s_leaf)^T eta_{t+L} as a Pyomo expression,
     appended to the SP objective at every leaf node (tau=L).
@@ -124,19 +135,19 @@ def terminal_vfa(model, n, node_by_id, t_now, L_horizon):
     """
     t_leaf = min(t_now + L_horizon, T - 1)
     w      = eta_weights[t_leaf]
-    nid    = n["id"]
 
-    parent          = node_by_id[n["parent_id"]]
-    price_prev_leaf = parent["price"]
+    occ1_leaf, occ2_leaf = float(tree.occ1[nid]), float(tree.occ2[nid])
+    price_leaf           = float(tree.price[nid])
+    price_prev_leaf      = float(tree.price[tree.parent[nid]])
 
     return (
           w[0]  * 1.0
         + w[1]  * (model.temp[1, nid] - 22) / 8
         + w[2]  * (model.temp[2, nid] - 22) / 8
         + w[3]  * (model.hum[nid]     - 30) / 70
-        + w[4]  * (n["occ1"]          - 20) / 30
-        + w[5]  * (n["occ2"]          - 10) / 20
-        + w[6]  *  n["price"]              / 12
+        + w[4]  * (occ1_leaf          - 20) / 30
+        + w[5]  * (occ2_leaf          - 10) / 20
+        + w[6]  *  price_leaf              / 12
         + w[7]  *  price_prev_leaf         / 12
         + w[8]  *  model.vc[nid]           / 3
         + w[9]  *  model.u[1, nid]
@@ -144,10 +155,10 @@ def terminal_vfa(model, n, node_by_id, t_now, L_horizon):
     )
 
 
-# HYBRID MILP SOLVER: multi-stage SP over [tau=0, tau=L-1] + VFA terminal cost at tau=L
-def solve_hybrid(state, nodes):
+# HYBRID MILP MODEL: multi-stage SP over [tau=0, tau=L-1] + VFA terminal cost at tau=L
+def build_hybrid_model(state, tree):
     """
-    Builds and solves the hybrid MILP:
+    Builds the hybrid MILP:
         min  E[ sum_{tau=0}^{L-1} c(u_tau, x_tau) ]   +   E[ V_hat(s_L) ]
              \________________________/                  \____________/
                   multi-stage SP                          ADP terminal cost
@@ -156,17 +167,21 @@ def solve_hybrid(state, nodes):
     At each leaf node (tau=L), the offline-trained value function V_hat(s) = phi(s)^T eta
     approximates the remaining cost from t+L to T.
 
-    Returns the here-and-now decisions (p1, p2, v) for tau=0, or zeros if the solver fails.
+    Returns the Pyomo model, whose here-and-now decisions are model.p0 and model.v0.
     """
+    build_start = time.perf_counter()
     model = ConcreteModel()
 
-    # Tree topology
-    node_by_id    = {n["id"]: n for n in nodes}
-    nodes_future  = [n for n in nodes if n["tau"] >= 1]
-    L_horizon     = max((n["tau"] for n in nodes), default=0)
+    # Tree topology (structure of arrays, values looked up by node index)
+    tree          = as_tree(tree)
+    parent, tau_of, prob, price = tree.parent.tolist(), tree.tau.tolist(), tree.prob.tolist(), tree.price.tolist()
+    occ           = {1: tree.occ1.tolist(), 2: tree.occ2.tolist()}
+    ancestors     = tree.ancestors.tolist()
+    nodes_future  = tree.future.tolist()
+    L_horizon     = tree.depth
     # When L_horizon=0 (last timeslot), there are no future nodes — no VFA applied
-    leaf_nodes    = [n for n in nodes if n["tau"] == L_horizon and n["tau"] > 0]
-    tau_ge2_nodes = [n for n in nodes_future if n["tau"] >= 2]
+    leaf_nodes    = [nid for nid in nodes_future if tau_of[nid] == L_horizon]
+    tau_ge2_nodes = [nid for nid in nodes_future if tau_of[nid] >= 2]
 
     # State at tau=0
     t_now             = state["current_time"]
@@ -177,7 +192,7 @@ def solve_hybrid(state, nodes):
 
     # SETS
     model.R     = RangeSet(1, 2)
-    model.NODES = Set(initialize=[n["id"] for n in nodes_future])
+    model.NODES = Set(initialize=nodes_future)
 
     # HERE-AND-NOW VARIABLES (tau=0)
     model.p0 = Var(model.R, within=NonNegativeReals, bounds=(0, P_max))
@@ -204,52 +219,51 @@ def solve_hybrid(state, nodes):
     # AUXILIARY: vc_prod[nid] = vc[parent_id] * v[nid] for tau>=2
     # Linearization of continuous × binary product (McCormick envelopes)
     if tau_ge2_nodes:
-        model.VC_GE2  = Set(initialize=[n["id"] for n in tau_ge2_nodes])
+        model.VC_GE2  = Set(initialize=tau_ge2_nodes)
         model.vc_prod = Var(model.VC_GE2, within=NonNegativeReals, bounds=(0, M_vc))
 
     # HELPER FUNCTIONS — return parent value (variable or known parameter)
-    def v_par(node):
-        return model.v0 if node["tau"] == 1 else model.v[node["parent_id"]]
+    def v_par(nid):
+        return model.v0 if tau_of[nid] == 1 else model.v[parent[nid]]
 
-    def p_par(r, node):
-        return model.p0[r] if node["tau"] == 1 else model.p[r, node["parent_id"]]
+    def p_par(r, nid):
+        return model.p0[r] if tau_of[nid] == 1 else model.p[r, parent[nid]]
 
-    def temp_par(r, node):
-        if node["tau"] == 1:
+    def temp_par(r, nid):
+        if tau_of[nid] == 1:
             return state["T1"] if r == 1 else state["T2"]
-        return model.temp[r, node["parent_id"]]
+        return model.temp[r, parent[nid]]
 
-    def temp_other_par(r, node):
+    def temp_other_par(r, nid):
         r_other = 3 - r
-        if node["tau"] == 1:
+        if tau_of[nid] == 1:
             return state["T1"] if r_other == 1 else state["T2"]
-        return model.temp[r_other, node["parent_id"]]
+        return model.temp[r_other, parent[nid]]
 
-    def hum_par(node):
-        return state["H"] if node["tau"] == 1 else model.hum[node["parent_id"]]
+    def hum_par(nid):
+        return state["H"] if tau_of[nid] == 1 else model.hum[parent[nid]]
 
-    def occ_par(r, node):
-        if node["tau"] == 1:
+    def occ_par(r, nid):
+        if tau_of[nid] == 1:
             return state["Occ1"] if r == 1 else state["Occ2"]
-        parent = node_by_id[node["parent_id"]]
-        return parent["occ1"] if r == 1 else parent["occ2"]
+        return occ[r][parent[nid]]
 
-    def u_par(r, node):
-        if node["tau"] == 1:
+    def u_par(r, nid):
+        if tau_of[nid] == 1:
             return int(low_override_init[r])
-        return model.u[r, node["parent_id"]]
+        return model.u[r, parent[nid]]
 
     # OBJECTIVE: expected SP cost over [tau=0, tau=L-1] + expected VFA at tau=L
     # Leaf nodes are excluded from the SP sum — V_hat(s_leaf) already covers the
     # cost from t+L onwards (Bellman convention: V(s_t) = c(s_t,u_t) + E[V(s_{t+1})])
     obj_expr = state["price_t"] * (model.p0[1] + model.p0[2] + P_vent * model.v0)
-    for n in nodes_future:
-        if n["tau"] < L_horizon:
-            obj_expr += n["prob"] * n["price"] * (
-                model.p[1, n["id"]] + model.p[2, n["id"]] + P_vent * model.v[n["id"]]
+    for nid in nodes_future:
+        if tau_of[nid] < L_horizon:
+            obj_expr += prob[nid] * price[nid] * (
+                model.p[1, nid] + model.p[2, nid] + P_vent * model.v[nid]
             )
-    for n in leaf_nodes:
-        obj_expr += n["prob"] * terminal_vfa(model, n, node_by_id, t_now, L_horizon)
+    for nid in leaf_nodes:
+        obj_expr += prob[nid] * terminal_vfa(model, tree, nid, t_now, L_horizon)
 
     model.obj = Objective(expr=obj_expr, sense=minimize)
 
@@ -274,18 +288,17 @@ def solve_hybrid(state, nodes):
     # Minimum uptime carryover from past decisions
     if remaining_forced >= 1:
         model.v0.fix(1)
-    for n in nodes_future:
-        if n["tau"] == 1 and remaining_forced >= 2:
-            model.v[n["id"]].fix(1)
+    for nid in nodes_future:
+        if tau_of[nid] == 1 and remaining_forced >= 2:
+            model.v[nid].fix(1)
 
     # FUTURE NODE CONSTRAINTS
-    for n in nodes_future:
-        nid      = n["id"]
-        t_parent = t_now + n["tau"] - 1
+    for nid in nodes_future:
+        t_parent = t_now + tau_of[nid] - 1
         t_out    = T_out[min(t_parent, len(T_out) - 1)]
 
         # Vent counter transition: vc[nid] = (vc_parent + 1) * v[nid]
-        if n["tau"] == 1:
+        if tau_of[nid] == 1:
             # vc_parent = vent_counter (known scalar) → linear
             model.c.add(model.vc[nid] == (vent_counter + 1) * model.v0)
         else:
@@ -296,7 +309,7 @@ def solve_hybrid(state, nodes):
             #   vc_prod <= M_vc * v
             #   vc_prod >= vc_parent - M_vc * (1 - v)
             # Then vc[nid] = vc_prod[nid] + v[nid]
-            vc_par = model.vc[n["parent_id"]]
+            vc_par = model.vc[parent[nid]]
             v_cur  = model.v[nid]
             model.c.add(model.vc_prod[nid] >= 0)
             model.c.add(model.vc_prod[nid] <= vc_par)
@@ -308,12 +321,12 @@ def solve_hybrid(state, nodes):
             # Temperature dynamics
             model.c.add(
                 model.temp[r, nid] ==
-                    temp_par(r, n)
-                    + zeta_exch * (temp_other_par(r, n) - temp_par(r, n))
-                    - zeta_loss * (temp_par(r, n) - t_out)
-                    + zeta_conv * p_par(r, n)
-                    - zeta_cool * v_par(n)
-                    + zeta_occ  * occ_par(r, n)
+                    temp_par(r, nid)
+                    + zeta_exch * (temp_other_par(r, nid) - temp_par(r, nid))
+                    - zeta_loss * (temp_par(r, nid) - t_out)
+                    + zeta_conv * p_par(r, nid)
+                    - zeta_cool * v_par(nid)
+                    + zeta_occ  * occ_par(r, nid)
             )
 
             # Low-temp overrule controller (detect, activate, deactivate)
@@ -322,9 +335,9 @@ def solve_hybrid(state, nodes):
             model.c.add(model.temp[r, nid] >= T_ok  - M_temp * (1 - model.y_ok[r, nid]))
             model.c.add(model.temp[r, nid] <= T_ok  + M_temp * model.y_ok[r, nid])
             model.c.add(model.u[r, nid] >= model.y_low[r, nid])
-            model.c.add(model.u[r, nid] <= u_par(r, n) + model.y_low[r, nid])
+            model.c.add(model.u[r, nid] <= u_par(r, nid) + model.y_low[r, nid])
             model.c.add(model.p[r, nid] >= P_max * model.u[r, nid])
-            model.c.add(model.u[r, nid] >= u_par(r, n) - model.y_ok[r, nid])
+            model.c.add(model.u[r, nid] >= u_par(r, nid) - model.y_ok[r, nid])
             model.c.add(model.u[r, nid] <= 1 - model.y_ok[r, nid])
 
             # High-temp overrule controller
@@ -335,43 +348,54 @@ def solve_hybrid(state, nodes):
         # Humidity dynamics
         model.c.add(
             model.hum[nid] ==
-                hum_par(n)
-                + eta_occ * (occ_par(1, n) + occ_par(2, n))
-                - eta_vent * v_par(n)
+                hum_par(nid)
+                + eta_occ * (occ_par(1, nid) + occ_par(2, nid))
+                - eta_vent * v_par(nid)
         )
 
         # Humidity-triggered ventilation
         model.c.add(model.hum[nid] <= H_high + M_hum * model.v[nid])
 
         # Ventilation startup detection at this node
-        model.c.add(model.s[nid] >= model.v[nid] - v_par(n))
+        model.c.add(model.s[nid] >= model.v[nid] - v_par(nid))
         model.c.add(model.s[nid] <= model.v[nid])
-        model.c.add(model.s[nid] <= 1 - v_par(n))
+        model.c.add(model.s[nid] <= 1 - v_par(nid))
 
-        # Minimum uptime: walk up ancestors within min_up_time-1 steps
-        ancestor = n
-        for _ in range(1, min_up_time):
-            if ancestor["parent_id"] is None:
+        # Minimum uptime: ancestors within min_up_time-1 steps (ancestor table of the tree)
+        for depth in range(1, min_up_time):
+            ancestor = ancestors[nid][depth - 1]
+            if ancestor < 0:
                 break
-            ancestor = node_by_id[ancestor["parent_id"]]
-            if ancestor["tau"] == 0:
+            if tau_of[ancestor] == 0:
                 model.c.add(model.v[nid] >= model.s0)
                 break
             else:
-                model.c.add(model.v[nid] >= model.s[ancestor["id"]])
+                model.c.add(model.v[nid] >= model.s[ancestor])
+
+    timing.add_phase("model", time.perf_counter() - build_start)
+
+    return model
 
-    # SOLVE
+
+def solve_hybrid_model(model, time_limit=10.0):
+    """
+    Solves the hybrid MILP built by build_hybrid_model within time_limit seconds.
+    Returns the here-and-now decisions (p1, p2, v), or None if no solution was found
+    (the best solution found is accepted when the time limit is hit).
+    """
     solver = SolverFactory('gurobi')
-    result = solver.solve(model, options={
-        "OutputFlag": 0,
-        "TimeLimit":  10.0,
-        "MIPGap":     0.01,
-    })
+    with timing.phase("solve"):
+        result = solver.solve(model, options={
+            "OutputFlag": 0,
+            "TimeLimit":  time_limit,
+            "MIPGap":     0.01,
+        }, load_solutions=False)
 
     tc = result.solver.termination_condition
-    if tc not in (TerminationCondition.optimal, TerminationCondition.maxTimeLimit):
-        print(f"[WARNING] Hybrid did not solve (tc={tc}) — returning zeros")
-        return 0.0, 0.0, 0
+    if tc not in (TerminationCondition.optimal, TerminationCondition.maxTimeLimit) or len(result.solution) == 0:
+        return None
+
+    model.solutions.load_from(result)
 
     p1 = value(model.p0[1])
     p2 = value(model.p0[2])
@@ -380,6 +404,47 @@ def solve_hybrid(state, nodes):
     return p1, p2, v
 
 
+# HYBRID MILP SOLVER
+def solve_hybrid(state, tree):
+    """
+    Builds and solves the hybrid MILP (see build_hybrid_model).
+    Returns the here-and-now decisions (p1, p2, v) for tau=0, or zeros if the solver fails.
+    """
+    decision = solve_hybrid_model(build_hybrid_model(state, tree))
+
+    if decision is None:
+        print("[WARNING] Hybrid did not solve — returning zeros")
+        return 0.0, 0.0, 0
+
+    return decision
+
+
+def select_action_anytime(state, time_budget, B, N_samples=100):
+    """
+    Deadline-aware version of the policy: the scenario tree is deepened one level
+    at a time (up to the end of the day) and the hybrid MILP is solved on each
+    tree, until time_budget seconds are used. The VFA terminal cost is always
+    applied at the leaves of the current tree.
+    Returns the here-and-now decisions (p1, p2, v) of the deepest tree solved in time.
+    """
+    root = build_tree(state, L=0, B=B, N_samples=N_samples)
+
+    decision, depth = solve_anytime(
+        root,
+        deepen=lambda tree: deepen_tree(tree, B, N_samples),
+        solve=lambda tree, time_limit: solve_hybrid_model(build_hybrid_model(state, tree), time_limit),
+        max_depth=T - 1 - state["current_time"],
+        time_budget=time_budget,
+        growth=B
+    )
+
+    if decision is None:
+        print("[WARNING] Hybrid found no solution within the time budget — returning zeros")
+        return 0.0, 0.0, 0
+
+    return decision
+
+
 def calculate_number_of_active_overrides(state):
     count = 0
     if state["low_override_r1"]:
@@ -407,12 +472,17 @@ def select_action(state):
         # step beyond, giving Gurobi visibility of the full commitment cost.
         # Near the end of the day the lookahead is shortened to avoid empty trees.
         # B=3 keeps the tree manageable at L=4 (3+9+27+81 = 120 future nodes).
-        L = min(4, T - 1 - state["current_time"])
-        B = 3
+        L = min(LOOKAHEAD, T - 1 - state["current_time"])
+        B = BRANCHING
 
-        nodes = build_tree(state, L=L, B=B, N_samples=100)
+        if TIME_BUDGET is not None:
+            p1, p2, v = select_action_anytime(state, TIME_BUDGET, B=B, N_samples=N_SAMPLES)
+
+        else:
+            with timing.phase("tree"):
+                tree = forecast_tree(state, L, B)
 
-        p1, p2, v = solve_hybrid(state, nodes)
+            p1, p2, v = solve_hybrid(state, tree)
 
         return {
             "HeatPowerRoom1": p1,
@@ -2,6 +2,7 @@ from pathlib import Path
 from pyomo.environ import *
 import numpy as np
 from Utils.v2_SystemCharacteristics import get_fixed_data
+from Utils.dataset import load_dataset
 import pandas as pd
 
 FILE_DIR = Path(__file__).parent  # directory where this file is located
@@ -10,9 +11,10 @@ OUTPUT_DIR = FILE_DIR / "results"  # name of the folder where results will be sa
 
 # Import data
 data = get_fixed_data()
-occupancy1_matrix = np.genfromtxt("Data/OccupancyRoom1.csv", delimiter=",", skip_header=1)
-occupancy2_matrix = np.genfromtxt("Data/OccupancyRoom2.csv", delimiter=",", skip_header=1)
-raw_price_data = np.genfromtxt("Data/v2_PriceData.csv", delimiter=",", skip_header=1)
+dataset = load_dataset()
+occupancy1_matrix = dataset["occupancy1"]
+occupancy2_matrix = dataset["occupancy2"]
+raw_price_data = dataset["price_data"]
 price_data     = raw_price_data[:, 1:]   # now price_data[day, 0] = price_t0, ..., price_data[day, 9] = price_t9
 
 # Join data to index by room
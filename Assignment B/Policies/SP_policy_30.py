@@ -8,11 +8,11 @@ Updating B
 
 import time
 from pyomo.environ import *
-from sklearn.cluster import KMeans
-import numpy as np
-from Utils.PriceProcessRestaurant import price_model
-from Utils.OccupancyProcessRestaurant import next_occupancy_levels
 from Utils.v2_SystemCharacteristics import get_fixed_data
+from Utils import timing, precompute
+from Utils.anytime import solve_anytime
+from Utils.scenario_tree import RollingTree, ScenarioTree, as_tree, build_levels, expand_level
+from Utils.tree_cache import TreeCache
 
 # parameters extraction from system characteristics
 data        = get_fixed_data()
@@ -36,6 +36,29 @@ min_up_time = data['vent_min_up_time']
 M_temp = 50  # big-M constant for temperature ()
 M_hum = 100   # big-M constant for humidity
 
+# Tunable parameters (trade-off between solution quality and computational time), can be overridden by Sweep.py
+LOOKAHEAD           = 4    # lookahead horizon L (shortened near the end of the day)
+BRANCHING           = 3    # branching factor B
+BRANCHING_OVERRIDES = 4    # branching factor when more than one override is active
+N_SAMPLES           = 100  # raw samples per node before clustering
+CHILD_GENERATOR     = "sampling" # "sampling" (N_SAMPLES samples + clustering), "quadrature" or "lattice" (deterministic, see Utils.quadrature and Utils.lattice)
+REDUCTION           = "batch"    # clustering of the samples: "batch", "quantile" or "sklearn" (see Utils.scenario_reduction)
+REUSE_TREE          = False      # keep the tree of the previous hour and reuse the subtree of the child closest to the realized state (changes the decisions, see RollingTree)
+REUSE_DISTANCE      = 1.5        # largest distance to that child, in one-step noise standard deviations, otherwise the tree is rebuilt
+PRECOMPUTED_STORE   = None       # store of Utils.precompute (e.g. "Data/precomputed.npz"): seeded evaluation runs read their trees from it (before REUSE_TREE and the tree cache)
+TREE_CACHE_SIZE     = 0          # trees kept by the cache of quantized roots (see Utils.tree_cache), 0 disables it
+TREE_CACHE_RESOLUTION = (0.1, 0.1, 0.5, 0.5) # grid cells of the cache: price_t, price_previous, Occ1, Occ2
+
+# Anytime mode: if set, each decision grows the tree level by level and returns the deepest solution found
+# within this many seconds (the environment replaces decisions slower than 15 s by the dummy action)
+TIME_BUDGET = None
+
+# Tree of the previous hour, reused by select_action when REUSE_TREE is set (see Utils.scenario_tree.RollingTree)
+rolling_tree = RollingTree()
+
+# Trees of recently met roots, used by build_tree when TREE_CACHE_SIZE > 0 (see Utils.tree_cache.TreeCache)
+tree_cache = TreeCache()
+
 # Note: initial conditions (T0, H0) are not extracted here because they are provided at runtime by the environment via the state dictionary 
 
 # The state will be provided by the environment as the following dictionary
@@ -55,7 +78,7 @@ M_hum = 100   # big-M constant for humidity
 
 
 # SCENARIO TREE BUILDER (iterative Branch & Cluster)
-def build_tree(state, L, B, N_samples = 100):
+def build_tree(state, L, B, N_samples = 100, rng = None):
     """
     Builds scenario tree using iterative Branch & Cluster.
 
@@ -64,72 +87,60 @@ def build_tree(state, L, B, N_samples = 100):
         L:         lookahead horizon (number of future steps)
         B:         branching factor (number of clusters per node)
         N_samples: raw samples generated per node before clustering
+        rng:       random stream of the samples (default: the stream of the current policy call, see Utils.seeding)
+
+    Returns:
+        ScenarioTree (structure of arrays, see Utils.scenario_tree) representing the full scenario tree
+    """
+
+    # one level per lookahead step, each level built at once from arrays (see Utils.scenario_tree)
+    def build(root):
+        return ScenarioTree.from_levels(build_levels(root, L, B, N_samples, rng, CHILD_GENERATOR, REDUCTION))
+
+    if TREE_CACHE_SIZE > 0:
+        return tree_cache.get(
+            state, L, B, build, settings=(N_samples, CHILD_GENERATOR, REDUCTION),
+            maxsize=TREE_CACHE_SIZE, resolution=TREE_CACHE_RESOLUTION
+        )
+    return build(state)
+
+
+def deepen_tree(tree, B, N_samples = 100, rng = None):
+    """
+    Adds one level to the scenario tree: every node of the deepest level gets B children (Branch & Cluster).
+    The nodes are processed in order of index, so growing a tree level by level gives the same tree as building it at once.
 
     Returns:
-        list of node dictionaries representing the full scenario tree
+        the ScenarioTree extended with the new level
+    """
+    level = expand_level(tree.level(tree.depth), B, N_samples, rng, CHILD_GENERATOR, REDUCTION) # the deepest level becomes the parents
+
+    return tree.extend(level)
+
+
+def forecast_tree(state, L, B):
+    """
+    Scenario tree of the decision: the precomputed tree of the call if the store has it (PRECOMPUTED_STORE),
+    otherwise the subtree of the previous hour's tree grown by one level when possible (REUSE_TREE), otherwise a
+    tree built from scratch (through the tree cache if TREE_CACHE_SIZE > 0). The store holds the trees built from
+    scratch, so with a store the decisions are those of a run without REUSE_TREE nor tree cache on every hour it
+    covers; the previous tree is dropped when a stored tree is used, so that the next hour does not re-root it.
     """
+    config = {"N_samples": N_SAMPLES, "generator": CHILD_GENERATOR, "reduction": REDUCTION}
+    tree = precompute.lookup(PRECOMPUTED_STORE, "tree", state, L, B, config)
+    if tree is not None:
+        rolling_tree.reset()
+        return tree
+
+    if REUSE_TREE:
+        return rolling_tree.get(
+            state, L, B,
+            build=lambda: build_tree(state, L=L, B=B, N_samples=N_SAMPLES),
+            deepen=lambda tree: deepen_tree(tree, B, N_SAMPLES),
+            max_distance=REUSE_DISTANCE
+        )
 
-    # root node (tau=0) - current state (no uncertainty)
-    root = {
-        "id":         0,
-        "tau":        0,
-        "parent_id":  None,
-        "price":      state["price_t"],
-        "price_prev": state["price_previous"],
-        "occ1":       state["Occ1"],
-        "occ2":       state["Occ2"],
-        "prob":       1.0 # certain
-    }
-
-    nodes = [root]   # list of dictionaries, each representing a node in the scenario tree with its features and probability
-    queue = [root]   # BFS queue (breadth-first search)
-    next_id = 1      # initialization of the next_id counter
-
-    while queue: # branching until the queue is empty (all nodes have been processed)
-        parent = queue.pop(0) # takes the first element of the queue list (parent node) and removes it (so the queue is updated to contain only the children)
-
-        if parent["tau"] >= L: # when we go beyond the lookahead horizon, we don't create children. When H becomes 0 (hour 10), we don't create any children
-            continue   # leaf node - no children
-
-        # BRANCHING: generate N_samples random children from this parent
-        # define the features of the child nodes: price, occ1, occ2
-        sample_prices = []
-        sample_occ1s  = []
-        sample_occ2s  = []
-
-        for _ in range(N_samples):
-            p = price_model(parent["price"], parent["price_prev"]) # price model needs the current price and the previous to generate a hypothetical price for the child node
-            o1, o2 = next_occupancy_levels(parent["occ1"], parent["occ2"]) # occupancy model needs the current values of room occupancies
-            sample_prices.append(p)
-            sample_occ1s.append(o1)
-            sample_occ2s.append(o2)
-
-        # CLUSTERING: reduce N_samples to B representative centroids
-        X         = np.column_stack([sample_prices, sample_occ1s, sample_occ2s]) # feature matrix with all the N samples rows
-        km        = KMeans(n_clusters=B, random_state=0, n_init=10).fit(X)
-        labels    = km.labels_
-        centroids = km.cluster_centers_   # reduced matrix of shape (B, 3)
-
-        # CREATING B child nodes from centroids
-        for b in range(B):
-            cluster_prob = np.sum(labels == b) / N_samples     # conditional probability
-
-            child = {
-                "id":         next_id,                         # unique ID for the child node
-                "tau":        parent["tau"] + 1,               # deep level in the tree
-                "parent_id":  parent["id"],                    # ID of the parent node
-                "price":      centroids[b, 0],                 # centroid price
-                "price_prev": parent["price"],                 # parent price becomes prev
-                "occ1":       centroids[b, 1],                 # centroid occ1
-                "occ2":       centroids[b, 2],                 # centroid occ2
-                "prob":       parent["prob"] * cluster_prob    # probability of the child according to the chain rule
-            }
-
-            nodes.append(child) # update the full list of nodes with the new child
-            queue.append(child) # updated the queue list with the new child, which will become the next parent for the next iteration of the while loop
-            next_id += 1
-
-    return nodes
+    return build_tree(state, L=L, B=B, N_samples=N_SAMPLES)
 
 
 def calculate_number_of_active_overrides(state):
@@ -147,17 +158,22 @@ def calculate_number_of_active_overrides(state):
     return number_of_active_overrides
 
 
-# SP MILP SOLVER 
-def solve_sp(state, nodes): # 2 dictionaries as inputs
+# SP MILP MODEL
+def build_sp_model(state, tree): # state dictionary and ScenarioTree (or list of node dictionaries) as inputs
     """
-    Builds and solves the multi-stage SP MILP on the scenario tree.
-    Returns the here-and-now decisions (p1, p2, v) for tau=0.
+    Builds the multi-stage SP MILP on the scenario tree.
+    Returns the Pyomo model, whose here-and-now decisions are model.p0 and model.v0.
     """
+    build_start = time.perf_counter()
     model = ConcreteModel()
 
     # SETUP
-    node_by_id   = {n["id"]: n for n in nodes}                  # dictionary with node IDs as keys for easy node lookup (Dictionary Comprehension)
-    nodes_future = [n for n in nodes if n["tau"] >= 1]          # list of only future nodes (tau>=1) lookup (Dictionary Comprehension)
+    tree         = as_tree(tree)
+    nodes_future = tree.future.tolist()                         # indices of the future nodes (tau>=1)
+    # tree arrays as Python lists: node values are looked up by index (plain floats in the Pyomo expressions)
+    parent, tau_of, prob, price = tree.parent.tolist(), tree.tau.tolist(), tree.prob.tolist(), tree.price.tolist()
+    occ       = {1: tree.occ1.tolist(), 2: tree.occ2.tolist()}  # occupancy of room r at every node
+    ancestors = tree.ancestors.tolist()                         # ancestors up to min_up_time-1 levels up (-1 above the root)
 
     t_now = state["current_time"] # current hour (0-9)
 
@@ -173,7 +189,7 @@ def solve_sp(state, nodes): # 2 dictionaries as inputs
 
     # SETS
     model.R     = RangeSet(1, 2) # 2 rooms. Automatically creates the set {1, 2} since indexes are numbers
-    model.NODES = Set(initialize=[n["id"] for n in nodes_future]) # pyomo set of node IDs for future nodes (tau>=1). Using set and initialize since the indexes are not numerical
+    model.NODES = Set(initialize=nodes_future) # pyomo set of node indices for future nodes (tau>=1). Using set and initialize since the indexes do not start at 1
 
 
     # VARIABLES 
@@ -197,45 +213,44 @@ def solve_sp(state, nodes): # 2 dictionaries as inputs
   
     # HELPER FUNCTIONS 
     """return parent value (variable or known parameter)"""
-    def v_par(node): # ventilation of the parent
-        return model.v0 if node["tau"] == 1 else model.v[node["parent_id"]]
+    def v_par(nid): # ventilation of the parent
+        return model.v0 if tau_of[nid] == 1 else model.v[parent[nid]]
 
-    def p_par(r, node): # heating of the power of room r
-        return model.p0[r] if node["tau"] == 1 else model.p[r, node["parent_id"]]
+    def p_par(r, nid): # heating of the power of room r
+        return model.p0[r] if tau_of[nid] == 1 else model.p[r, parent[nid]]
 
-    def temp_par(r, node): # temperature of room r at the parent node
-        if node["tau"] == 1:
+    def temp_par(r, nid): # temperature of room r at the parent node
+        if tau_of[nid] == 1:
             return state["T1"] if r == 1 else state["T2"]
-        return model.temp[r, node["parent_id"]]
+        return model.temp[r, parent[nid]]
 
-    def temp_other_par(r, node): # temperature of the other room at the parent node
+    def temp_other_par(r, nid): # temperature of the other room at the parent node
         r_other = 3 - r
-        if node["tau"] == 1:
+        if tau_of[nid] == 1:
             return state["T1"] if r_other == 1 else state["T2"]
-        return model.temp[r_other, node["parent_id"]]
+        return model.temp[r_other, parent[nid]]
 
-    def hum_par(node): # humidity at the parent node
-        return state["H"] if node["tau"] == 1 else model.hum[node["parent_id"]]
+    def hum_par(nid): # humidity at the parent node
+        return state["H"] if tau_of[nid] == 1 else model.hum[parent[nid]]
 
-    def occ_par(r, node): # occupancy of room r at the parent node
-        if node["tau"] == 1:
+    def occ_par(r, nid): # occupancy of room r at the parent node
+        if tau_of[nid] == 1:
             return state["Occ1"] if r == 1 else state["Occ2"]
-        parent = node_by_id[node["parent_id"]]
-        return parent["occ1"] if r == 1 else parent["occ2"]
+        return occ[r][parent[nid]]
 
-    def u_par(r, node): # status of low-temp overrule controller of room r at the parent node
-        if node["tau"] == 1:
+    def u_par(r, nid): # status of low-temp overrule controller of room r at the parent node
+        if tau_of[nid] == 1:
             return int(low_override_init[r])   # int converts boolean (true or false)to 0/1 (in the environment is defined as true/false)
-        return model.u[r, node["parent_id"]]
+        return model.u[r, parent[nid]]
 
     
     # OBJECTIVE FUNCTION — minimize expected cost over lookahead horizon
     obj_expr = state["price_t"] * (
         model.p0[1] + model.p0[2] + P_vent * model.v0
     )
-    for n in nodes_future:
-        obj_expr += n["prob"] * n["price"] * (
-            model.p[1, n["id"]] + model.p[2, n["id"]] + P_vent * model.v[n["id"]]
+    for nid in nodes_future:
+        obj_expr += prob[nid] * price[nid] * (
+            model.p[1, nid] + model.p[2, nid] + P_vent * model.v[nid]
         )
     model.obj = Objective(expr=obj_expr, sense=minimize)
 
@@ -266,15 +281,14 @@ def solve_sp(state, nodes): # 2 dictionaries as inputs
     if remaining_forced >= 1: # check if the ventilation need to be forced ON at tau=0
         model.v0.fix(1) # force the ventilation ON
 
-    for n in nodes_future: # check the immediate children nodes
-        if n["tau"] == 1 and remaining_forced >= 2:
-            model.v[n["id"]].fix(1) # fix the next hour ventilation to be ON
+    for nid in nodes_future: # check the immediate children nodes
+        if tau_of[nid] == 1 and remaining_forced >= 2:
+            model.v[nid].fix(1) # fix the next hour ventilation to be ON
 
 
     # FUTURE NODES CONSTRAINTS
-    for n in nodes_future: # we look each future node (tau>=1) and we add the corresponding constraints
-        nid   = n["id"]
-        tau   = n["tau"]
+    for nid in nodes_future: # we look each future node (tau>=1) and we add the corresponding constraints
+        tau   = tau_of[nid]
         t_parent = t_now + tau - 1 # hour of the parent node of the one we are looking at
         t_out = T_out[min(t_parent, len(T_out) - 1)] # external temperature a the parent node. the min is used as a safety measure (before we implemented the variability of L), but USELESS
 
@@ -282,12 +296,12 @@ def solve_sp(state, nodes): # 2 dictionaries as inputs
 
             # TEMPERATURE DYNAMICS (eq. 2)
             model.c.add(
-                model.temp[r, nid] == temp_par(r, n) # temperature value in the parent node 
-                    + zeta_exch * (temp_other_par(r, n) - temp_par(r, n)) # heat exchange with the other room
-                    - zeta_loss * (temp_par(r, n) - t_out) # thermal loss to the outside
-                    + zeta_conv * p_par(r, n) # heating power contribution (of the previous node/hour)
-                    - zeta_cool * v_par(n) # cooling effect of the ventilation
-                    + zeta_occ  * occ_par(r, n) # heating effect of the occupancy (more people generate more heat)
+                model.temp[r, nid] == temp_par(r, nid) # temperature value in the parent node 
+                    + zeta_exch * (temp_other_par(r, nid) - temp_par(r, nid)) # heat exchange with the other room
+                    - zeta_loss * (temp_par(r, nid) - t_out) # thermal loss to the outside
+                    + zeta_conv * p_par(r, nid) # heating power contribution (of the previous node/hour)
+                    - zeta_cool * v_par(nid) # cooling effect of the ventilation
+                    + zeta_occ  * occ_par(r, nid) # heating effect of the occupancy (more people generate more heat)
             )
 
             # LOW-TEMP OVERRULE CONTROLLER (eq. 8-16)
@@ -300,11 +314,11 @@ def solve_sp(state, nodes): # 2 dictionaries as inputs
             # activation: temp < T_low → u=1 (eq. 12)
             model.c.add(model.u[r, nid] >= model.y_low[r, nid])
             # memory: u stays ON only if was ON before (eq. 13)
-            model.c.add(model.u[r, nid] <= u_par(r, n) + model.y_low[r, nid])
+            model.c.add(model.u[r, nid] <= u_par(r, nid) + model.y_low[r, nid])
             # force power to max when overrule active (eq. 14)
             model.c.add(model.p[r, nid] >= P_max * model.u[r, nid])
             # deactivation: temp > T_ok → u=0 (eq. 15-16)
-            model.c.add(model.u[r, nid] >= u_par(r, n) - model.y_ok[r, nid])
+            model.c.add(model.u[r, nid] >= u_par(r, nid) - model.y_ok[r, nid])
             model.c.add(model.u[r, nid] <= 1 - model.y_ok[r, nid])
 
             # HIGH-TEMP OVERRULE CONTROLLER (eq. 5-7)
@@ -317,9 +331,9 @@ def solve_sp(state, nodes): # 2 dictionaries as inputs
         # HUMIDITY DYNAMICS (solution eq. 3)
         model.c.add(
             model.hum[nid] ==
-                hum_par(n) # humidity value in the present node (parent)
-                + eta_occ * (occ_par(1, n) + occ_par(2, n)) # humidity increase due to occupancy
-                - eta_vent * v_par(n) # humidity decrease due to ventilation
+                hum_par(nid) # humidity value in the present node (parent)
+                + eta_occ * (occ_par(1, nid) + occ_par(2, nid)) # humidity increase due to occupancy
+                - eta_vent * v_par(nid) # humidity decrease due to ventilation
         )
 
         # HUMIDITY OVERRULE CONTROLLER(eq. 21)
@@ -327,29 +341,45 @@ def solve_sp(state, nodes): # 2 dictionaries as inputs
 
         # VENTILATION INERTIA (eq. 17-20)
         # startup detection at this node
-        model.c.add(model.s[nid] >= model.v[nid] - v_par(n)) # ON at this node and OFF at the parent means startup
+        model.c.add(model.s[nid] >= model.v[nid] - v_par(nid)) # ON at this node and OFF at the parent means startup
         model.c.add(model.s[nid] <= model.v[nid]) # if ventilation is OFF at this node, then no startup
-        model.c.add(model.s[nid] <= 1 - v_par(n)) # ON at the parent means no startup at this node
-        # minimum uptime: walk up ancestors within min_up_time-1 steps
-        ancestor = n # starting point is this node
+        model.c.add(model.s[nid] <= 1 - v_par(nid)) # ON at the parent means no startup at this node
+        # minimum uptime: ancestors within min_up_time-1 steps, from the precomputed ancestor table of the tree
         for depth in range(1, min_up_time): # min_up_time is 3 consecutive hours
-            if ancestor["parent_id"] is None: # if the current node hasn't any parent, that means it is the root node. it doesn't have any ancestor
+            ancestor = ancestors[nid][depth - 1] # ancestor depth levels up
+            if ancestor < 0: # above the root, no more ancestors
                 break
-            ancestor = node_by_id[ancestor["parent_id"]] # first step up to the parent
-            if ancestor["tau"] == 0: # root node is reached, use the here-and-now variable v0 as ancestor value
+            if tau_of[ancestor] == 0: # root node is reached, use the here-and-now variable v0 as ancestor value
                 model.c.add(model.v[nid] >= model.s0) # if startup at tau=0, the ventilation of this future node is forced to be ON
                 break
             else:
-                model.c.add(model.v[nid] >= model.s[ancestor["id"]]) # if startup, then s = 1  and forces v to be 1 (because we are in between tat=0 and tau=L, so if startup, then future node is forced to be ON)
+                model.c.add(model.v[nid] >= model.s[ancestor]) # if startup, then s = 1  and forces v to be 1 (because we are in between tat=0 and tau=L, so if startup, then future node is forced to be ON)
 
     
-    # SOLVE
+    timing.add_phase("model", time.perf_counter() - build_start)
+
+    return model
+
+
+def solve_sp_model(model, time_limit=None):
+    """
+    Solves the SP MILP built by build_sp_model, within time_limit seconds if given.
+    Returns the here-and-now decisions (p1, p2, v), or None if no solution was found
+    (the best solution found is accepted when the time limit is hit).
+    """
+    options = {"OutputFlag": 0} # suppress solver output for cleaner logs
+    if time_limit is not None:
+        options["TimeLimit"] = time_limit
+
     solver = SolverFactory('gurobi')
-    result = solver.solve(model, options={"OutputFlag": 0}) # suppress solver output for cleaner logs
+    with timing.phase("solve"):
+        result = solver.solve(model, options=options, load_solutions=False)
 
-    if result.solver.termination_condition != TerminationCondition.optimal:
-        print("[WARNING] SP did not solve to optimality — returning zeros")
-        return 0.0, 0.0, 0
+    termination = result.solver.termination_condition
+    if termination != TerminationCondition.optimal and not (termination == TerminationCondition.maxTimeLimit and len(result.solution) > 0):
+        return None
+
+    model.solutions.load_from(result)
 
     p1 = value(model.p0[1])           # heating power of room 1 at tau=0
     p2 = value(model.p0[2])           # heating power of room 2 at tau=0
@@ -358,6 +388,45 @@ def solve_sp(state, nodes): # 2 dictionaries as inputs
     return p1, p2, v
 
 
+# SP MILP SOLVER
+def solve_sp(state, tree):
+    """
+    Builds and solves the multi-stage SP MILP on the scenario tree.
+    Returns the here-and-now decisions (p1, p2, v) for tau=0.
+    """
+    decision = solve_sp_model(build_sp_model(state, tree))
+
+    if decision is None:
+        print("[WARNING] SP did not solve to optimality — returning zeros")
+        return 0.0, 0.0, 0
+
+    return decision
+
+
+def select_action_anytime(state, time_budget, B, N_samples = 100):
+    """
+    Deadline-aware version of the policy: the scenario tree is deepened one level at a time
+    (up to the end of the day) and the SP MILP is solved on each tree, until time_budget seconds are used.
+    Returns the here-and-now decisions (p1, p2, v) of the deepest tree solved in time.
+    """
+    root = build_tree(state, L=0, B=B, N_samples=N_samples)
+
+    decision, depth = solve_anytime(
+        root,
+        deepen=lambda tree: deepen_tree(tree, B, N_samples),
+        solve=lambda tree, time_limit: solve_sp_model(build_sp_model(state, tree), time_limit),
+        max_depth=T - 1 - state["current_time"],
+        time_budget=time_budget,
+        growth=B
+    )
+
+    if decision is None:
+        print("[WARNING] SP found no solution within the time budget — returning zeros")
+        return 0.0, 0.0, 0
+
+    return decision
+
+
 # ENTRY POINT (called by the environment)
 def select_action(state):    
     try:
@@ -367,16 +436,22 @@ def select_action(state):
 
         # Choose L and B based on number of active overrides
         if number_of_active_overrides > 1:
-           L, B = min(4, 9-state["current_time"]), 4
+           L, B = min(LOOKAHEAD, 9-state["current_time"]), BRANCHING_OVERRIDES
 
         else:
-           L, B = min(4, 9-state["current_time"]), 3 # lookahead horizon and branching factor (tunable parameters that affect the trade-off between solution quality and computational time)
+           L, B = min(LOOKAHEAD, 9-state["current_time"]), BRANCHING # lookahead horizon and branching factor (tunable parameters that affect the trade-off between solution quality and computational time)
 
-        # Forecast scenario tree
-        nodes = build_tree(state, L=L, B=B, N_samples=100)
+        if TIME_BUDGET is not None:
+            # Lookahead limited by the time budget instead of L
+            p1, p2, v = select_action_anytime(state, TIME_BUDGET, B=B, N_samples=N_SAMPLES)
+
+        else:
+            # Forecast scenario tree (precomputed, reused from the previous hour or built, see forecast_tree)
+            with timing.phase("tree"):
+                tree = forecast_tree(state, L, B)
 
-        # Solve SP MILP to get optimal action
-        p1, p2, v = solve_sp(state, nodes)
+            # Solve SP MILP to get optimal action
+            p1, p2, v = solve_sp(state, tree)
 
 
         # end = time.time()
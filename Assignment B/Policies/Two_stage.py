@@ -25,11 +25,14 @@ decisions across branches that have not yet diverged).
 
 import time
 from pyomo.environ import *
-from sklearn.cluster import KMeans
 import numpy as np
-from Utils.PriceProcessRestaurant import price_model
-from Utils.OccupancyProcessRestaurant import next_occupancy_levels
+from Utils.batch_processes import price_model_batch, next_occupancy_levels_batch
 from Utils.v2_SystemCharacteristics import get_fixed_data
+from Utils import timing, seeding
+from Utils.quadrature import quadrature_children
+from Utils.scenario_reduction import reduce_scenarios
+from Utils.scenario_tree import ScenarioTree, as_tree, root_level
+from Utils.tree_cache import TreeCache
 
 # System parameters
 data        = get_fixed_data()
@@ -53,9 +56,21 @@ min_up_time = data['vent_min_up_time']
 M_temp = 50   # big-M constant for temperature constraints
 M_hum  = 100  # big-M constant for humidity constraints
 
+# Tunable parameters (can be overridden by Sweep.py)
+LOOKAHEAD = 5    # lookahead horizon L (shortened near the end of the day)
+SCENARIOS = 9    # number of fan scenarios S (Stage-2 branches)
+N_SAMPLES = 150  # raw samples before clustering
+CHILD_GENERATOR = "sampling"  # "sampling" (N_SAMPLES samples + clustering, sampled chains) or "quadrature" (deterministic, see Utils.quadrature)
+REDUCTION       = "batch"     # clustering of the samples: "batch", "quantile" or "sklearn" (see Utils.scenario_reduction)
+TREE_CACHE_SIZE = 0           # trees kept by the cache of quantized roots (see Utils.tree_cache), 0 disables it
+TREE_CACHE_RESOLUTION = (0.1, 0.1, 0.5, 0.5) # grid cells of the cache: price_t, price_previous, Occ1, Occ2
+
+# Fan trees of recently met roots, used by build_fan_tree when TREE_CACHE_SIZE > 0 (see Utils.tree_cache.TreeCache)
+tree_cache = TreeCache()
+
 
 # FAN TREE BUILDER 
-def build_fan_tree(state, L, S, N_samples=100):
+def build_fan_tree(state, L, S, N_samples=100, rng=None):
     """
     Builds a fan-shaped scenario tree for two-stage SP.
 
@@ -69,89 +84,84 @@ def build_fan_tree(state, L, S, N_samples=100):
         L:         lookahead horizon (number of future steps)
         S:         number of scenarios (fan width, branching factor at root only)
         N_samples: raw samples generated at the root before clustering into S
+        rng:       random stream of the samples (default: the stream of the current policy call, see Utils.seeding)
 
     Returns:
-        list of node dictionaries representing the fan-shaped scenario tree
+        ScenarioTree (structure of arrays, see Utils.scenario_tree) representing the fan-shaped scenario tree
     """
+    if TREE_CACHE_SIZE > 0:
+        return tree_cache.get(
+            state, L, S, lambda root: _build_fan_tree(root, L, S, N_samples, rng),
+            settings=(N_samples, CHILD_GENERATOR, REDUCTION),
+            maxsize=TREE_CACHE_SIZE, resolution=TREE_CACHE_RESOLUTION
+        )
+    return _build_fan_tree(state, L, S, N_samples, rng)
+
+
+def _build_fan_tree(state, L, S, N_samples, rng):
+    """Fan tree of the state, built from scratch (see build_fan_tree)."""
 
     # Root node (tau=0) - current state, no uncertainty
-    root = {
-        "id":         0,
-        "tau":        0,
-        "parent_id":  None,
-        "price":      state["price_t"],
-        "price_prev": state["price_previous"],
-        "occ1":       state["Occ1"],
-        "occ2":       state["Occ2"],
-        "prob":       1.0
-    }
+    root = root_level(state)
+    rng  = seeding.get_rng() if rng is None else rng
 
-    nodes   = [root]
-    next_id = 1
-
-    # STAGE 1: branch root into S scenarios via sampling + KMeans
-    sample_prices, sample_occ1s, sample_occ2s = [], [], []
-    for _ in range(N_samples):
-        p        = price_model(root["price"], root["price_prev"])
-        o1, o2   = next_occupancy_levels(root["occ1"], root["occ2"])
-        sample_prices.append(p)
-        sample_occ1s.append(o1)
-        sample_occ2s.append(o2)
-
-    X         = np.column_stack([sample_prices, sample_occ1s, sample_occ2s])
-    km        = KMeans(n_clusters=S, random_state=0, n_init=10).fit(X)
-    labels    = km.labels_
-    centroids = km.cluster_centers_   # shape (S, 3)
-
-    # Create S first-level children (one per scenario) — these are the Stage-2 roots
-    scenario_heads = []  # the tau=1 node of each scenario chain
-    for s in range(S):
-        cluster_prob = np.sum(labels == s) / N_samples  # probability of this scenario
-
-        child = {
-            "id":         next_id,
-            "tau":        1,
-            "parent_id":  0,            # parent is root
-            "price":      centroids[s, 0],
-            "price_prev": root["price"],
-            "occ1":       centroids[s, 1],
-            "occ2":       centroids[s, 2],
-            "prob":       cluster_prob  # P(scenario s)
-        }
-        nodes.append(child)
-        scenario_heads.append(child)
-        next_id += 1
+    # STAGE 1: branch root into S scenarios via sampling + clustering (or deterministically by quadrature)
+    if CHILD_GENERATOR == "quadrature":
+        child_prices, child_occ1s, child_occ2s, cluster_probs = quadrature_children(
+            root["price"], root["price_prev"], root["occ1"], root["occ2"], S
+        )
+        centroids = np.column_stack([child_prices[0], child_occ1s[0], child_occ2s[0]])
+    else:
+        sample_prices              = price_model_batch(state["price_t"], state["price_previous"], N_samples, rng)
+        sample_occ1s, sample_occ2s = next_occupancy_levels_batch(state["Occ1"], state["Occ2"], N_samples, rng)
+
+        X = np.column_stack([sample_prices, sample_occ1s, sample_occ2s])[None] # a single parent
+        with timing.phase("reduction"):
+            centroids, cluster_probs, distances = reduce_scenarios(X, S, REDUCTION)
+        timing.add_metric("reduction_w1", distances.mean())
+        centroids, cluster_probs = centroids[0], cluster_probs[0]   # shape (S, 3) and (S,)
+
+    # S first-level children (one per scenario, parent is root) — these are the Stage-2 roots
+    scenario_heads = {
+        "parent":     np.zeros(S, dtype=int),
+        "price":      centroids[:, 0],
+        "price_prev": np.repeat(root["price"], S),
+        "occ1":       centroids[:, 1],
+        "occ2":       centroids[:, 2],
+        "prob":       np.asarray(cluster_probs, dtype=float)  # P(scenario s)
+    }
+    levels = [root, scenario_heads]
 
     # STAGE 2: extend each scenario as a LINEAR chain (no more branching)
     # Each chain samples one next step deterministically from the scenario head.
     # We use the centroid values as the starting point and propagate forward.
-    for head in scenario_heads:
-        current = head
-        for tau in range(2, L + 1):
-            # Sample one representative next step from the current node
-            # (single sample — no clustering needed, chain is linear)
-            p_next      = price_model(current["price"], current["price_prev"])
-            o1_next, o2_next = next_occupancy_levels(current["occ1"], current["occ2"])
-
-            next_node = {
-                "id":         next_id,
-                "tau":        tau,
-                "parent_id":  current["id"],
-                "price":      p_next,
-                "price_prev": current["price"],
-                "occ1":       o1_next,
-                "occ2":       o2_next,
-                "prob":       current["prob"]  # same probability as the scenario head (chain rule, single branch)
-            }
-            nodes.append(next_node)
-            current = next_node
-            next_id += 1
-
-    return nodes
+    # All the chains are advanced together, one step (tau) at a time, with one sample per chain
+    # (with quadrature, the single child of a chain node is the conditional mean of the next step).
+    for tau in range(2, L + 1):
+        chain_ends = levels[-1]
+        if CHILD_GENERATOR == "quadrature":
+            p_next, o1_next, o2_next, _ = quadrature_children(
+                chain_ends["price"], chain_ends["price_prev"], chain_ends["occ1"], chain_ends["occ2"], 1
+            )
+            p_next, o1_next, o2_next = p_next[:, 0], o1_next[:, 0], o2_next[:, 0]
+        else:
+            p_next             = price_model_batch(chain_ends["price"], chain_ends["price_prev"], rng=rng)
+            o1_next, o2_next   = next_occupancy_levels_batch(chain_ends["occ1"], chain_ends["occ2"], rng=rng)
+
+        levels.append({
+            "parent":     np.arange(S),          # node s of the previous step of the same chain
+            "price":      np.asarray(p_next, dtype=float),
+            "price_prev": chain_ends["price"],
+            "occ1":       np.asarray(o1_next, dtype=float),
+            "occ2":       np.asarray(o2_next, dtype=float),
+            "prob":       chain_ends["prob"]     # same probability as the scenario head (chain rule, single branch)
+        })
+
+    return ScenarioTree.from_levels(levels)
 
 
 # SP MILP SOLVER (identical to Task 3) 
-def solve_sp(state, nodes):
+def solve_sp(state, tree):
     """
     Builds and solves the two-stage SP MILP on the fan-shaped scenario tree.
     Returns the here-and-now decisions (p1, p2, v) for tau=0.
@@ -160,11 +170,15 @@ def solve_sp(state, nodes):
     the two-stage structure is entirely encoded in the tree topology built
     by build_fan_tree (the MILP formulation does not change).
     """
+    build_start = time.perf_counter()
     model = ConcreteModel()
 
-    # Setup
-    node_by_id   = {n["id"]: n for n in nodes}
-    nodes_future = [n for n in nodes if n["tau"] >= 1]
+    # Setup (tree as a structure of arrays, values looked up by node index)
+    tree         = as_tree(tree)
+    parent, tau_of, prob, price = tree.parent.tolist(), tree.tau.tolist(), tree.prob.tolist(), tree.price.tolist()
+    occ          = {1: tree.occ1.tolist(), 2: tree.occ2.tolist()}
+    ancestors    = tree.ancestors.tolist()
+    nodes_future = tree.future.tolist()
 
     t_now = state["current_time"]
 
@@ -177,7 +191,7 @@ def solve_sp(state, nodes):
 
     # Sets
     model.R     = RangeSet(1, 2)
-    model.NODES = Set(initialize=[n["id"] for n in nodes_future])
+    model.NODES = Set(initialize=nodes_future)
 
     # Variables — here-and-now (tau=0)
     model.p0 = Var(model.R, within=NonNegativeReals, bounds=(0, P_max))
@@ -196,44 +210,43 @@ def solve_sp(state, nodes):
     model.y_high = Var(model.R, model.NODES, within=Binary)
 
     # Helper functions — return parent value (variable or known parameter)
-    def v_par(node):
-        return model.v0 if node["tau"] == 1 else model.v[node["parent_id"]]
+    def v_par(nid):
+        return model.v0 if tau_of[nid] == 1 else model.v[parent[nid]]
 
-    def p_par(r, node):
-        return model.p0[r] if node["tau"] == 1 else model.p[r, node["parent_id"]]
+    def p_par(r, nid):
+        return model.p0[r] if tau_of[nid] == 1 else model.p[r, parent[nid]]
 
-    def temp_par(r, node):
-        if node["tau"] == 1:
+    def temp_par(r, nid):
+        if tau_of[nid] == 1:
             return state["T1"] if r == 1 else state["T2"]
-        return model.temp[r, node["parent_id"]]
+        return model.temp[r, parent[nid]]
 
-    def temp_other_par(r, node):
+    def temp_other_par(r, nid):
         r_other = 3 - r
-        if node["tau"] == 1:
+        if tau_of[nid] == 1:
             return state["T1"] if r_other == 1 else state["T2"]
-        return model.temp[r_other, node["parent_id"]]
+        return model.temp[r_other, parent[nid]]
 
-    def hum_par(node):
-        return state["H"] if node["tau"] == 1 else model.hum[node["parent_id"]]
+    def hum_par(nid):
+        return state["H"] if tau_of[nid] == 1 else model.hum[parent[nid]]
 
-    def occ_par(r, node):
-        if node["tau"] == 1:
+    def occ_par(r, nid):
+        if tau_of[nid] == 1:
             return state["Occ1"] if r == 1 else state["Occ2"]
-        parent = node_by_id[node["parent_id"]]
-        return parent["occ1"] if r == 1 else parent["occ2"]
+        return occ[r][parent[nid]]
 
-    def u_par(r, node):
-        if node["tau"] == 1:
+    def u_par(r, nid):
+        if tau_of[nid] == 1:
             return int(low_override_init[r])
-        return model.u[r, node["parent_id"]]
+        return model.u[r, parent[nid]]
 
     # Objective = Stage 1 cost (certain) + expected Stage 2 cost
     obj_expr = state["price_t"] * (
         model.p0[1] + model.p0[2] + P_vent * model.v0
     )
-    for n in nodes_future:
-        obj_expr += n["prob"] * n["price"] * (
-            model.p[1, n["id"]] + model.p[2, n["id"]] + P_vent * model.v[n["id"]]
+    for nid in nodes_future:
+        obj_expr += prob[nid] * price[nid] * (
+            model.p[1, nid] + model.p[2, nid] + P_vent * model.v[nid]
         )
     model.obj = Objective(expr=obj_expr, sense=minimize)
 
@@ -259,14 +272,13 @@ def solve_sp(state, nodes):
     if remaining_forced >= 1:
         model.v0.fix(1)              # minimum uptime not yet satisfied: force ON
 
-    for n in nodes_future:
-        if n["tau"] == 1 and remaining_forced >= 2:
-            model.v[n["id"]].fix(1)  # force tau=1 ventilation ON as well
+    for nid in nodes_future:
+        if tau_of[nid] == 1 and remaining_forced >= 2:
+            model.v[nid].fix(1)  # force tau=1 ventilation ON as well
 
     # Future nodes constraints (tau>=1)
-    for n in nodes_future:
-        nid      = n["id"]
-        tau      = n["tau"]
+    for nid in nodes_future:
+        tau      = tau_of[nid]
         t_parent = t_now + tau - 1
         t_out_val = T_out[min(t_parent, len(T_out) - 1)]
 
@@ -275,12 +287,12 @@ def solve_sp(state, nodes):
             # Temperature dynamics
             model.c.add(
                 model.temp[r, nid] ==
-                    temp_par(r, n)
-                    + zeta_exch * (temp_other_par(r, n) - temp_par(r, n))
-                    - zeta_loss * (temp_par(r, n) - t_out_val)
-                    + zeta_conv * p_par(r, n)
-                    - zeta_cool * v_par(n)
-                    + zeta_occ  * occ_par(r, n)
+                    temp_par(r, nid)
+                    + zeta_exch * (temp_other_par(r, nid) - temp_par(r, nid))
+                    - zeta_loss * (temp_par(r, nid) - t_out_val)
+                    + zeta_conv * p_par(r, nid)
+                    - zeta_cool * v_par(nid)
+                    + zeta_occ  * occ_par(r, nid)
             )
 
             # Low-temp overrule controller
@@ -289,9 +301,9 @@ def solve_sp(state, nodes):
             model.c.add(model.temp[r, nid] >= T_ok  - M_temp * (1 - model.y_ok[r, nid]))
             model.c.add(model.temp[r, nid] <= T_ok  + M_temp * model.y_ok[r, nid])
             model.c.add(model.u[r, nid] >= model.y_low[r, nid])
-            model.c.add(model.u[r, nid] <= u_par(r, n) + model.y_low[r, nid])
+            model.c.add(model.u[r, nid] <= u_par(r, nid) + model.y_low[r, nid])
             model.c.add(model.p[r, nid] >= P_max * model.u[r, nid])
-            model.c.add(model.u[r, nid] >= u_par(r, n) - model.y_ok[r, nid])
+            model.c.add(model.u[r, nid] >= u_par(r, nid) - model.y_ok[r, nid])
             model.c.add(model.u[r, nid] <= 1 - model.y_ok[r, nid])
 
             # High-temp overrule controller
@@ -302,34 +314,35 @@ def solve_sp(state, nodes):
         # Humidity dynamics
         model.c.add(
             model.hum[nid] ==
-                hum_par(n)
-                + eta_occ  * (occ_par(1, n) + occ_par(2, n))
-                - eta_vent * v_par(n)
+                hum_par(nid)
+                + eta_occ  * (occ_par(1, nid) + occ_par(2, nid))
+                - eta_vent * v_par(nid)
         )
 
         # Humidity overrule controller
         model.c.add(model.hum[nid] <= H_high + M_hum * model.v[nid])
 
         # Ventilation inertia
-        model.c.add(model.s[nid] >= model.v[nid] - v_par(n))
+        model.c.add(model.s[nid] >= model.v[nid] - v_par(nid))
         model.c.add(model.s[nid] <= model.v[nid])
-        model.c.add(model.s[nid] <= 1 - v_par(n))
+        model.c.add(model.s[nid] <= 1 - v_par(nid))
 
-        # Minimum uptime: walk up ancestors within min_up_time-1 steps
-        ancestor = n
+        # Minimum uptime: ancestors within min_up_time-1 steps (ancestor table of the tree)
         for depth in range(1, min_up_time):
-            if ancestor["parent_id"] is None:
+            ancestor = ancestors[nid][depth - 1]
+            if ancestor < 0:
                 break
-            ancestor = node_by_id[ancestor["parent_id"]]
-            if ancestor["tau"] == 0:
+            if tau_of[ancestor] == 0:
                 model.c.add(model.v[nid] >= model.s0)
                 break
             else:
-                model.c.add(model.v[nid] >= model.s[ancestor["id"]])
+                model.c.add(model.v[nid] >= model.s[ancestor])
 
     # Solve
+    timing.add_phase("model", time.perf_counter() - build_start)
     solver = SolverFactory('gurobi')
-    result = solver.solve(model, options={"OutputFlag": 0})
+    with timing.phase("solve"):
+        result = solver.solve(model, options={"OutputFlag": 0})
 
     if result.solver.termination_condition != TerminationCondition.optimal:
         print("[WARNING] Two-stage SP did not solve to optimality — returning zeros")
@@ -354,11 +367,12 @@ def select_action(state):
     try:
         start = time.time()
 
-        L = min(5, 9 - state["current_time"])  # lookahead horizon
-        S = 9                                  # number of fan scenarios (Stage-2 branches)
+        L = min(LOOKAHEAD, 9 - state["current_time"])  # lookahead horizon
+        S = SCENARIOS                                  # number of fan scenarios (Stage-2 branches)
 
-        nodes    = build_fan_tree(state, L=L, S=S, N_samples=150)
-        p1, p2, v = solve_sp(state, nodes)
+        with timing.phase("tree"):
+            tree = build_fan_tree(state, L=L, S=S, N_samples=N_SAMPLES)
+        p1, p2, v = solve_sp(state, tree)
 
         end = time.time()
         # print(f"Two-stage SP time: {end - start:.2f} s")
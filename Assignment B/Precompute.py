@@ -0,0 +1,50 @@
+"""
+Builds the offline store of Utils.precompute with the current settings of the policies: the scenario trees of
+SP_policy_30 and Hybrid_policy_30, the clusters of ADP_policy_30 and the forecasts of DL_policy_30 of every day
+and hour of the evaluation dataset, for the master seed of the evaluation runs.
+Set PRECOMPUTED_STORE = "Data/precomputed.npz" in the policies to read them.
+
+    python Precompute.py
+"""
+
+from Policies import SP_policy_30, Hybrid_policy_30, ADP_policy_30, DL_policy_30
+from Utils.precompute import precompute
+
+from functools import partial
+import time
+
+
+def policy_config():
+    """Settings of the policies the inputs are built with (an entry is only used by a policy with the same ones)."""
+    return {
+        "tree":     {"N_samples": SP_policy_30.N_SAMPLES, "generator": SP_policy_30.CHILD_GENERATOR, "reduction": SP_policy_30.REDUCTION},
+        "clusters": {"N_samples": ADP_policy_30.N_SAMPLES, "reduction": ADP_policy_30.REDUCTION},
+        "forecast": {"n_samples": DL_policy_30.FORECAST_SAMPLES}
+    }
+
+
+def policy_builders():
+    """Builders of the inputs (see Utils.precompute.precompute), with the settings of policy_config."""
+    config = policy_config()
+    tree_shapes = {
+        (SP_policy_30.LOOKAHEAD, SP_policy_30.BRANCHING),
+        (SP_policy_30.LOOKAHEAD, SP_policy_30.BRANCHING_OVERRIDES),
+        (Hybrid_policy_30.LOOKAHEAD, Hybrid_policy_30.BRANCHING)
+    }
+    return {
+        "tree":     (partial(SP_policy_30.build_tree, N_samples=config["tree"]["N_samples"]), sorted(tree_shapes)),
+        "clusters": (partial(ADP_policy_30.generate_samples, N_samples=config["clusters"]["N_samples"]), [ADP_policy_30.BRANCHING]),
+        "forecast": (partial(DL_policy_30.forecast_uncertainties, n_samples=config["forecast"]["n_samples"]), [10])
+    }
+
+
+# Variables to set before building the store:
+SEED      = 0  # master seed of the evaluation runs that will use the store (main.SEED)
+DAYS      = range(100)
+N_WORKERS = 8
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    path = precompute(DAYS, SEED, policy_builders(), policy_config(), n_workers=N_WORKERS)
+    print(f"Inputs of {len(DAYS)} days precomputed in {time.time() - start_time:.1f} seconds, saved to {path} ({path.stat().st_size / 1e6:.1f} MB)")
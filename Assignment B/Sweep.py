@@ -0,0 +1,138 @@
+"""
+Sweep over policies and parameter configurations.
+
+A configuration is a policy module and a dictionary of overrides of its tunable module constants
+(e.g. {"LOOKAHEAD": 3, "BRANCHING": 4} for SP_policy_30). All the (configuration, day) jobs of the sweep are
+scheduled on the same pre-warmed process pool (see Utils.worker_pool), so the data and the policies are loaded
+once per worker and the machine stays busy until the last job. Every configuration is evaluated on the same
+days with common random numbers (see Utils.seeding), and the results are gathered in a single table with the
+cost, the latency of the decisions and the configuration.
+"""
+
+from Policies import SP_policy_30, Hybrid_policy_30, Two_stage, ADP_policy_30
+from Environment import run_environment, merge_results
+from Utils.statistics import mean_confidence_interval
+from Utils.timing import latency_summary
+from Utils.worker_pool import get_pool
+
+from importlib import import_module
+from itertools import product
+import numpy as np
+import pandas as pd
+import time
+
+
+def grid(policy, **parameter_values):
+    """
+    Configurations of every combination of the given parameter values, e.g.
+    grid(SP_policy_30, LOOKAHEAD=[3, 4], BRANCHING=[2, 3]) gives 4 configurations.
+    """
+    names = list(parameter_values)
+    return [(policy, dict(zip(names, values))) for values in product(*parameter_values.values())]
+
+
+def check_configurations(configurations):
+    """Raises ValueError if a configuration overrides a parameter its policy does not have (a typo would silently evaluate the default)."""
+    for policy, overrides in configurations:
+        unknown = [name for name in overrides if not hasattr(policy, name)]
+        if unknown:
+            raise ValueError(f"{policy.__name__} has no parameters {unknown}")
+
+
+def run_configuration(policy_name, overrides, start, end, seed=None, scenario_directory=None):
+    """
+    Runs the days [start, end) with the module constants of the policy replaced by overrides.
+    The constants are restored afterwards, since pool workers run jobs of several configurations.
+    """
+    policy = import_module(policy_name)
+    defaults = {name: getattr(policy, name) for name in overrides}
+
+    try:
+        for name, value in overrides.items():
+            setattr(policy, name, value)
+        return run_environment(policy, start, end, scenario_directory=scenario_directory, seed=seed)
+    finally:
+        for name, value in defaults.items():
+            setattr(policy, name, value)
+
+
+def summarize_configuration(policy_name, overrides, results, confidence):
+    """One row of the sweep table: configuration, daily cost and decision latency."""
+    mean, half_width = mean_confidence_interval(results["objectives"], confidence)
+    summary = latency_summary(results["timings"])
+    latency = summary[(summary["group_by"] == "all") & (summary["measure"] == "latency")]
+    latency = latency.iloc[0] if len(latency) else None
+
+    return {
+        "policy": policy_name,
+        **overrides,
+        "n_days": len(results["objectives"]),
+        "mean_cost": mean,
+        "cost_half_width": half_width,
+        **{
+            f"latency_{stat}": (latency[stat] if latency is not None else np.nan)
+            for stat in ["mean", "p50", "p95", "p99", "max"]
+        },
+        "late_decisions": sum(record["status"] != "ok" for record in results["timings"])
+    }
+
+
+def run_sweep(configurations, n_experiments, n_workers=1, seed=0, confidence=0.95):
+    """
+    Evaluates every (policy, overrides) configuration on days [0, n_experiments).
+    Returns a DataFrame with one row per configuration (overridden parameters as columns, NaN when a
+    configuration keeps the default of the policy).
+    """
+    check_configurations(configurations)
+
+    jobs = [
+        (config_index, policy.__name__, overrides, day)
+        for config_index, (policy, overrides) in enumerate(configurations)
+        for day in range(n_experiments)
+    ]
+    print(f"Sweep of {len(configurations)} configurations x {n_experiments} days = {len(jobs)} jobs on {n_workers} workers")
+
+    start_time = time.time()
+
+    if n_workers > 1:
+        executor = get_pool(n_workers, sorted({policy.__name__ for policy, _ in configurations}))
+        futures = [
+            executor.submit(run_configuration, policy_name, overrides, day, day + 1, seed)
+            for _, policy_name, overrides, day in jobs
+        ]
+        job_results = [future.result()[1] for future in futures]
+    else:
+        job_results = [
+            run_configuration(policy_name, overrides, day, day + 1, seed)[1]
+            for _, policy_name, overrides, day in jobs
+        ]
+
+    # Jobs are listed configuration by configuration and in day order
+    rows = []
+    for config_index, (policy, overrides) in enumerate(configurations):
+        config_results = [results for job, results in zip(jobs, job_results) if job[0] == config_index]
+        _, results = merge_results(config_results)
+        rows.append(summarize_configuration(policy.__name__, overrides, results, confidence))
+
+    print(f"Sweep finished in {time.time() - start_time:.2f} seconds")
+
+    return pd.DataFrame(rows)
+
+
+# Configurations to evaluate:
+CONFIGURATIONS = (
+    grid(SP_policy_30, LOOKAHEAD=[3, 4], BRANCHING=[2, 3])
+    + grid(Hybrid_policy_30, LOOKAHEAD=[3, 4])
+    + grid(Two_stage, SCENARIOS=[6, 9], N_SAMPLES=[150])
+    + grid(ADP_policy_30, BRANCHING=[3, 5])
+)
+N_EXPERIMENTS = 100
+SEED          = 0
+N_WORKERS     = 8
+
+
+if __name__ == "__main__":
+    sweep_table = run_sweep(CONFIGURATIONS, N_EXPERIMENTS, n_workers=N_WORKERS, seed=SEED)
+    sweep_table.to_csv("results/sweep.csv", index=False)
+    print(sweep_table.to_string(index=False))
+    print("\nSweep saved to results/sweep.csv")
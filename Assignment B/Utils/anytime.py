@@ -0,0 +1,56 @@
+"""
+Deadline-aware iterative deepening for the scenario-tree policies.
+
+Instead of fixing the lookahead L beforehand, the tree is grown one level at a time and the MILP is
+solved again on every tree (depth 0 is the myopic problem on the root alone, which is fast and always
+gives a decision). The decision of the deepest tree solved within the deadline is returned.
+A level is only started if, extrapolating from the previous one (the tree and the MILP grow by a factor
+of about B per level), it is expected to finish before the deadline; the solver gets the remaining
+time as time limit, so an overrunning level costs at most the time left.
+A level whose solve raises an error ends the deepening.
+"""
+
+import time
+
+
+def solve_anytime(nodes, deepen, solve, max_depth, time_budget, growth=3.0):
+    """
+    Args:
+        nodes:       initial tree (usually only the root)
+        deepen:      function nodes -> nodes, adding one level to the tree
+        solve:       function (nodes, time_limit) -> here-and-now decision, or None if no solution was found
+        max_depth:   deepest tree to consider (e.g. the remaining hours of the day)
+        time_budget: seconds available for the whole decision
+        growth:      expected ratio between the time of a level and the time of the previous one
+
+    Returns:
+        (decision, depth) of the deepest tree solved in time, or (None, -1) if not even the root was solved
+    """
+    deadline = time.perf_counter() + time_budget
+    best     = (None, -1)
+
+    for depth in range(max_depth + 1):
+        level_start = time.perf_counter()
+
+        if depth > 0:
+            nodes = deepen(nodes)
+
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+
+        try:
+            decision = solve(nodes, remaining)
+        except Exception as e:
+            print(f"[WARNING] Solve at depth {depth} failed: {e}")
+            break # deeper trees would fail as well (e.g. model size limits)
+
+        if decision is not None:
+            best = (decision, depth)
+
+        # Do not start a level that is not expected to finish in time
+        now = time.perf_counter()
+        if now + growth * (now - level_start) > deadline:
+            break
+
+    return best
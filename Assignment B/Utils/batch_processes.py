@@ -0,0 +1,86 @@
+"""
+Vectorized samplers of the exogenous processes, and the parameters of the process models.
+
+price_model_batch and next_occupancy_levels_batch draw from the same distributions as price_model
+(Utils.PriceProcessRestaurant) and next_occupancy_levels (Utils.OccupancyProcessRestaurant), for many paths and
+samples at once and from a given random generator. The original models keep their parameters as local values,
+so they are written once here, for the samplers and for the closed-form moments of Utils.quadrature.
+"""
+
+import numpy as np
+
+# Price model: AR(2) with momentum and mean reversion, Gaussian noise, negative prices redrawn, bounds
+PRICE_MEAN, PRICE_REVERSION, PRICE_MOMENTUM, PRICE_STD = 4.0, 0.12, 0.6, 0.5
+PRICE_FLOOR, PRICE_CAP = 0.0, 12.0
+PRICE_RESAMPLE_PROB, PRICE_RESAMPLE_HIGH = 0.8, PRICE_MEAN * 0.3 # negative prices are redrawn in [0, 1.2] with probability 0.8
+
+# Occupancy model: coupled mean reversion, independent Gaussian noises, bounds
+OCC1_MEAN, OCC2_MEAN, OCC_REVERSION, OCC_COUPLING = 35.0, 25.0, 0.25, 0.1
+OCC1_STD, OCC2_STD = 3.0, 2.5
+OCC1_BOUNDS, OCC2_BOUNDS = (20.0, 50.0), (10.0, 30.0)
+
+
+def price_model_batch(current_prices, previous_prices, n_samples=None, rng=np.random):
+    """
+    Vectorized price_model (same distribution, including the resampling of negative prices and the bounds).
+
+    Args:
+        current_prices, previous_prices: arrays (or scalars) of current and previous prices, one per path
+        n_samples: number of next prices sampled per path (None for a single one)
+        rng: np.random.Generator to draw from (default: the global np.random state, as price_model)
+
+    Returns:
+        array of next prices with shape (paths,) if n_samples is None, else (paths, n_samples)
+    """
+    current_prices = np.asarray(current_prices, dtype=float)
+    previous_prices = np.asarray(previous_prices, dtype=float)
+    if n_samples is not None:
+        current_prices = current_prices[..., None]
+        previous_prices = previous_prices[..., None]
+
+    size = np.broadcast_shapes(current_prices.shape, previous_prices.shape)
+    if n_samples is not None:
+        size = size[:-1] + (n_samples,)
+
+    mean_reversion = PRICE_REVERSION * (PRICE_MEAN - current_prices)
+    noise = rng.normal(0, PRICE_STD, size)
+
+    next_prices = current_prices + PRICE_MOMENTUM * (current_prices - previous_prices) + mean_reversion + noise
+
+    # Special handling if price goes negative
+    resample = (next_prices < 0) & (rng.random(size) > 1 - PRICE_RESAMPLE_PROB)
+    next_prices = np.where(resample, rng.uniform(0, PRICE_RESAMPLE_HIGH, size), next_prices)
+
+    # Enforce bounds
+    return np.clip(next_prices, PRICE_FLOOR, PRICE_CAP)
+
+
+def next_occupancy_levels_batch(r1_current, r2_current, n_samples=None, rng=np.random):
+    """
+    Vectorized next_occupancy_levels (same distribution and boundaries).
+
+    Args:
+        r1_current, r2_current: arrays (or scalars) of occupancies at time t-1, one per path
+        n_samples: number of next occupancies sampled per path (None for a single one)
+        rng: np.random.Generator to draw from (default: the global np.random state, as next_occupancy_levels)
+
+    Returns:
+        (r1_next, r2_next) arrays with shape (paths,) if n_samples is None, else (paths, n_samples)
+    """
+    r1_current = np.asarray(r1_current, dtype=float)
+    r2_current = np.asarray(r2_current, dtype=float)
+    if n_samples is not None:
+        r1_current = r1_current[..., None]
+        r2_current = r2_current[..., None]
+
+    size = np.broadcast_shapes(r1_current.shape, r2_current.shape)
+    if n_samples is not None:
+        size = size[:-1] + (n_samples,)
+
+    noise_r1 = rng.normal(0, OCC1_STD, size)
+    noise_r2 = rng.normal(0, OCC2_STD, size)
+
+    r1_next = r1_current + OCC_REVERSION * (OCC1_MEAN - r1_current) + OCC_COUPLING * (r2_current - r1_current) + noise_r1
+    r2_next = r2_current + OCC_REVERSION * (OCC2_MEAN - r2_current) + OCC_COUPLING * (r1_current - r2_current) + noise_r2
+
+    return np.clip(r1_next, *OCC1_BOUNDS), np.clip(r2_next, *OCC2_BOUNDS)
@@ -0,0 +1,145 @@
+"""
+Append-only checkpoints for long policy evaluation runs.
+
+Every completed day is appended as one JSON line {"day", "objective", "log"} to a file in the checkpoint
+directory, and flushed to disk right away. A restarted run reads all the files of the directory and skips
+the days that are already done, so a crash costs at most the day that was being simulated.
+Each worker of a parallel run writes its own file, so the days can be resumed with any number of workers.
+
+The settings of the run (policy and its tunable constants, master seed, scenario directory) are recorded in
+run.json next to the days: a run with other settings refuses to resume from the directory instead of mixing
+its days with days simulated under the old settings.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+
+RUN_FILE = "run.json"
+
+
+def run_metadata(policy, scenario_directory=None, seed=None):
+    """
+    Settings a checkpointed day depends on: the policy, its tunable constants (upper-case module attributes
+    with JSON values, e.g. LOOKAHEAD or REUSE_TREE), the master seed and the scenario directory (with the
+    description of its days written by Utils.scenario_generator).
+    """
+    constants = {}
+    for name, value in sorted(getattr(policy, "__dict__", {}).items()):
+        if not name.isupper():
+            continue
+        try:
+            constants[name] = json.loads(json.dumps(value))
+        except (TypeError, ValueError):
+            continue # arrays, models, ... are not settings
+
+    scenarios = None
+    if scenario_directory is not None and (Path(scenario_directory) / "scenarios.json").exists():
+        with open(Path(scenario_directory) / "scenarios.json") as f:
+            scenarios = json.load(f)
+
+    return {
+        "policy": getattr(policy, "__name__", type(policy).__name__),
+        "seed": seed,
+        "scenario_directory": None if scenario_directory is None else str(scenario_directory),
+        "scenarios": scenarios,
+        "constants": constants
+    }
+
+
+def load_run_metadata(checkpoint_dir):
+    """Settings recorded in the checkpoint directory, or None if there are none."""
+    path = Path(checkpoint_dir) / RUN_FILE
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def open_checkpoint(checkpoint_dir, metadata):
+    """
+    Records the settings of the run in the checkpoint directory, or checks them against the recorded ones.
+    Raises a ValueError if the directory holds the days of a run with other settings.
+    """
+    recorded = load_run_metadata(checkpoint_dir)
+    if recorded is None:
+        checkpoint_dir = Path(checkpoint_dir)
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        # Written at once, several workers of a parallel run may record the same settings
+        temporary = checkpoint_dir / f"{RUN_FILE}.{os.getpid()}"
+        with open(temporary, "w") as f:
+            json.dump(metadata, f, indent=1)
+        os.replace(temporary, checkpoint_dir / RUN_FILE)
+        return
+
+    if recorded != metadata:
+        changed = sorted(
+            [key for key in metadata if key != "constants" and recorded.get(key) != metadata[key]]
+            + [name for name in set(metadata["constants"]) | set(recorded.get("constants", {}))
+               if recorded.get("constants", {}).get(name) != metadata["constants"].get(name)]
+        )
+        raise ValueError(
+            f"The checkpoint in {checkpoint_dir} was written by a run with other settings ({', '.join(changed)}): "
+            f"delete it to start over, or restore the settings to resume it"
+        )
+
+
+def checkpoint_file(checkpoint_dir, start, end):
+    """Path of the checkpoint file of the run simulating the days in [start, end)."""
+    return Path(checkpoint_dir) / f"days_{start}_{end}.jsonl"
+
+
+def load_checkpoint(checkpoint_dir):
+    """
+    Reads every checkpoint file of the directory.
+    Returns a dictionary {day: (objective, log)} with the completed days (empty if there is no checkpoint).
+    """
+    completed = {}
+    checkpoint_dir = Path(checkpoint_dir)
+    if not checkpoint_dir.exists():
+        return completed
+
+    for path in sorted(checkpoint_dir.glob("*.jsonl")):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # line cut by a crash while it was being written, that day is simulated again
+                completed[entry["day"]] = (entry["objective"], entry["log"])
+
+    return completed
+
+
+def append_day(path, day, objective_value, day_log):
+    """Appends a completed day to the checkpoint file and forces it to disk."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    entry = {
+        "day": int(day),
+        "objective": float(objective_value),
+        "log": {key: np.asarray(values).tolist() for key, values in day_log.items()}
+    }
+
+    # Start on a new line if the last write was cut by a crash
+    line = json.dumps(entry) + "\n"
+    if path.exists() and path.stat().st_size > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                line = "\n" + line
+
+    with open(path, "a") as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def clear_checkpoint(checkpoint_dir):
+    """Deletes the checkpoint directory (once the results of the run are safely saved)."""
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
@@ -0,0 +1,113 @@
+"""
+Binary cache of the price and occupancy matrices.
+
+The first time a CSV is loaded it is parsed once and saved as a .npy file in a .cache folder next to it,
+together with the SHA-256 of the CSV and the parsing options (the number of header lines skipped, which is also
+part of the file names, so the parses of one CSV with different options never share a cache). Later loads (from any process) just memory-map the .npy file,
+so the workers of a process pool share the same pages instead of each one parsing the text again.
+The cache is rebuilt automatically whenever the CSV or the options change (different metadata).
+
+The mapped arrays are also kept in memory by each process, keyed by the path and the modification time of the
+file, so the jobs of a (pre-warmed) pool worker reuse them without reading or hashing the files again.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+DATA_DIRECTORY = "Data/"
+
+# Name of each matrix of the evaluation dataset and the CSV it comes from
+DATASET_FILES = {
+    "occupancy1": "OccupancyRoom1.csv",
+    "occupancy2": "OccupancyRoom2.csv",
+    "price_data": "v2_PriceData.csv"   # first column: previous price at the first timeslot
+}
+
+_mapped = {} # (kind, resolved path, mtime, size, options) -> memory-mapped array of this process
+
+
+def _file_key(kind, path, *options):
+    """Key of a loaded file in _mapped: it changes whenever the file is modified or replaced."""
+    path = Path(path).resolve()
+    status = path.stat()
+    return (kind, str(path), status.st_mtime_ns, status.st_size) + options
+
+
+def file_sha256(path):
+    """SHA-256 of the content of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_matrix(csv_path, skip_header=1):
+    """
+    Loads a numeric CSV as a read-only, memory-mapped array, going through the binary cache.
+    Inputs:
+    - csv_path: path of the CSV file
+    - skip_header: number of header lines of the CSV
+    """
+    csv_path = Path(csv_path)
+    key = _file_key("csv", csv_path, skip_header)
+    if key in _mapped:
+        return _mapped[key]
+
+    cache_dir = csv_path.parent / ".cache"
+    cache_name = f"{csv_path.stem}.skip{skip_header}"
+    cache_path = cache_dir / (cache_name + ".npy")
+    hash_path = cache_dir / (cache_name + ".sha256")
+
+    metadata = f"{file_sha256(csv_path)} skip_header={skip_header}"
+    cache_is_valid = cache_path.exists() and hash_path.exists() and hash_path.read_text() == metadata
+
+    if not cache_is_valid:
+        matrix = np.genfromtxt(csv_path, delimiter=",", skip_header=skip_header)
+        cache_dir.mkdir(exist_ok=True)
+
+        # Write to temporary files and rename them, so concurrent processes never see a half-written cache
+        tmp_cache_path = cache_dir / f"{cache_name}.{os.getpid()}.tmp.npy"
+        tmp_hash_path = cache_dir / f"{cache_name}.{os.getpid()}.tmp.sha256"
+        np.save(tmp_cache_path, matrix)
+        tmp_hash_path.write_text(metadata)
+        os.replace(tmp_cache_path, cache_path)
+        os.replace(tmp_hash_path, hash_path)
+
+    _mapped[key] = np.load(cache_path, mmap_mode="r")
+    return _mapped[key]
+
+
+def load_npy(npy_path):
+    """Memory-maps a .npy file read-only (once per process and version of the file)."""
+    key = _file_key("npy", npy_path)
+    if key not in _mapped:
+        _mapped[key] = np.load(npy_path, mmap_mode="r")
+    return _mapped[key]
+
+
+def load_generated_dataset(scenario_directory):
+    """
+    Loads days written by Utils.scenario_generator, as memory-mapped arrays with the same keys as load_dataset.
+    Only the rows of the days that are used are read from disk.
+    """
+    return {
+        name: load_npy(Path(scenario_directory) / f"{name}.npy")
+        for name in DATASET_FILES
+    }
+
+
+def load_dataset(data_directory=DATA_DIRECTORY):
+    """
+    Loads the evaluation dataset as a dictionary of memory-mapped arrays:
+    - "occupancy1", "occupancy2": (days, hours) occupancy of each room
+    - "price_data": (days, hours + 1) prices, the first column being the previous price at the first timeslot
+    """
+    return {
+        name: load_matrix(Path(data_directory) / file_name)
+        for name, file_name in DATASET_FILES.items()
+    }
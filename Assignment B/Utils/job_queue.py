@@ -0,0 +1,186 @@
+"""
+Job queue on a shared filesystem (spool directory), for evaluations distributed over several hosts.
+
+    spool/pending/<job_id>.json   jobs waiting for a worker
+    spool/running/<job_id>.json   jobs claimed by a worker (the file is touched periodically as heartbeat)
+    spool/done/<job_id>.json      results, one file per job
+    spool/failed/<job_id>.json    jobs that raised an error or crashed too often, with the error
+
+A worker claims a job by renaming it from pending/ to running/: the rename is atomic, so exactly one worker
+gets each job. Results are written to a temporary file and renamed into done/, so a result file is always
+complete. A job whose heartbeat stops (the worker crashed or was restarted) is moved back to pending/ after
+a timeout and run again by another worker. Since results are keyed by job id, a job that is run twice (e.g.
+a slow worker that was believed dead) overwrites its own result, so days are never lost nor duplicated.
+The job file counts its claims ("attempts"): a job claimed max_attempts times without finishing (it keeps
+crashing its workers) is moved to failed/ instead of being run again, as a job whose run raises an error
+(fail_job). Delete a file of failed/ to submit the job again.
+Heartbeats are compared with the clock of the spool (the modification time of a file touched just before),
+not with the clock of the host, so hosts whose clocks disagree with the file server do not requeue live jobs.
+All the hosts must see the spool directory (e.g. NFS or SMB share); on a single host any local directory works.
+"""
+
+import json
+import os
+import socket
+import threading
+from pathlib import Path
+
+SUBDIRECTORIES = ("pending", "running", "done", "failed")
+MAX_ATTEMPTS   = 3 # claims of a job before it is given up (see claim_job)
+
+
+def worker_id():
+    """Unique name of this worker process (host and process id)."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def create_spool(spool_dir):
+    """Creates the spool directories (if they do not exist) and returns the spool path."""
+    spool_dir = Path(spool_dir)
+    for subdirectory in SUBDIRECTORIES:
+        (spool_dir / subdirectory).mkdir(parents=True, exist_ok=True)
+    return spool_dir
+
+
+def _write_json(path, content):
+    """Writes a JSON file atomically (temporary file + rename)."""
+    tmp_path = path.with_name(f".{path.name}.{worker_id()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(content, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def submit_jobs(spool_dir, jobs):
+    """
+    Publishes jobs (dictionaries with a unique "job_id") to the spool.
+    Jobs that are already pending, running or done are skipped, so submitting again after a restart is safe.
+    Returns the number of new jobs.
+    """
+    spool_dir = create_spool(spool_dir)
+    submitted = 0
+
+    for job in jobs:
+        name = f"{job['job_id']}.json"
+        if any((spool_dir / subdirectory / name).exists() for subdirectory in SUBDIRECTORIES):
+            continue
+        _write_json(spool_dir / "pending" / name, job)
+        submitted += 1
+
+    return submitted
+
+
+def spool_time(spool_dir):
+    """Current time of the clock of the spool: modification time of a probe file of this worker, touched now."""
+    probe = Path(spool_dir) / f".clock.{worker_id()}"
+    probe.touch()
+    now = probe.stat().st_mtime
+    probe.unlink(missing_ok=True)
+    return now
+
+
+def claim_job(spool_dir, max_attempts=MAX_ATTEMPTS):
+    """
+    Claims the first pending job and counts the attempt in its file. Returns the job, or None if there is no
+    pending job. Jobs already claimed max_attempts times are moved to failed/ instead.
+    """
+    spool_dir = Path(spool_dir)
+
+    for path in sorted((spool_dir / "pending").glob("*.json")):
+        running_path = spool_dir / "running" / path.name
+        try:
+            os.rename(path, running_path) # atomic: only one worker succeeds
+        except (FileNotFoundError, PermissionError):
+            continue # claimed by another worker in the meantime
+
+        with open(running_path) as f:
+            job = json.load(f)
+
+        # Requeued job whose first run finished meanwhile
+        if (spool_dir / "done" / path.name).exists():
+            running_path.unlink(missing_ok=True)
+            continue
+
+        if job.get("attempts", 0) >= max_attempts:
+            fail_job(spool_dir, job, f"gave up after {job['attempts']} attempts without result (crashed or killed workers)")
+            continue
+
+        # Rewriting the file also starts the heartbeat from the claim, not from the submission
+        job["attempts"] = job.get("attempts", 0) + 1
+        _write_json(running_path, job)
+        return job
+
+    return None
+
+
+class Heartbeat:
+    """Touches the running file of a job every `interval` seconds while the job runs (use as a context manager)."""
+
+    def __init__(self, spool_dir, job_id, interval=10.0):
+        self.path     = Path(spool_dir) / "running" / f"{job_id}.json"
+        self.interval = interval
+        self._stop    = threading.Event()
+        self._thread  = threading.Thread(target=self._beat, daemon=True)
+
+    def _beat(self):
+        while not self._stop.wait(self.interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                pass # requeued meanwhile, the result is still valid when it arrives
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def complete_job(spool_dir, job_id, result):
+    """Stores the result of a job and releases its claim."""
+    spool_dir = Path(spool_dir)
+    _write_json(spool_dir / "done" / f"{job_id}.json", result)
+    (spool_dir / "running" / f"{job_id}.json").unlink(missing_ok=True)
+
+
+def fail_job(spool_dir, job, error):
+    """Stores a job in failed/ with the error (message or traceback) and releases its claim."""
+    spool_dir = Path(spool_dir)
+    _write_json(spool_dir / "failed" / f"{job['job_id']}.json", {**job, "error": error, "worker": worker_id()})
+    (spool_dir / "running" / f"{job['job_id']}.json").unlink(missing_ok=True)
+
+
+def requeue_stale_jobs(spool_dir, timeout):
+    """Moves back to pending/ the running jobs without heartbeat for more than timeout seconds. Returns their ids."""
+    spool_dir = Path(spool_dir)
+    requeued = []
+    now = spool_time(spool_dir)
+
+    for path in (spool_dir / "running").glob("*.json"):
+        try:
+            stale = now - path.stat().st_mtime > timeout
+            if stale:
+                os.rename(path, spool_dir / "pending" / path.name)
+                requeued.append(path.stem)
+        except FileNotFoundError:
+            continue # finished or requeued by someone else meanwhile
+
+    return requeued
+
+
+def count_jobs(spool_dir):
+    """Number of jobs in each state {"pending", "running", "done", "failed"}."""
+    spool_dir = Path(spool_dir)
+    return {subdirectory: len(list((spool_dir / subdirectory).glob("*.json"))) for subdirectory in SUBDIRECTORIES}
+
+
+def load_result(spool_dir, job_id, subdirectory="done"):
+    """Result of a finished job (or record of a failed job, with subdirectory="failed"), or None if there is none."""
+    path = Path(spool_dir) / subdirectory / f"{job_id}.json"
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,343 @@
+"""
+Discretized Markov-chain lattice of the exogenous processes, built offline.
+
+The price state (price, price_prev) and the occupancy state (Occ1, Occ2) are discretized on regular grids, and
+the transition probabilities between grid states are estimated once by simulating many steps of the process
+models (Utils.batch_processes) from every grid state. The two processes are independent,
+so they are stored as two sparse (CSR) transition matrices instead of one joint matrix:
+
+    price_transitions[s, s']      P(next price state s' | price state s), s = i * n_price + j for (price_grid[i], price_grid[j])
+    occupancy_transitions[s, s']  P(next occupancy state s' | occupancy state s), s = a * n_occ2 + b for (occ1_grid[a], occ2_grid[b])
+
+At run time, a state between grid points is spread over its neighbouring grid states (bilinear weights), and:
+    - the distribution of the next exogenous values is a sparse row product (next_distributions),
+    - forecasts propagate these distributions over the horizon (forecast),
+    - the expectation of a value function over the lattice is P_price @ V @ P_occupancy^T (backup),
+    - scenario trees reduce the successor distribution of every node to B weighted children (lattice_children),
+so no sampling is needed after the lattice is built. SP_policy_30 and Hybrid_policy_30 grow their trees from the
+lattice with CHILD_GENERATOR = "lattice" (Utils.scenario_tree.build_levels with generator="lattice").
+
+Build it with:  python -m Utils.lattice   (saved to LATTICE_PATH; load_lattice builds it on first use)
+The file records the build parameters (LATTICE_PARAMS): a file built with other parameters is rebuilt, and the
+file is written under a temporary name and renamed, so parallel workers never read a partial file.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from Utils.batch_processes import price_model_batch, next_occupancy_levels_batch
+from Utils import seeding
+
+LATTICE_PATH = "Data/lattice.npz"
+
+# Arguments of build_lattice for the lattice saved at LATTICE_PATH
+LATTICE_PARAMS = {"n_price": 49, "n_occ1": 31, "n_occ2": 21, "n_samples": 2000, "seed": 0, "min_prob": 1e-5}
+
+_lattices = {} # (path, params) -> Lattice loaded by this process (get_lattice)
+
+# Support of the processes (bounds enforced by the process models)
+PRICE_RANGE = (0.0, 12.0)
+OCC1_RANGE  = (20.0, 50.0)
+OCC2_RANGE  = (10.0, 30.0)
+
+
+def _nearest(values, grid):
+    """Index of the nearest point of a regular grid."""
+    step = grid[1] - grid[0]
+    return np.clip(np.rint((values - grid[0]) / step), 0, len(grid) - 1).astype(np.int64)
+
+
+def _interpolation(values, grid):
+    """Lower grid index and weight of the upper grid point of the linear interpolation of values on a regular grid."""
+    step = grid[1] - grid[0]
+    position = np.clip((np.asarray(values, dtype=float) - grid[0]) / step, 0, len(grid) - 1)
+    lower = np.minimum(np.floor(position).astype(np.int64), len(grid) - 2)
+    return lower, position - lower
+
+
+def _normalize_rows(counts, min_prob):
+    """Transition matrix from transition counts, dropping the transitions less likely than min_prob."""
+    probabilities = sparse.csr_matrix(counts, dtype=float)
+    probabilities = sparse.diags(1.0 / np.asarray(probabilities.sum(axis=1)).ravel()) @ probabilities
+    probabilities.data[probabilities.data < min_prob] = 0.0
+    probabilities.eliminate_zeros()
+    return sparse.csr_matrix(sparse.diags(1.0 / np.asarray(probabilities.sum(axis=1)).ravel()) @ probabilities)
+
+
+def estimate_price_transitions(price_grid, n_samples, rng, min_prob=1e-5, chunk_size=256):
+    """
+    Sparse price transition matrix over the (price, price_prev) grid states.
+    The next price_prev is the current price, so the row of state (i, j) only has columns (k, i).
+    """
+    n = len(price_grid)
+    rows, columns, counts = [], [], []
+
+    for start in range(0, n * n, chunk_size):
+        states = np.arange(start, min(start + chunk_size, n * n))
+        current, previous = np.divmod(states, n)
+
+        next_prices = price_model_batch(price_grid[current], price_grid[previous], n_samples, rng)
+        next_bins = _nearest(next_prices, price_grid)
+
+        # Histogram of the next price of every state of the chunk, shape (states, n)
+        histogram = np.zeros((len(states), n))
+        np.add.at(histogram, (np.repeat(np.arange(len(states)), n_samples), next_bins.ravel()), 1.0)
+
+        state_index, next_bin = np.nonzero(histogram)
+        rows.append(states[state_index])
+        columns.append(next_bin * n + current[state_index])
+        counts.append(histogram[state_index, next_bin])
+
+    counts = sparse.coo_matrix((np.concatenate(counts), (np.concatenate(rows), np.concatenate(columns))), shape=(n * n, n * n))
+    return _normalize_rows(counts, min_prob)
+
+
+def estimate_occupancy_transitions(occ1_grid, occ2_grid, n_samples, rng, min_prob=1e-5):
+    """Sparse occupancy transition matrix over the (Occ1, Occ2) grid states."""
+    n_states = len(occ1_grid) * len(occ2_grid)
+    states = np.arange(n_states)
+    a, b = np.divmod(states, len(occ2_grid))
+
+    next_occ1, next_occ2 = next_occupancy_levels_batch(occ1_grid[a], occ2_grid[b], n_samples, rng)
+    next_states = _nearest(next_occ1, occ1_grid) * len(occ2_grid) + _nearest(next_occ2, occ2_grid)
+
+    counts = sparse.coo_matrix(
+        (np.ones(next_states.size), (np.repeat(states, n_samples), next_states.ravel())), shape=(n_states, n_states)
+    )
+    return _normalize_rows(counts, min_prob)
+
+
+class Lattice:
+    """Grids and sparse transition matrices of the exogenous processes (see the module docstring)."""
+
+    def __init__(self, price_grid, occ1_grid, occ2_grid, price_transitions, occupancy_transitions, params=None):
+        self.price_grid            = np.asarray(price_grid, dtype=float)
+        self.occ1_grid             = np.asarray(occ1_grid, dtype=float)
+        self.occ2_grid             = np.asarray(occ2_grid, dtype=float)
+        self.price_transitions     = sparse.csr_matrix(price_transitions)
+        self.occupancy_transitions = sparse.csr_matrix(occupancy_transitions)
+        self.params                = params # arguments of build_lattice, if built by it
+
+        # Exogenous values of every grid state
+        current, previous = np.divmod(np.arange(len(self.price_grid) ** 2), len(self.price_grid))
+        self.state_prices      = self.price_grid[current]
+        self.state_prices_prev = self.price_grid[previous]
+        a, b = np.divmod(np.arange(len(self.occ1_grid) * len(self.occ2_grid)), len(self.occ2_grid))
+        self.state_occ1 = self.occ1_grid[a]
+        self.state_occ2 = self.occ2_grid[b]
+
+    @property
+    def n_price_states(self):
+        return self.price_transitions.shape[0]
+
+    @property
+    def n_occupancy_states(self):
+        return self.occupancy_transitions.shape[0]
+
+    def price_weights(self, prices, prices_prev):
+        """Bilinear weights of price states over the grid states, sparse (paths, n_price_states)."""
+        n = len(self.price_grid)
+        i, wi = _interpolation(np.atleast_1d(prices), self.price_grid)
+        j, wj = _interpolation(np.atleast_1d(prices_prev), self.price_grid)
+        return self._bilinear(i, wi, j, wj, n, n)
+
+    def occupancy_weights(self, occ1, occ2):
+        """Bilinear weights of occupancy states over the grid states, sparse (paths, n_occupancy_states)."""
+        a, wa = _interpolation(np.atleast_1d(occ1), self.occ1_grid)
+        b, wb = _interpolation(np.atleast_1d(occ2), self.occ2_grid)
+        return self._bilinear(a, wa, b, wb, len(self.occ1_grid), len(self.occ2_grid))
+
+    @staticmethod
+    def _bilinear(i, wi, j, wj, n_i, n_j):
+        paths = np.arange(len(i))
+        rows, columns, weights = [], [], []
+        for di, weight_i in ((0, 1 - wi), (1, wi)):
+            for dj, weight_j in ((0, 1 - wj), (1, wj)):
+                rows.append(paths)
+                columns.append((i + di) * n_j + (j + dj))
+                weights.append(weight_i * weight_j)
+        return sparse.csr_matrix(
+            (np.concatenate(weights), (np.concatenate(rows), np.concatenate(columns))), shape=(len(i), n_i * n_j)
+        )
+
+    def next_distributions(self, prices, prices_prev, occ1, occ2):
+        """Distributions of the next price and occupancy states, dense arrays (paths, n_price_states) and (paths, n_occupancy_states)."""
+        price_distribution     = (self.price_weights(prices, prices_prev) @ self.price_transitions).toarray()
+        occupancy_distribution = (self.occupancy_weights(occ1, occ2) @ self.occupancy_transitions).toarray()
+        return price_distribution, occupancy_distribution
+
+    def forecast(self, state, L):
+        """
+        Expected price and occupancies of the next L hours, in the format of DL_policy_30.forecast_uncertainties:
+        {"price": [...], "occ1": [...], "occ2": [...]}
+        """
+        price_distribution     = self.price_weights(state["price_t"], state["price_previous"])
+        occupancy_distribution = self.occupancy_weights(state["Occ1"], state["Occ2"])
+
+        forecast = {"price": [], "occ1": [], "occ2": []}
+        for _ in range(L):
+            price_distribution     = price_distribution @ self.price_transitions
+            occupancy_distribution = occupancy_distribution @ self.occupancy_transitions
+            forecast["price"].append(float((price_distribution @ self.state_prices)[0]))
+            forecast["occ1"].append(float((occupancy_distribution @ self.state_occ1)[0]))
+            forecast["occ2"].append(float((occupancy_distribution @ self.state_occ2)[0]))
+
+        return forecast
+
+    def backup(self, values):
+        """
+        Expected value of the next exogenous state for every grid state (a DP backup over the exogenous processes).
+        values: array (n_price_states, n_occupancy_states) of values of the next states
+        Returns an array of the same shape: E[values(next) | state] = P_price @ values @ P_occupancy^T
+        """
+        return self.price_transitions @ (self.occupancy_transitions @ np.asarray(values).T).T
+
+    def children(self, price, price_prev, occ1, occ2, B, iterations=10):
+        """
+        Reduces the distribution of the next exogenous values of a node to B weighted children,
+        by weighted k-means over the (sparse) successor grid states, without sampling.
+        Returns the arrays (prices, occ1s, occ2s, probs) of the children.
+        """
+        price_distribution, occupancy_distribution = self.next_distributions(price, price_prev, occ1, occ2)
+        price_states     = np.flatnonzero(price_distribution[0])
+        occupancy_states = np.flatnonzero(occupancy_distribution[0])
+
+        # Joint successor states (the processes are independent)
+        weights = np.outer(price_distribution[0, price_states], occupancy_distribution[0, occupancy_states]).ravel()
+        points  = np.column_stack([
+            np.repeat(self.state_prices[price_states], len(occupancy_states)),
+            np.tile(self.state_occ1[occupancy_states], len(price_states)),
+            np.tile(self.state_occ2[occupancy_states], len(price_states))
+        ])
+
+        # Standardized features, so that the price and the occupancies weigh the same in the distances
+        mean  = weights @ points
+        scale = np.sqrt(weights @ (points - mean) ** 2)
+        scaled = (points - mean) / np.where(scale > 0, scale, 1.0)
+
+        # Deterministic initialization: B buckets of equal mass along the sum of the standardized features
+        order  = np.argsort(scaled.sum(axis=1), kind="stable")
+        bucket = np.minimum((np.cumsum(weights[order]) - weights[order] / 2) * B, B - 1).astype(int)
+        labels = np.empty(len(weights), dtype=int)
+        labels[order] = bucket
+
+        centers = np.zeros((B, 3))
+        for _ in range(iterations):
+            for b in range(B):
+                mass = weights[labels == b].sum()
+                if mass > 0:
+                    centers[b] = weights[labels == b] @ scaled[labels == b] / mass
+            new_labels = np.argmin(((scaled[:, None, :] - centers[None]) ** 2).sum(axis=2), axis=1)
+            if np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+
+        probs = np.bincount(labels, weights=weights, minlength=B)
+        values = np.array([
+            weights[labels == b] @ points[labels == b] / probs[b] if probs[b] > 0 else mean
+            for b in range(B)
+        ])
+
+        return values[:, 0], values[:, 1], values[:, 2], probs
+
+    def save(self, path=LATTICE_PATH):
+        """Saves the lattice (and its build parameters) to path, atomically."""
+        path = Path(path)
+        arrays = {"price_grid": self.price_grid, "occ1_grid": self.occ1_grid, "occ2_grid": self.occ2_grid}
+        for name in ("price_transitions", "occupancy_transitions"):
+            matrix = getattr(self, name)
+            arrays.update({f"{name}_data": matrix.data, f"{name}_indices": matrix.indices, f"{name}_indptr": matrix.indptr})
+        if self.params is not None:
+            arrays["params"] = np.array(json.dumps(self.params, sort_keys=True))
+
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=LATTICE_PATH):
+        with np.load(path) as arrays:
+            matrices = {}
+            for name, n_states in (
+                ("price_transitions", len(arrays["price_grid"]) ** 2),
+                ("occupancy_transitions", len(arrays["occ1_grid"]) * len(arrays["occ2_grid"]))
+            ):
+                matrices[name] = sparse.csr_matrix(
+                    (arrays[f"{name}_data"], arrays[f"{name}_indices"], arrays[f"{name}_indptr"]), shape=(n_states, n_states)
+                )
+            params = json.loads(str(arrays["params"])) if "params" in arrays.files else None
+            return cls(arrays["price_grid"], arrays["occ1_grid"], arrays["occ2_grid"], **matrices, params=params)
+
+
+def build_lattice(n_price=49, n_occ1=31, n_occ2=21, n_samples=2000, seed=0, min_prob=1e-5):
+    """
+    Builds the lattice by simulating n_samples steps of the process models from every grid state.
+    The default grids have a step of 0.25 for the price and of 1 person for the occupancies.
+    """
+    price_grid = np.linspace(*PRICE_RANGE, n_price)
+    occ1_grid  = np.linspace(*OCC1_RANGE, n_occ1)
+    occ2_grid  = np.linspace(*OCC2_RANGE, n_occ2)
+
+    price_transitions     = estimate_price_transitions(price_grid, n_samples, seeding.make_rng(seed, 0), min_prob)
+    occupancy_transitions = estimate_occupancy_transitions(occ1_grid, occ2_grid, n_samples, seeding.make_rng(seed, 1), min_prob)
+
+    params = {"n_price": n_price, "n_occ1": n_occ1, "n_occ2": n_occ2, "n_samples": n_samples, "seed": seed, "min_prob": min_prob}
+    return Lattice(price_grid, occ1_grid, occ2_grid, price_transitions, occupancy_transitions, params)
+
+
+def load_lattice(path=LATTICE_PATH, **params):
+    """
+    Loads the lattice saved at path, built with the arguments LATTICE_PARAMS updated by params. It is built and
+    saved there the first time, and again if the saved lattice was built with other arguments.
+    """
+    path = Path(path)
+    params = dict(LATTICE_PARAMS, **params)
+    if path.exists():
+        lattice = Lattice.load(path)
+        if lattice.params == params:
+            return lattice
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lattice = build_lattice(**params)
+    lattice.save(path)
+    return lattice
+
+
+def get_lattice(path=LATTICE_PATH, **params):
+    """Lattice saved at path, loaded (or built, see load_lattice) once per process."""
+    key = (str(path), tuple(sorted(params.items())))
+    if key not in _lattices:
+        _lattices[key] = load_lattice(path, **params)
+    return _lattices[key]
+
+
+def lattice_children(prices, prices_prev, occ1, occ2, B, lattice=None):
+    """
+    B weighted children of every parent given by the lattice (Lattice.children), in the format of
+    Utils.quadrature.quadrature_children: arrays (prices, occ1s, occ2s, probs) of shape (parents, B).
+    Inputs are arrays (or scalars) with one value per parent; lattice defaults to get_lattice().
+    """
+    lattice = get_lattice() if lattice is None else lattice
+    children = [
+        lattice.children(price, price_prev, o1, o2, B)
+        for price, price_prev, o1, o2 in zip(*np.broadcast_arrays(
+            np.atleast_1d(prices), np.atleast_1d(prices_prev), np.atleast_1d(occ1), np.atleast_1d(occ2)
+        ))
+    ]
+    return tuple(np.array(values, dtype=float).reshape(len(children), B) for values in zip(*children))
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    lattice = build_lattice(**LATTICE_PARAMS)
+    lattice.save(LATTICE_PATH)
+    print(
+        f"Lattice with {lattice.n_price_states} price states ({lattice.price_transitions.nnz} transitions) and "
+        f"{lattice.n_occupancy_states} occupancy states ({lattice.occupancy_transitions.nnz} transitions) "
+        f"built in {time.time() - start_time:.1f} seconds, saved to {LATTICE_PATH}"
+    )
@@ -0,0 +1,226 @@
+"""
+Offline store of the exogenous inputs of the policies on the evaluation dataset.
+
+In run_environment the exogenous part of every state (price_t, price_previous, Occ1, Occ2, hour) comes from the
+dataset and does not depend on the actions of the policy, and in a seeded run the policy call of (day, hour)
+draws from its own stream (Utils.seeding). The scenario tree of SP_policy_30/Hybrid_policy_30 (build_tree), the
+clusters of ADP_policy_30 (generate_samples) and the forecast of DL_policy_30 (forecast_uncertainties) are the
+first draws of their call, so they are the same in every run with the same (day, hour, seed, L, B).
+precompute builds them once for all the days and hours, in parallel, with the builder functions it is given
+(this module does not import the policies, see Precompute.py), and saves them in one binary file:
+
+    config             JSON of the settings they were built with (samples, child generator, reduction)
+    seeds              master seeds of the entries (as strings, seeds can exceed 64 bits)
+    <kind>_index       one row per entry: day, hour, seed (position in seeds), L, B, first row, last row + 1
+    <kind>_states      exogenous state of every entry (price_t, price_previous, Occ1, Occ2)
+    <kind>_values      rows of the entries, one after the other
+    tree_parent        parent index of every tree node (relative to its tree, -1 for the root)
+    tree_tau           depth of every tree node
+
+with the kinds "tree" (rows: price, price_prev, occ1, occ2, prob of the nodes), "clusters" (price, occ1, occ2,
+prob of the B clusters) and "forecast" (price, occ1, occ2 of the L hours). Policies whose PRECOMPUTED_STORE
+points to the file look their inputs up with lookup (a miss, e.g. outside of a seeded run, with other settings
+or on another dataset, falls back to building them), and get exactly what they would have built from scratch.
+The trees are stored as build_tree makes them from scratch, and SP_policy_30 and Hybrid_policy_30 read the store
+before re-rooting the previous tree (REUSE_TREE) or using the tree cache, so the hours found in the store are
+decided as in a run that builds every tree from scratch.
+
+    python Precompute.py   (settings of the policies, SEED and N_WORKERS there)
+"""
+
+import json
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from Utils import dataset, seeding
+from Utils.scenario_tree import ScenarioTree
+
+STORE_PATH = "Data/precomputed.npz"
+KINDS = ("tree", "clusters", "forecast")
+TREE_FIELDS = ("price", "price_prev", "occ1", "occ2", "prob")
+
+_stores = {} # path -> loaded PrecomputedStore (None if the file does not exist)
+
+
+def exogenous_states(day, data):
+    """Exogenous part of the states of a day of the dataset, hour by hour, as in run_environment."""
+    price_matrix = data["price_data"][:, 1:]
+    states = []
+    for hour in range(price_matrix.shape[1]):
+        states.append({
+            "price_t":        float(price_matrix[day][hour]),
+            "price_previous": float(data["price_data"][day, 0] if hour == 0 else price_matrix[day][hour - 1]),
+            "Occ1":           float(data["occupancy1"][day][hour]),
+            "Occ2":           float(data["occupancy2"][day][hour]),
+            "current_time":   hour
+        })
+    return states
+
+
+def _precompute_day(day, seed, builders):
+    """
+    Entries of all the hours of a day. Every entry is built right after seeding the stream of its (day, hour),
+    exactly as the policy does at the beginning of its call.
+    Returns {kind: [(hour, L, B, state, rows)]}, rows being the tree, the clusters or the forecast.
+    """
+    entries = {kind: [] for kind in KINDS}
+    states = exogenous_states(day, dataset.load_dataset())
+    T = len(states)
+
+    for state in states:
+        hour = state["current_time"]
+        exogenous = (state["price_t"], state["price_previous"], state["Occ1"], state["Occ2"])
+
+        if "tree" in builders:
+            build, tree_shapes = builders["tree"]
+            for L, B in sorted({(min(L, T - 1 - hour), B) for L, B in tree_shapes}):
+                seeding.seed_policy_call(seed, day, hour)
+                entries["tree"].append((hour, L, B, exogenous, build(state, L=L, B=B)))
+
+        if "clusters" in builders and hour < T - 1: # ADP does not sample at the last hour
+            build, branchings = builders["clusters"]
+            for B in branchings:
+                seeding.seed_policy_call(seed, day, hour)
+                clusters = build(state, B=B)
+                rows = np.array([[c["price"], c["occ_room_0"], c["occ_room_1"], c["prob"]] for c in clusters])
+                entries["clusters"].append((hour, 1, B, exogenous, rows))
+
+        if "forecast" in builders:
+            build, horizons = builders["forecast"]
+            for L in sorted({min(L, T - hour) for L in horizons}):
+                seeding.seed_policy_call(seed, day, hour)
+                forecast = build(state, L)
+                rows = np.column_stack([forecast["price"], forecast["occ1"], forecast["occ2"]]).reshape(L, 3)
+                entries["forecast"].append((hour, L, 0, exogenous, rows))
+
+    seeding.set_call_rng(None)
+    return day, entries
+
+
+def precompute(days, seed, builders, config, n_workers=1, path=STORE_PATH):
+    """
+    Builds the inputs of the given days of the evaluation dataset and saves them at path.
+    Inputs:
+    - days: days of the dataset
+    - seed: master seed of the runs that will use the store (see Utils.seeding)
+    - builders: {kind: (build, sizes)} for the kinds to store, build being a module-level function (or a partial of
+      one, so that it can be sent to the workers) with the settings of the policy bound:
+        "tree":     build(state, L=L, B=B) -> ScenarioTree, sizes the (L, B) of the trees (e.g. SP_policy_30.build_tree)
+        "clusters": build(state, B=B) -> list of cluster dictionaries, sizes the B (e.g. ADP_policy_30.generate_samples)
+        "forecast": build(state, L) -> forecast dictionary, sizes the L (e.g. DL_policy_30.forecast_uncertainties)
+      L is shortened at the end of the day as the policies do
+    - config: {kind: settings the builders were given}, compared with the settings of the calling policy by lookup
+    - n_workers: processes building the days in parallel (pool of Utils.worker_pool)
+    """
+    builders = {kind: (build, tuple(sizes)) for kind, (build, sizes) in builders.items()}
+    job = partial(_precompute_day, seed=seed, builders=builders)
+    if n_workers > 1:
+        from Utils.worker_pool import get_pool
+        modules = sorted({getattr(build, "func", build).__module__ for build, _ in builders.values()})
+        results = list(get_pool(n_workers, modules).map(job, days))
+    else:
+        results = [job(day) for day in days]
+
+    arrays = {"config": np.array(json.dumps(config)), "seeds": np.array([str(seed)])}
+    for kind in KINDS:
+        index, states, values, parents, taus = [], [], [], [], []
+        start = 0
+        for day, entries in results:
+            for hour, L, B, exogenous, rows in entries[kind]:
+                if kind == "tree":
+                    parents.append(rows.parent)
+                    taus.append(rows.tau)
+                    rows = np.column_stack([getattr(rows, field) for field in TREE_FIELDS])
+                index.append((day, hour, 0, L, B, start, start + len(rows)))
+                states.append(exogenous)
+                values.append(rows)
+                start += len(rows)
+
+        width = {"tree": len(TREE_FIELDS), "clusters": 4, "forecast": 3}[kind]
+        arrays[f"{kind}_index"]  = np.array(index, dtype=np.int64).reshape(-1, 7)
+        arrays[f"{kind}_states"] = np.array(states, dtype=float).reshape(-1, 4)
+        arrays[f"{kind}_values"] = np.concatenate(values) if values else np.empty((0, width))
+        if kind == "tree":
+            arrays["tree_parent"] = np.concatenate(parents).astype(np.int32) if parents else np.empty(0, np.int32)
+            arrays["tree_tau"]    = np.concatenate(taus).astype(np.int8) if taus else np.empty(0, np.int8)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, **arrays)
+    _stores.pop(str(path), None)
+    return path
+
+
+class PrecomputedStore:
+    """Entries of a file written by precompute, indexed by (day, hour, seed, L, B) for each kind."""
+
+    def __init__(self, path):
+        with np.load(path) as arrays:
+            self.arrays = {name: arrays[name] for name in arrays.files}
+        self.config = json.loads(str(self.arrays["config"]))
+        seeds = [int(seed) for seed in self.arrays["seeds"]]
+
+        self.index = {}
+        for kind in KINDS:
+            self.index[kind] = {
+                (day, hour, seeds[seed], L, B): (position, start, stop)
+                for position, (day, hour, seed, L, B, start, stop) in enumerate(self.arrays[f"{kind}_index"].tolist())
+            }
+
+    def get(self, kind, day, hour, seed, L, B, state):
+        """Entry of the key, or None if there is none or if it was built for another exogenous state."""
+        entry = self.index[kind].get((day, hour, seed, L, B))
+        if entry is None:
+            return None
+        position, start, stop = entry
+
+        exogenous = (state["price_t"], state["price_previous"], state["Occ1"], state["Occ2"])
+        if not np.allclose(self.arrays[f"{kind}_states"][position], exogenous):
+            return None
+
+        rows = self.arrays[f"{kind}_values"][start:stop]
+        if kind == "tree":
+            return ScenarioTree(
+                self.arrays["tree_parent"][start:stop], self.arrays["tree_tau"][start:stop],
+                *(rows[:, k] for k in range(len(TREE_FIELDS)))
+            )
+        if kind == "clusters":
+            return [
+                {"price": float(price), "occ_room_0": float(occ1), "occ_room_1": float(occ2), "prob": float(prob)}
+                for price, occ1, occ2, prob in rows
+            ]
+        return {"price": rows[:, 0].tolist(), "occ1": rows[:, 1].tolist(), "occ2": rows[:, 2].tolist()}
+
+
+def load_store(path):
+    """Store saved at path, loaded once per process (None, with a warning, if the file does not exist)."""
+    path = str(path)
+    if path not in _stores:
+        if Path(path).exists():
+            _stores[path] = PrecomputedStore(path)
+        else:
+            print(f"[WARNING] No precomputed store at {path}, the policy builds its inputs")
+            _stores[path] = None
+    return _stores[path]
+
+
+def lookup(path, kind, state, L, B, config):
+    """
+    Precomputed input of the current policy call: the scenario tree ("tree"), the ADP clusters ("clusters",
+    L = 1) or the DL forecast ("forecast", B = 0) built offline for the (day, hour, seed) of the call with the
+    given L and B. config holds the settings of the calling policy (compared with the config of precompute).
+    Returns None when the input has to be built (no seeded call, no store, other settings or no entry).
+    """
+    key = seeding.get_call_key()
+    if key is None or path is None:
+        return None
+
+    store = load_store(path)
+    if store is None or store.config.get(kind) != config:
+        return None
+
+    seed, day, hour = key
+    return store.get(kind, day, hour, seed, L, B, state)
+
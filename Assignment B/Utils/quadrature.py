@@ -0,0 +1,141 @@
+"""
+Deterministic scenario generation by moment matching.
+
+Given its current state, the next price is a Gaussian (std 0.5) around the AR(2) prediction of the price model,
+and the next occupancies are independent Gaussians (std 3 and 2.5) around the coupled mean-reverting prediction,
+all of them clipped to their bounds, and with negative prices redrawn uniformly in [0, 1.2] with probability 0.8.
+The mean and variance of these clipped distributions are known in closed form, so the B children of a node are
+placed without sampling nor clustering:
+
+    child b = mean + std * U[b],  with probability 1 / B
+
+where the columns of the design U (price, Occ1, Occ2) have mean 0 and variance 1, so that the children match the
+mean and the variance of every component, and a symmetric distribution, so that they add no skewness:
+
+    B = 1:      the single child at the conditional mean (the chains of Two_stage)
+    B = 2:      -1 and +1 for every component
+    B = 3:      a Latin square of the 3-point rule -sqrt(3/2), 0, sqrt(3/2)
+    B = 4, 5:   the vertices of a tetrahedron (±1 in every component), plus the mean for B = 5
+    B >= 6:     B // 2 pairs of opposite children (plus the mean if B is odd), the first three cosine vectors of
+                the pairs for B >= 8, the axes for B = 6 and 7
+
+For B >= 4 the components are uncorrelated, as the independent noises of the processes. Three uncorrelated
+components with zero mean need at least 4 children: with B = 2 they move together, and with B = 3 every pair of
+them has correlation -1/2 (the smallest common correlation of three components spanning a plane).
+Children are clipped to the bounds of the process afterwards, which can shift the mean slightly when the price
+is next to 0 or 12. Building the children of a whole tree level takes a few vectorized operations.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from scipy.special import ndtr
+
+from Utils.batch_processes import (
+    PRICE_MEAN, PRICE_REVERSION, PRICE_MOMENTUM, PRICE_STD, PRICE_FLOOR, PRICE_CAP, PRICE_RESAMPLE_PROB, PRICE_RESAMPLE_HIGH,
+    OCC1_MEAN, OCC2_MEAN, OCC_REVERSION, OCC_COUPLING, OCC1_STD, OCC2_STD, OCC1_BOUNDS, OCC2_BOUNDS
+)
+
+
+def _normal_pdf(x):
+    return np.exp(-0.5 * x ** 2) / np.sqrt(2 * np.pi)
+
+
+def _interval_moments(mean, std, low, high):
+    """Probability, E[Y; low < Y < high] and E[Y^2; low < Y < high] of Y ~ N(mean, std^2)."""
+    alpha, beta = (low - mean) / std, (high - mean) / std
+    mass = ndtr(beta) - ndtr(alpha)
+    first = mean * mass + std * (_normal_pdf(alpha) - _normal_pdf(beta))
+    second = (mean ** 2 + std ** 2) * mass + std * ((low + mean) * _normal_pdf(alpha) - (high + mean) * _normal_pdf(beta))
+    return mass, first, second
+
+
+def price_moments(prices, prices_prev):
+    """Mean and standard deviation of the next price (negative-price redraw and bounds included)."""
+    prices = np.asarray(prices, dtype=float)
+    mean = prices + PRICE_MOMENTUM * (prices - np.asarray(prices_prev, dtype=float)) + PRICE_REVERSION * (PRICE_MEAN - prices)
+
+    _, first, second = _interval_moments(mean, PRICE_STD, PRICE_FLOOR, PRICE_CAP)
+    below = ndtr((PRICE_FLOOR - mean) / PRICE_STD)
+    above = 1.0 - ndtr((PRICE_CAP - mean) / PRICE_STD)
+
+    # Below the floor: redrawn uniformly with probability 0.8, clipped to the floor (0) otherwise
+    first  = first + below * PRICE_RESAMPLE_PROB * PRICE_RESAMPLE_HIGH / 2 + above * PRICE_CAP
+    second = second + below * PRICE_RESAMPLE_PROB * PRICE_RESAMPLE_HIGH ** 2 / 3 + above * PRICE_CAP ** 2
+
+    return first, np.sqrt(np.maximum(second - first ** 2, 0.0))
+
+
+def _clipped_moments(mean, std, low, high):
+    """Mean and standard deviation of clip(N(mean, std^2), low, high)."""
+    _, first, second = _interval_moments(mean, std, low, high)
+    below = ndtr((low - mean) / std)
+    above = 1.0 - ndtr((high - mean) / std)
+    first  = first + below * low + above * high
+    second = second + below * low ** 2 + above * high ** 2
+    return first, np.sqrt(np.maximum(second - first ** 2, 0.0))
+
+
+def occupancy_moments(occ1, occ2):
+    """Means and standard deviations (mean1, std1, mean2, std2) of the next occupancies (bounds included)."""
+    occ1 = np.asarray(occ1, dtype=float)
+    occ2 = np.asarray(occ2, dtype=float)
+    mean1 = occ1 + OCC_REVERSION * (OCC1_MEAN - occ1) + OCC_COUPLING * (occ2 - occ1)
+    mean2 = occ2 + OCC_REVERSION * (OCC2_MEAN - occ2) + OCC_COUPLING * (occ1 - occ2)
+    mean1, std1 = _clipped_moments(mean1, OCC1_STD, *OCC1_BOUNDS)
+    mean2, std2 = _clipped_moments(mean2, OCC2_STD, *OCC2_BOUNDS)
+    return mean1, std1, mean2, std2
+
+
+@lru_cache(maxsize=None)
+def moment_design(B):
+    """
+    Design of B children: matrix U of shape (B, 3) with the standardized offsets of the price, Occ1 and Occ2 of
+    every child, and their probabilities w (see the module docstring).
+    """
+    if B == 1:
+        design = np.zeros((1, 3))
+    elif B == 2:
+        design = np.array([[-1.0, -1.0, -1.0], [1.0, 1.0, 1.0]])
+    elif B == 3:
+        a = np.sqrt(1.5)
+        design = np.array([[-a, 0.0, a], [0.0, a, -a], [a, -a, 0.0]])
+    elif B in (4, 5):
+        tetrahedron = np.array([[1.0, 1.0, 1.0], [1.0, -1.0, -1.0], [-1.0, 1.0, -1.0], [-1.0, -1.0, 1.0]])
+        design = np.sqrt(B / 4) * tetrahedron
+        if B == 5:
+            design = np.vstack([design, np.zeros(3)])
+    else:
+        pairs = B // 2
+        # orthogonal columns of squared norm pairs: the axes, or the cosine vectors of degrees 1-3 over the pairs
+        if pairs == 3:
+            half = np.sqrt(3) * np.eye(3)
+        else:
+            half = np.sqrt(2) * np.cos(np.pi * np.outer(np.arange(pairs) + 0.5, [1, 2, 3]) / pairs)
+        half = half * np.sqrt(B / (2 * pairs)) # (2 / B) * sum over the pairs of x x^T = identity
+        design = np.vstack([half, -half] + ([np.zeros((1, 3))] if B % 2 else []))
+
+    return design, np.full(B, 1.0 / B)
+
+
+def quadrature_children(prices, prices_prev, occ1, occ2, B):
+    """
+    B weighted children of every parent, without sampling.
+    Inputs are arrays (or scalars) with one value per parent.
+    Returns the arrays (prices, occ1s, occ2s) of shape (parents, B) and the probabilities w of shape (B,).
+    """
+    design, weights = moment_design(B)
+
+    price_mean, price_std = price_moments(prices, prices_prev)
+    mean1, std1, mean2, std2 = occupancy_moments(occ1, occ2)
+
+    child_prices = np.atleast_1d(price_mean)[:, None] + np.atleast_1d(price_std)[:, None] * design[:, 0]
+    child_occ1s  = np.atleast_1d(mean1)[:, None] + np.atleast_1d(std1)[:, None] * design[:, 1]
+    child_occ2s  = np.atleast_1d(mean2)[:, None] + np.atleast_1d(std2)[:, None] * design[:, 2]
+
+    return (
+        np.clip(child_prices, PRICE_FLOOR, PRICE_CAP),
+        np.clip(child_occ1s, *OCC1_BOUNDS),
+        np.clip(child_occ2s, *OCC2_BOUNDS),
+        weights
+    )
@@ -0,0 +1,84 @@
+"""
+Out-of-sample scenario generator.
+
+Simulates any number of days of prices and occupancies with the batch samplers of the price and occupancy processes
+(Utils.batch_processes.price_model_batch and next_occupancy_levels_batch),
+vectorized over days, and writes them chunk by chunk to .npy files with the same layout as the evaluation dataset (see Utils.dataset):
+- occupancy1.npy, occupancy2.npy: (days, hours)
+- price_data.npy: (days, hours + 1), the first column being the previous price at the first timeslot
+The files are memory-mapped when read back, so run_environment streams the days from disk instead of holding them in RAM.
+
+Example use (from the Assignment B folder):
+    python -m Utils.scenario_generator
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from Utils import seeding
+from Utils.v2_SystemCharacteristics import get_fixed_data
+from Utils.batch_processes import price_model_batch, next_occupancy_levels_batch
+
+
+def simulate_days(num_days, rng, num_timeslots=None):
+    """
+    Simulates num_days days of prices and occupancies.
+    The initial values of each day are drawn from the same ranges as in get_fixed_data.
+    Returns (occupancy1, occupancy2, price_data) arrays with the layout of the evaluation dataset.
+    """
+    if num_timeslots is None:
+        num_timeslots = get_fixed_data()["num_timeslots"]
+
+    occupancy1 = np.empty((num_days, num_timeslots))
+    occupancy2 = np.empty((num_days, num_timeslots))
+    price_data = np.empty((num_days, num_timeslots + 1))
+
+    occupancy1[:, 0] = rng.uniform(25, 35, num_days)
+    occupancy2[:, 0] = rng.uniform(15, 25, num_days)
+    price_data[:, 0] = rng.uniform(2, 8, num_days)  # previous price at the first timeslot
+    price_data[:, 1] = rng.uniform(2, 8, num_days)
+
+    for t in range(1, num_timeslots):
+        occupancy1[:, t], occupancy2[:, t] = next_occupancy_levels_batch(occupancy1[:, t - 1], occupancy2[:, t - 1], rng=rng)
+        price_data[:, t + 1] = price_model_batch(price_data[:, t], price_data[:, t - 1], rng=rng)
+
+    return occupancy1, occupancy2, price_data
+
+
+def generate_scenarios(output_directory, num_days, chunk_size=100_000, seed=None):
+    """
+    Generates num_days days and writes them to output_directory, chunk_size days at a time,
+    so the memory used does not depend on the number of days.
+    Without a seed, a new one is drawn and printed; the seed used is recorded in scenarios.json either way, so the
+    days can always be generated again.
+    """
+    output_directory = Path(output_directory)
+    output_directory.mkdir(parents=True, exist_ok=True)
+
+    num_timeslots = get_fixed_data()["num_timeslots"]
+    if seed is None:
+        seed = seeding.new_master_seed()
+        print(f"Scenario seed: {seed}")
+    rng = np.random.default_rng(seed)
+
+    occupancy1 = open_memmap(output_directory / "occupancy1.npy", mode="w+", dtype=np.float64, shape=(num_days, num_timeslots))
+    occupancy2 = open_memmap(output_directory / "occupancy2.npy", mode="w+", dtype=np.float64, shape=(num_days, num_timeslots))
+    price_data = open_memmap(output_directory / "price_data.npy", mode="w+", dtype=np.float64, shape=(num_days, num_timeslots + 1))
+
+    for start in range(0, num_days, chunk_size):
+        end = min(start + chunk_size, num_days)
+        occupancy1[start:end], occupancy2[start:end], price_data[start:end] = simulate_days(end - start, rng, num_timeslots)
+        print(f"Generated days {start + 1}-{end} of {num_days}", flush=True)
+
+    for matrix in (occupancy1, occupancy2, price_data):
+        matrix.flush()
+
+    with open(output_directory / "scenarios.json", "w") as f:
+        json.dump({"num_days": num_days, "num_timeslots": num_timeslots, "seed": seed}, f)
+
+
+if __name__ == "__main__":
+    generate_scenarios("Data/Generated/", num_days=100_000, seed=0)
@@ -0,0 +1,389 @@
+"""
+Level-wise construction of the scenario trees of the multi-stage policies (SP_policy_30, Hybrid_policy_30).
+
+A tree level is a dictionary of arrays with one entry per node of the level:
+
+    parent      index of the parent in the previous level (-1 for the root)
+    price       price at the node
+    price_prev  price at the parent
+    occ1, occ2  occupancies at the node
+    prob        unconditional probability of the node
+
+and, for the levels built by expand_level, one entry per parent of the previous level:
+
+    distance    Wasserstein-1 distance between the raw samples of the parent and its reduced children (NaN for the
+                deterministic generators, which place the children without samples)
+
+expand_level turns level tau into level tau + 1 in one go: the raw children of all the parents are sampled in one
+batched call, reduced in one batched clustering step (Utils.scenario_reduction), or placed deterministically
+(Utils.quadrature, or the offline Markov-chain lattice of Utils.lattice), and the next level comes out as arrays, parent by parent and child by child. No Python loop
+runs over the nodes, so trees of 5-6 levels (hundreds to thousands of nodes) are built in a fraction of a second.
+
+The tree-based policies (SP_policy_30, Hybrid_policy_30, Two_stage) get the whole tree as a ScenarioTree, a
+structure of arrays with one entry per node (nodes numbered level by level, the root is node 0): parent index,
+depth tau, probability and exogenous values, plus the table of the ancestors of every node within the minimum
+up-time window of the ventilation. The MILP builders read the parent of a node, its values and its ancestors by
+index, without dictionaries of nodes nor walks up the tree. levels_to_nodes (or ScenarioTree.to_nodes) gives the
+usual list of node dictionaries (ids level by level, as the breadth-first builders).
+
+RollingTree keeps the tree of the previous hour: when the realized exogenous state is close to one of its tau=1
+children, the subtree of that child (which already covers the next L-1 hours) becomes the new tree and only the
+missing deepest level is grown, about B times less work than a full build (see RollingTree.get).
+"""
+
+import numpy as np
+
+from Utils.batch_processes import price_model_batch, next_occupancy_levels_batch, PRICE_STD, OCC1_STD, OCC2_STD
+from Utils.quadrature import quadrature_children
+from Utils.scenario_reduction import reduce_scenarios
+from Utils import timing, seeding
+
+LEVEL_FIELDS = ("parent", "price", "price_prev", "occ1", "occ2", "prob")
+ANCESTOR_WINDOW = 2 # ancestors kept per node: vent_min_up_time - 1 levels up (minimum up-time of 3 hours)
+STATE_SCALES = np.array([PRICE_STD, OCC1_STD, OCC2_STD]) # one-step noise of (price, Occ1, Occ2), unit of the reuse distance
+
+
+def root_level(state):
+    """Level 0: the current exogenous state, with probability 1."""
+    return {
+        "parent":     np.array([-1]),
+        "price":      np.array([state["price_t"]], dtype=float),
+        "price_prev": np.array([state["price_previous"]], dtype=float),
+        "occ1":       np.array([state["Occ1"]], dtype=float),
+        "occ2":       np.array([state["Occ2"]], dtype=float),
+        "prob":       np.array([1.0])
+    }
+
+
+def expand_level(level, B, N_samples=100, rng=None, generator="sampling", reduction="batch"):
+    """
+    Next level of the tree: B children for every node of the level.
+    Inputs:
+    - level: dictionary of arrays of the parents (see the module docstring)
+    - B: branching factor
+    - N_samples: raw samples per parent before the reduction (generator "sampling")
+    - rng: random stream of the samples (default: the stream of the current policy call, see Utils.seeding)
+    - generator: "sampling" (N_samples samples reduced by the reduction method), "quadrature" or "lattice" (deterministic)
+    - reduction: reduction method of Utils.scenario_reduction ("batch", "quantile" or "sklearn")
+    The level also holds the Wasserstein-1 distance of the reduction of every parent ("distance"), and its mean is
+    reported to Utils.timing as the metric "reduction_w1" of the decision.
+    """
+    parents = len(level["price"])
+
+    if generator == "quadrature":
+        child_prices, child_occ1s, child_occ2s, child_probs = quadrature_children(
+            level["price"], level["price_prev"], level["occ1"], level["occ2"], B
+        )
+        children = np.stack([child_prices, child_occ1s, child_occ2s], axis=2)
+        cluster_probs = np.broadcast_to(child_probs, (parents, B))
+        distances = np.full(parents, np.nan)
+    elif generator == "lattice":
+        from Utils.lattice import lattice_children # not at the top: Utils.lattice builds on this module
+        child_prices, child_occ1s, child_occ2s, cluster_probs = lattice_children(
+            level["price"], level["price_prev"], level["occ1"], level["occ2"], B
+        )
+        children = np.stack([child_prices, child_occ1s, child_occ2s], axis=2)
+        distances = np.full(parents, np.nan)
+    else:
+        rng = seeding.get_rng() if rng is None else rng
+        sample_prices = price_model_batch(level["price"], level["price_prev"], N_samples, rng)
+        sample_occ1s, sample_occ2s = next_occupancy_levels_batch(level["occ1"], level["occ2"], N_samples, rng)
+
+        with timing.phase("reduction"):
+            children, cluster_probs, distances = reduce_scenarios(np.stack([sample_prices, sample_occ1s, sample_occ2s], axis=2), B, reduction)
+        timing.add_metric("reduction_w1", distances.mean())
+
+    return {
+        "parent":     np.repeat(np.arange(parents), B),
+        "price":      children[:, :, 0].ravel(),
+        "price_prev": np.repeat(level["price"], B),
+        "occ1":       children[:, :, 1].ravel(),
+        "occ2":       children[:, :, 2].ravel(),
+        "prob":       (level["prob"][:, None] * cluster_probs).ravel(),  # chain rule
+        "distance":   distances
+    }
+
+
+def build_levels(state, L, B, N_samples=100, rng=None, generator="sampling", reduction="batch"):
+    """
+    Levels 0..L of the tree rooted at the current state (see expand_level for the arguments); levels 1..L hold the
+    reduction distances of their parents ("distance").
+    """
+    levels = [root_level(state)]
+    for _ in range(L):
+        levels.append(expand_level(levels[-1], B, N_samples, rng, generator, reduction))
+    return levels
+
+
+def nodes_to_level(nodes):
+    """Level of arrays of a list of node dictionaries of the same depth (the parent indices are not kept)."""
+    return {
+        "parent":     np.full(len(nodes), -1),
+        "price":      np.array([node["price"] for node in nodes], dtype=float),
+        "price_prev": np.array([node["price_prev"] for node in nodes], dtype=float),
+        "occ1":       np.array([node["occ1"] for node in nodes], dtype=float),
+        "occ2":       np.array([node["occ2"] for node in nodes], dtype=float),
+        "prob":       np.array([node["prob"] for node in nodes], dtype=float)
+    }
+
+
+def level_to_nodes(level, tau, first_id, parent_ids):
+    """Node dictionaries of a level, numbered from first_id; parent_ids maps the parent indices to node ids."""
+    parent_ids = np.asarray(parent_ids)[level["parent"]] if tau > 0 else [None]
+    return [
+        {
+            "id":         first_id + k,
+            "tau":        tau,
+            "parent_id":  None if parent_id is None else int(parent_id),
+            "price":      float(price),
+            "price_prev": float(price_prev),
+            "occ1":       float(occ1),
+            "occ2":       float(occ2),
+            "prob":       float(prob)
+        }
+        for k, (parent_id, price, price_prev, occ1, occ2, prob) in enumerate(zip(
+            parent_ids, level["price"], level["price_prev"], level["occ1"], level["occ2"], level["prob"]
+        ))
+    ]
+
+
+def levels_to_nodes(levels):
+    """List of node dictionaries of a tree given by its levels, with ids level by level."""
+    nodes = []
+    parent_ids = []
+    for tau, level in enumerate(levels):
+        level_nodes = level_to_nodes(level, tau, len(nodes), parent_ids)
+        nodes.extend(level_nodes)
+        parent_ids = [node["id"] for node in level_nodes]
+    return nodes
+
+
+def ancestor_table(parent, window):
+    """ancestors[k, d - 1] is the ancestor of node k d levels up, for d = 1..window (-1 above the root)."""
+    parent = np.asarray(parent)
+    ancestors = np.full((len(parent), window), -1)
+    up = parent
+    for d in range(window):
+        ancestors[:, d] = up
+        up = np.where(up >= 0, parent[np.maximum(up, 0)], -1)
+    return ancestors
+
+
+class ScenarioTree:
+    """
+    Scenario tree as a structure of arrays (see the module docstring). Attributes, one entry per node:
+
+        parent      index of the parent node (-1 for the root)
+        tau         depth of the node (0 for the root)
+        price, price_prev, occ1, occ2, prob   as in the levels
+        ancestors   ancestor table of shape (nodes, window), see ancestor_table
+    """
+
+    def __init__(self, parent, tau, price, price_prev, occ1, occ2, prob, window=ANCESTOR_WINDOW):
+        self.parent     = np.asarray(parent, dtype=int)
+        self.tau        = np.asarray(tau, dtype=int)
+        self.price      = np.asarray(price, dtype=float)
+        self.price_prev = np.asarray(price_prev, dtype=float)
+        self.occ1       = np.asarray(occ1, dtype=float)
+        self.occ2       = np.asarray(occ2, dtype=float)
+        self.prob       = np.asarray(prob, dtype=float)
+        self.ancestors  = ancestor_table(self.parent, window)
+
+    @classmethod
+    def from_levels(cls, levels, window=ANCESTOR_WINDOW):
+        """Tree of the given levels (level 0 is the root); the parent indices of a level refer to the previous one."""
+        offsets = np.cumsum([0] + [len(level["price"]) for level in levels])
+        return cls(
+            parent=np.concatenate([
+                level["parent"] + offsets[tau - 1] if tau > 0 else np.full(len(level["price"]), -1)
+                for tau, level in enumerate(levels)
+            ]),
+            tau=np.repeat(np.arange(len(levels)), np.diff(offsets)),
+            **{field: np.concatenate([level[field] for level in levels]) for field in LEVEL_FIELDS[1:]},
+            window=window
+        )
+
+    @classmethod
+    def from_nodes(cls, nodes, window=ANCESTOR_WINDOW):
+        """Tree of a list of node dictionaries with ids 0..n-1 (e.g. trees built by hand)."""
+        nodes = sorted(nodes, key=lambda node: node["id"])
+        return cls(
+            parent=[-1 if node["parent_id"] is None else node["parent_id"] for node in nodes],
+            tau=[node["tau"] for node in nodes],
+            **{field: [node[field] for node in nodes] for field in LEVEL_FIELDS[1:]},
+            window=window
+        )
+
+    def __len__(self):
+        return len(self.parent)
+
+    @property
+    def depth(self):
+        """Depth of the deepest level (0 for the root alone)."""
+        return int(self.tau.max())
+
+    @property
+    def future(self):
+        """Indices of the future nodes (tau >= 1), in order."""
+        return np.flatnonzero(self.tau >= 1)
+
+    def level(self, tau):
+        """Level of arrays of the nodes at depth tau (parent indices relative to level tau - 1)."""
+        members = np.flatnonzero(self.tau == tau)
+        first_parent = np.flatnonzero(self.tau == tau - 1)[0] if tau > 0 else 0
+        return {
+            "parent":     self.parent[members] - first_parent if tau > 0 else self.parent[members],
+            "price":      self.price[members],
+            "price_prev": self.price_prev[members],
+            "occ1":       self.occ1[members],
+            "occ2":       self.occ2[members],
+            "prob":       self.prob[members]
+        }
+
+    def extend(self, level):
+        """New tree with the level appended below the deepest level (its parent indices refer to that level)."""
+        first_parent = np.flatnonzero(self.tau == self.depth)[0]
+        return ScenarioTree(
+            parent=np.concatenate([self.parent, level["parent"] + first_parent]),
+            tau=np.concatenate([self.tau, np.full(len(level["price"]), self.depth + 1)]),
+            **{field: np.concatenate([getattr(self, field), level[field]]) for field in LEVEL_FIELDS[1:]},
+            window=self.ancestors.shape[1]
+        )
+
+    def prune(self, depth):
+        """Tree of the levels 0..depth (the nodes are numbered level by level, so this is a prefix of the arrays)."""
+        size = int((self.tau <= depth).sum())
+        return ScenarioTree(
+            self.parent[:size], self.tau[:size],
+            **{field: getattr(self, field)[:size] for field in LEVEL_FIELDS[1:]},
+            window=self.ancestors.shape[1]
+        )
+
+    def reroot(self, child, state):
+        """
+        Subtree of the tau=1 node child as a new tree rooted at the current state: the child becomes the root, its
+        descendants move one level up and their probabilities are divided by the probability of the child, so that
+        every level sums to 1 again. The subtree is then shifted from the values of the child to the exogenous values
+        of the state (Utils.tree_cache.shift_tree), so that the new tau=1 nodes have the realized price as price_prev
+        and every node follows the conditional means of the realized state.
+        """
+        from Utils.tree_cache import shift_tree # not at the top: Utils.tree_cache builds on this module
+
+        keep = np.zeros(len(self), dtype=bool)
+        keep[child] = True
+        for k in np.flatnonzero(self.tau >= 2): # parents come before their children
+            keep[k] = keep[self.parent[k]]
+
+        nodes = np.flatnonzero(keep)
+        new_index = np.full(len(self), -1)
+        new_index[nodes] = np.arange(len(nodes))
+
+        tree = ScenarioTree(
+            parent=np.where(nodes == child, -1, new_index[self.parent[nodes]]),
+            tau=self.tau[nodes] - 1,
+            price=self.price[nodes],
+            price_prev=self.price_prev[nodes],
+            occ1=self.occ1[nodes],
+            occ2=self.occ2[nodes],
+            prob=self.prob[nodes] / self.prob[child],
+            window=self.ancestors.shape[1]
+        )
+        return shift_tree(tree, state)
+
+    def to_nodes(self):
+        """List of node dictionaries of the tree."""
+        return [
+            {
+                "id":         k,
+                "tau":        int(self.tau[k]),
+                "parent_id":  None if self.parent[k] < 0 else int(self.parent[k]),
+                "price":      float(self.price[k]),
+                "price_prev": float(self.price_prev[k]),
+                "occ1":       float(self.occ1[k]),
+                "occ2":       float(self.occ2[k]),
+                "prob":       float(self.prob[k])
+            }
+            for k in range(len(self))
+        ]
+
+
+def as_tree(tree):
+    """ScenarioTree of a tree given either as a ScenarioTree or as a list of node dictionaries."""
+    return tree if isinstance(tree, ScenarioTree) else ScenarioTree.from_nodes(tree)
+
+
+def nearest_child(tree, state):
+    """
+    tau=1 child of the tree closest to the exogenous values of the state, and its distance: Euclidean distance on
+    (price, Occ1, Occ2) measured in one-step noise standard deviations (STATE_SCALES).
+    Returns (None, inf) for a tree without children.
+    """
+    children = np.flatnonzero(tree.tau == 1)
+    if len(children) == 0:
+        return None, np.inf
+    values = np.column_stack([tree.price[children], tree.occ1[children], tree.occ2[children]])
+    realized = np.array([state["price_t"], state["Occ1"], state["Occ2"]], dtype=float)
+    distances = np.sqrt((((values - realized) / STATE_SCALES) ** 2).sum(axis=1))
+    best = int(distances.argmin())
+    return int(children[best]), float(distances[best])
+
+
+class RollingTree:
+    """
+    Scenario tree kept from one policy call to the next (rolling horizon).
+
+    The tree of hour t-1 is reused at hour t when the state continues it (next hour, price_previous equal to the
+    price of its root, same branching factor) and the realized (price, Occ1, Occ2) is within max_distance noise
+    standard deviations of one of its tau=1 children (nearest_child): the tree is re-rooted at that child
+    (ScenarioTree.reroot) and deepened to L levels, or pruned when the horizon shrinks at the end of the day.
+    Otherwise the tree is rebuilt. The nodes below the reused child were generated from the values of the child and
+    are shifted to the realized state along the conditional means (as the trees of Utils.tree_cache), so what remains
+    of the approximation is that the reductions were made around the child, which max_distance bounds (1.5 is about
+    the median distance of a one-step move from the conditional mean, so with B = 3 roughly half of the hours reuse
+    the tree).
+    The counters reused and rebuilt give the share of calls served from the previous tree.
+    """
+
+    def __init__(self):
+        self.tree    = None
+        self.time    = None
+        self.B       = None
+        self.reused  = 0
+        self.rebuilt = 0
+
+    def reset(self):
+        self.tree, self.time, self.B = None, None, None
+
+    def _reusable(self, state, B, max_distance):
+        """Re-rooted previous tree if the state continues it and is close to one of its children, else None."""
+        if self.tree is None or self.B != B or state["current_time"] != self.time + 1:
+            return None
+        if not np.isclose(self.tree.price[0], state["price_previous"]):
+            return None
+        child, distance = nearest_child(self.tree, state)
+        if distance > max_distance:
+            return None
+        return self.tree.reroot(child, state)
+
+    def get(self, state, L, B, build, deepen, max_distance=1.5):
+        """
+        Scenario tree of L levels for the state.
+        Inputs:
+        - build: function () -> tree of L levels built from scratch (e.g. a call to build_tree)
+        - deepen: function tree -> tree with one more level (e.g. deepen_tree)
+        - max_distance: largest distance (in noise standard deviations) between the realized state and the nearest
+          child of the previous tree for the subtree of that child to be reused
+        """
+        tree = self._reusable(state, B, max_distance)
+
+        if tree is None:
+            tree = build()
+            self.rebuilt += 1
+        else:
+            while tree.depth < L:
+                tree = deepen(tree)
+            tree = tree.prune(L)
+            self.reused += 1
+
+        self.tree, self.time, self.B = tree, state["current_time"], B
+        return tree
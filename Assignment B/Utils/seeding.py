@@ -0,0 +1,66 @@
+"""
+Explicit random streams (np.random.Generator) derived from a master seed with SeedSequence.
+
+Every stream is addressed by a spawn key, exactly as the children of SeedSequence.spawn: the policy call at
+(day, hour) uses the stream SeedSequence(master_seed).spawn(...)[day].spawn(...)[hour], whatever the process,
+the worker count or the order in which the days are simulated. A parallel run is therefore bit-identical to
+a sequential run with the same master seed, and every policy sees the same random numbers for the same day
+and hour (common random numbers), so two policies can be compared day by day with paired statistics.
+
+Stochastic code gets its stream from get_rng(): inside a seeded policy call it is the Generator of that call,
+otherwise it is the global NumPy RNG (so np.random.seed keeps working for code that is not seeded here).
+get_call_key() gives the (master_seed, day, hour) of the current seeded call, under which inputs computed
+offline with the same stream can be looked up (see Utils.precompute).
+"""
+
+import numpy as np
+
+_call_rng = None
+_call_key = None
+
+
+def make_rng(master_seed, *spawn_key):
+    """Generator of the stream at spawn_key (e.g. (day, hour)) of the master seed."""
+    sequence = np.random.SeedSequence(master_seed, spawn_key=tuple(int(key) for key in spawn_key))
+    return np.random.default_rng(sequence)
+
+
+def new_master_seed():
+    """Fresh master seed from OS entropy (print it to be able to reproduce the run)."""
+    return int(np.random.SeedSequence().entropy)
+
+
+def get_rng():
+    """Stream of the current policy call, or the global NumPy RNG outside of seeded calls."""
+    return np.random if _call_rng is None else _call_rng
+
+
+def get_call_key():
+    """(master_seed, day, hour) of the current seeded policy call, or None outside of seeded calls."""
+    return _call_key
+
+
+def set_call_rng(rng):
+    """Sets the stream returned by get_rng (None to go back to the global NumPy RNG)."""
+    global _call_rng, _call_key
+    _call_rng = rng
+    _call_key = None # a stream set by hand is not the stream of a (day, hour)
+
+
+def get_state():
+    """State of the streams, to continue them in another process (see v2_Checks.SupervisedPolicy)."""
+    return np.random.get_state(), _call_rng, _call_key
+
+
+def set_state(state):
+    """Restores a state returned by get_state."""
+    global _call_rng, _call_key
+    global_state, _call_rng, _call_key = state
+    np.random.set_state(global_state)
+
+
+def seed_policy_call(master_seed, day, hour):
+    """Gives the policy call at the given day and hour its own stream."""
+    global _call_key
+    set_call_rng(make_rng(master_seed, day, hour))
+    _call_key = (int(master_seed), int(day), int(hour))
@@ -0,0 +1,43 @@
+"""
+Confidence intervals for the evaluation of policies.
+"""
+
+import numpy as np
+from scipy import stats
+
+
+def mean_confidence_interval(values, confidence=0.95):
+    """
+    Mean of the values and half-width of its confidence interval (Student's t).
+    Returns (mean, half_width); the half-width is inf with less than two values.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    mean = np.mean(values) if n > 0 else np.nan
+
+    if n < 2:
+        return mean, np.inf
+
+    standard_error = np.std(values, ddof=1) / np.sqrt(n)
+    half_width = stats.t.ppf(0.5 + confidence / 2, df=n - 1) * standard_error
+
+    return mean, half_width
+
+
+def paired_difference(costs_a, costs_b, confidence=0.95):
+    """
+    Paired comparison of two policies evaluated on the same days (and random streams).
+    Returns a dictionary with the mean of the daily differences costs_a - costs_b, its confidence interval
+    and the number of days; policy a is significantly cheaper when the whole interval is below 0.
+    """
+    differences = np.asarray(costs_a, dtype=float) - np.asarray(costs_b, dtype=float)
+    mean, half_width = mean_confidence_interval(differences, confidence)
+
+    return {
+        "mean_difference": mean,
+        "half_width": half_width,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "std_difference": np.std(differences, ddof=1) if len(differences) > 1 else np.nan,
+        "n_days": len(differences)
+    }
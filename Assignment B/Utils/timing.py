@@ -0,0 +1,212 @@
+"""
+Latency measurements of the policy calls.
+
+check_and_sanitize_action records the duration of every decision, together with the hour of the day and the
+number of active overrides of the state (check_and_sanitize_actions records a batch call as one decision per path:
+no decision of the batch is available before the call returns, so each of them has the latency of the whole call,
+while the phases are shared equally by the paths). Inside select_action, policies can report the time spent in their
+own phases with
+
+    with timing.phase("reduction"):
+        ...
+
+or with timing.add_phase(name, seconds) for phases measured by hand.
+Phases may be nested (e.g. "reduction" inside "tree"), and a phase entered several times in one decision is summed.
+Policies can also report quality measures of a decision with timing.add_metric(name, value) (e.g. the transport
+distance of the scenario reductions): a metric reported several times in one decision is averaged, and stored
+with the record (records_to_dataframe gives one "metric_<name>" column per metric).
+Outside of a timed decision (e.g. when a policy is called directly) the phases are not recorded.
+The records are kept per process: run_environment returns them with its results, so they can be merged
+across workers and saved next to the policy logs.
+"""
+
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+QUANTILES = {"p50": 50, "p95": 95, "p99": 99}
+
+_records = []
+_current_phases = None
+_current_metrics = None
+
+
+@contextmanager
+def phase(name):
+    """Adds the time spent in the block to the phase `name` of the decision being timed."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase(name, time.perf_counter() - t0)
+
+
+def add_phase(name, duration):
+    """Adds duration (in seconds) to the phase `name` of the decision being timed, for phases that are not a single block."""
+    if _current_phases is not None:
+        _current_phases[name] = _current_phases.get(name, 0.0) + duration
+
+
+def add_metric(name, value):
+    """Adds a value of the metric `name` to the decision being timed (the record keeps the mean of the values)."""
+    if _current_metrics is not None:
+        _current_metrics.setdefault(name, []).append(float(value))
+
+
+def start_decision():
+    """Starts collecting the phases and metrics of a new decision."""
+    global _current_phases, _current_metrics
+    _current_phases = {}
+    _current_metrics = {}
+
+
+def collect_phases():
+    """Returns the phases reported since start_decision (e.g. to send them to another process) and stops collecting."""
+    global _current_phases
+    phases, _current_phases = _current_phases or {}, None
+    return phases
+
+
+def collect_metrics():
+    """Returns the metric values reported since start_decision, {name: [values]}, and stops collecting."""
+    global _current_metrics
+    metrics, _current_metrics = _current_metrics or {}, None
+    return metrics
+
+
+def _decision_metrics():
+    """Mean of every metric reported in the decision being timed, and stops collecting."""
+    return {name: float(np.mean(values)) for name, values in collect_metrics().items()}
+
+
+def count_active_overrides(state):
+    """Number of low-temperature overrides and forced ventilation hours active in the state (0 to 3)."""
+    return int(bool(state["low_override_r1"])) + int(bool(state["low_override_r2"])) + int(0 < state["vent_counter"] < 3)
+
+
+def record_decision(policy_name, state, latency, status="ok"):
+    """Stores the latency of the decision started with start_decision, with the phases reported meanwhile."""
+    global _current_phases
+    _records.append({
+        "policy": policy_name,
+        "hour": int(state["current_time"]),
+        "active_overrides": count_active_overrides(state),
+        "latency": latency,
+        "status": status,
+        "phases": _current_phases or {},
+        "metrics": _decision_metrics()
+    })
+    _current_phases = None
+
+
+def batch_latencies(states, latency):
+    """Latency of every decision of a batch call of the given duration: the whole call, for every path."""
+    return np.full(len(states["T1"]), float(latency))
+
+
+def record_batch_decision(policy_name, states, latency, status="ok"):
+    """
+    Stores a batch decision (one decision per path, states being a dictionary of arrays) as one record per path,
+    in the format of record_decision: every path has the latency of the batch call (batch_latencies), and the phases
+    of the call are shared equally by the paths.
+    """
+    global _current_phases
+    num_paths = len(states["T1"])
+    latencies = batch_latencies(states, latency)
+    phases = {name: duration / num_paths for name, duration in (_current_phases or {}).items()}
+    metrics = _decision_metrics()
+    vent_counter = np.asarray(states["vent_counter"])
+    active_overrides = (
+        np.asarray(states["low_override_r1"]).astype(bool).astype(int)
+        + np.asarray(states["low_override_r2"]).astype(bool).astype(int)
+        + ((0 < vent_counter) & (vent_counter < 3)).astype(int)
+    )
+    hours = np.broadcast_to(states["current_time"], (num_paths,))
+
+    for hour, overrides, path_latency in zip(
+        hours.tolist(), np.broadcast_to(active_overrides, (num_paths,)).tolist(), latencies.tolist()
+    ):
+        _records.append({
+            "policy": policy_name,
+            "hour": int(hour),
+            "active_overrides": int(overrides),
+            "latency": path_latency,
+            "status": status,
+            "phases": dict(phases),
+            "metrics": dict(metrics)
+        })
+    _current_phases = None
+
+
+def pop_records():
+    """Returns the records of this process and clears them."""
+    global _records
+    records, _records = _records, []
+    return records
+
+
+def records_to_dataframe(records):
+    """
+    One row per decision, with one "phase_<name>" column per reported phase and one "metric_<name>" column per
+    reported metric (NaN when not reported).
+    """
+    return pd.DataFrame([
+        {
+            **{key: value for key, value in record.items() if key not in ("phases", "metrics")},
+            **{f"phase_{name}": duration for name, duration in record["phases"].items()},
+            **{f"metric_{name}": value for name, value in record.get("metrics", {}).items()}
+        }
+        for record in records
+    ])
+
+
+def latency_summary(records):
+    """
+    Latency distribution (count, mean, p50, p95, p99, max, in seconds) of the decisions and of each reported phase,
+    and the same statistics of each reported metric, per policy overall, per hour of the day and per number of
+    active overrides.
+    """
+    df = records_to_dataframe(records)
+    if df.empty:
+        return pd.DataFrame()
+
+    measures = ["latency"] + [column for column in df.columns if column.startswith(("phase_", "metric_"))]
+    rows = []
+    for group_by in [None, "hour", "active_overrides"]:
+        keys = ["policy"] if group_by is None else ["policy", group_by]
+        for key, group in df.groupby(keys):
+            for measure in measures:
+                values = group[measure].dropna().to_numpy()
+                if len(values) == 0:
+                    continue
+                rows.append({
+                    "policy": key[0],
+                    "group_by": group_by or "all",
+                    "group": "all" if group_by is None else key[1],
+                    "measure": measure,
+                    "count": len(values),
+                    "mean": values.mean(),
+                    **{name: np.percentile(values, q) for name, q in QUANTILES.items()},
+                    "max": values.max()
+                })
+
+    return pd.DataFrame(rows)
+
+
+def save_timings(records, log_path):
+    """
+    Saves the decision records and their summary next to the log file log_path
+    (<log>_timings.csv and <log>_latency.csv). Returns the summary.
+    """
+    log_path = Path(log_path)
+    summary = latency_summary(records)
+    if summary.empty:
+        return summary
+
+    records_to_dataframe(records).to_csv(log_path.with_name(f"{log_path.stem}_timings.csv"), index=False)
+    summary.to_csv(log_path.with_name(f"{log_path.stem}_latency.csv"), index=False)
+    print(f"Latencies saved to {log_path.with_name(log_path.stem + '_latency.csv')}")
+    return summary
@@ -0,0 +1,162 @@
+"""
+Bounded in-memory cache of scenario trees, keyed by the quantized exogenous state of the root.
+
+Training rollouts and live operation keep meeting similar roots (price, price_prev, Occ1, Occ2), and each of them
+costs a full sample-and-cluster tree build. TreeCache.get rounds the root to a grid of the given resolution
+(per component), builds the tree once at the center of the grid cell and returns, for every root of the cell,
+a copy of that tree shifted to the actual root:
+
+    price:      d[k] = 1.48 d[k-1] - 0.6 d[k-2]            (d[0], d[-1]: offsets of price_t and price_previous)
+    occupancy:  e[k] = [[0.65, 0.1], [0.1, 0.65]] e[k-1]    (e[0]: offsets of Occ1 and Occ2)
+
+a node of depth k moves by d[k] (its price), d[k-1] (its price_prev) and e[k] (its occupancies), clipped to the
+bounds of the processes. These are the derivatives of the conditional means of the process models (AR(2) price
+with momentum 0.6 and reversion 0.12, mean-reverting occupancies with reversion 0.25 and coupling 0.1).
+
+Error bound. The process models are linear in the state with additive noise and the reductions are equivariant
+to translations of the samples of a parent: moving every raw sample of the center tree by the offset of its depth
+gives samples of the actual root (up to the bounds and the negative-price redraw, which move a sample by less than
+the offset), and the shifted tree is the reduction of those samples with the same clusters. Every node is thus
+within the offset of its depth of the corresponding node of a tree of the actual root, and the offsets are bounded
+by the resolution: |d[k]| <= G_k * resolution_price / 2 and |e[k]| <= 0.75^k * resolution_occ / 2, with
+G = 1, 2.08, 2.48, 2.42, 2.10, 1.65, 1.18 for k = 0..6 (shift_bounds). With the default resolution (0.1 for the
+prices, 0.5 for the occupancies) no node moves by more than 0.13 in price and 0.25 in occupancy, well below the
+noise of one step (0.5, 3 and 2.5). A tree built from scratch at the actual root with the same draws is usually
+the shifted tree up to rounding, but rounding can move a sample at equal distance of two centers to the other
+cluster, and a few k-means runs end in another partition: on trees of L = 3, B = 2 over the whole state space,
+the Wasserstein-1 distance between the levels of the shifted tree and of the fresh tree is about 0.015 (price
+and occupancies), against 0.1 (price) and 0.6-1.2 (occupancies) between two fresh trees of different draws.
+
+The cache keeps at most maxsize trees and evicts the least recently used one; hits, misses and evictions are
+counted (stats).
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from Utils.batch_processes import (
+    PRICE_MOMENTUM, PRICE_REVERSION, PRICE_FLOOR, PRICE_CAP,
+    OCC_REVERSION, OCC_COUPLING, OCC1_BOUNDS, OCC2_BOUNDS
+)
+from Utils.scenario_tree import ScenarioTree
+
+PRICE_GAIN      = 1 + PRICE_MOMENTUM - PRICE_REVERSION           # 1.48, d next mean / d price_t
+PRICE_PREV_GAIN = -PRICE_MOMENTUM                                # -0.6, d next mean / d price_previous
+OCC_GAIN        = np.array([[1 - OCC_REVERSION - OCC_COUPLING, OCC_COUPLING],
+                            [OCC_COUPLING, 1 - OCC_REVERSION - OCC_COUPLING]]) # d next means / d (Occ1, Occ2)
+
+DEFAULT_RESOLUTION = (0.1, 0.1, 0.5, 0.5) # price_t, price_previous, Occ1, Occ2
+
+
+def root_values(state):
+    """Exogenous values of the root, in the order of the resolution."""
+    return np.array([state["price_t"], state["price_previous"], state["Occ1"], state["Occ2"]], dtype=float)
+
+
+def price_offsets(d0, d_prev, depth):
+    """Offsets d[-1], d[0], ..., d[depth] of the conditional mean of the price, as an array indexed by k + 1."""
+    offsets = [d_prev, d0]
+    for _ in range(depth):
+        offsets.append(PRICE_GAIN * offsets[-1] + PRICE_PREV_GAIN * offsets[-2])
+    return np.array(offsets)
+
+
+def occupancy_offsets(e0, depth):
+    """Offsets e[0], ..., e[depth] of the conditional means of (Occ1, Occ2), shape (depth + 1, 2)."""
+    offsets = [np.asarray(e0, dtype=float)]
+    for _ in range(depth):
+        offsets.append(OCC_GAIN @ offsets[-1])
+    return np.array(offsets)
+
+
+def shift_tree(tree, state):
+    """Copy of the ScenarioTree moved from its root to the exogenous values of the state (see the module docstring)."""
+    price, price_prev, occ1, occ2 = root_values(state)
+    d = price_offsets(price - tree.price[0], price_prev - tree.price_prev[0], tree.depth)
+    e = occupancy_offsets([occ1 - tree.occ1[0], occ2 - tree.occ2[0]], tree.depth)
+
+    shifted = ScenarioTree(
+        tree.parent.copy(), tree.tau.copy(),
+        price=np.clip(tree.price + d[tree.tau + 1], PRICE_FLOOR, PRICE_CAP),
+        price_prev=np.clip(tree.price_prev + d[tree.tau], PRICE_FLOOR, PRICE_CAP),
+        occ1=np.clip(tree.occ1 + e[tree.tau, 0], *OCC1_BOUNDS),
+        occ2=np.clip(tree.occ2 + e[tree.tau, 1], *OCC2_BOUNDS),
+        prob=tree.prob.copy(),
+        window=tree.ancestors.shape[1]
+    )
+
+    # the root is the state itself
+    shifted.price[0], shifted.price_prev[0], shifted.occ1[0], shifted.occ2[0] = price, price_prev, occ1, occ2
+    return shifted
+
+
+def shift_bounds(depth, resolution=DEFAULT_RESOLUTION):
+    """
+    Largest offsets of the price and of the occupancies at depths 0..depth for roots within half a cell of the
+    center, arrays of shape (depth + 1,): the bound on the approximation error of the cache (module docstring).
+    """
+    price_half, price_prev_half, occ1_half, occ2_half = np.asarray(resolution, dtype=float) / 2
+    # d[k] is linear in (d[0], d[-1]): its largest value is the sum of the absolute coefficients times the half-widths
+    price = np.abs(price_offsets(1.0, 0.0, depth)[1:]) * price_half + np.abs(price_offsets(0.0, 1.0, depth)[1:]) * price_prev_half
+    occupancy = np.abs(occupancy_offsets([1.0, 0.0], depth)) * occ1_half + np.abs(occupancy_offsets([0.0, 1.0], depth)) * occ2_half
+    return price, occupancy.max(axis=1)
+
+
+class TreeCache:
+    """LRU cache of scenario trees keyed by the quantized root, with hit/miss/eviction counters."""
+
+    def __init__(self):
+        self.trees     = OrderedDict()
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+    def clear(self):
+        self.trees.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        calls = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.trees),
+            "hit_rate": self.hits / calls if calls else 0.0
+        }
+
+    def get(self, state, L, B, build, settings=(), maxsize=1024, resolution=DEFAULT_RESOLUTION):
+        """
+        Scenario tree of the state, shifted from the cached tree of its grid cell.
+        Inputs:
+        - build: function root_state -> tree of L levels with branching B rooted at root_state (called on a miss,
+          with the center of the cell as root)
+        - settings: other arguments the tree depends on (samples, child generator, reduction), part of the key
+        - maxsize: largest number of trees kept (the least recently used one is evicted)
+        - resolution: size of the grid cells of (price_t, price_previous, Occ1, Occ2), a number or one per component
+        """
+        resolution = np.broadcast_to(np.asarray(resolution, dtype=float), (4,))
+        cell = np.round(root_values(state) / resolution)
+        key = (tuple(cell.astype(int).tolist()), L, B, tuple(settings))
+
+        tree = self.trees.get(key)
+        if tree is None:
+            self.misses += 1
+            price, price_prev, occ1, occ2 = cell * resolution
+            center = dict(state, price_t=price, price_previous=price_prev, Occ1=occ1, Occ2=occ2)
+            tree = build(center)
+            self.trees[key] = tree
+        else:
+            self.hits += 1
+            self.trees.move_to_end(key)
+
+        while len(self.trees) > maxsize:
+            self.trees.popitem(last=False)
+            self.evictions += 1
+
+        return shift_tree(tree, state)
+
+
+if __name__ == "__main__":
+    price_bounds, occupancy_bounds = shift_bounds(6)
+    print("Largest offsets with the default resolution", DEFAULT_RESOLUTION)
+    for k in range(7):
+        print(f"  depth {k}: price {price_bounds[k]:.3f}, occupancy {occupancy_bounds[k]:.3f}")
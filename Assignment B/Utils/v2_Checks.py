@@ -12,18 +12,148 @@ Created on Thu Nov 20 11:08:56 2025
 # ------------------------------------------------------------
 
 import time
+import multiprocessing
+from importlib import import_module
+
 import numpy as np
 
+from Utils import timing, seeding
+
 # ------------------------------------------------------------
 # Dummy safe action
 # ------------------------------------------------------------
 DUMMY_ACTION = {"HeatPowerRoom1": 0.0, "HeatPowerRoom2": 0.0, "VentilationON": 0}
 
+POLICY_TIME_LIMIT = 15.0 # seconds per decision
+
+
+# ------------------------------------------------------------
+# Supervised policy (hard timeout)
+# ------------------------------------------------------------
+class PolicyTimeout(Exception):
+    """Raised when a supervised policy call is preempted at the deadline."""
+
+
+def _policy_worker(policy_name, connection):
+    """Serves the select_action calls of a SupervisedPolicy in a separate process."""
+    policy = import_module(policy_name)
+    connection.send("ready")
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+
+        # The random streams travel with the call, so the policy draws the same samples as in the main process
+        state, random_state = message
+        seeding.set_state(random_state)
+        timing.start_decision()
+        try:
+            action, error = policy.select_action(state), None
+        except Exception as e:
+            action, error = None, str(e)
+
+        connection.send((action, error, seeding.get_state(), timing.collect_phases(), timing.collect_metrics()))
+
+
+class SupervisedPolicy:
+    """
+    Runs the select_action calls of a policy module in a reusable subprocess, and kills it when a call
+    exceeds time_limit, so a hanging solve costs at most time_limit seconds (instead of finishing and
+    being discarded afterwards). The worker is restarted right away in the background.
+    A preempted call raises PolicyTimeout; the number of preempted calls is kept in .timeouts.
+    A worker that dies during a call (segfault, out of memory, ...) is restarted as well, and the call
+    raises a RuntimeError; the number of such calls is kept in .crashes.
+
+    The worker is a spawned process that imports the policy module again: constants of the module changed
+    in the main process (e.g. by Sweep.py) do not reach it, it runs with the values of the source file.
+
+    Use it in place of the policy:  policy = SupervisedPolicy(SP_policy_30)  ...  policy.close()
+    """
+
+    def __init__(self, policy, time_limit=POLICY_TIME_LIMIT):
+        self.__name__    = policy.__name__
+        self.time_limit  = time_limit
+        self.timeouts    = 0
+        self.crashes     = 0
+        self._context    = multiprocessing.get_context("spawn")
+        self._start_worker()
+
+    def _start_worker(self):
+        self._connection, worker_connection = self._context.Pipe()
+        self._process = self._context.Process(target=_policy_worker, args=(self.__name__, worker_connection), daemon=True)
+        self._process.start()
+        worker_connection.close()
+        self._ready = False
+
+    def _restart_worker(self):
+        """Kills the worker (if it is still alive) and starts a new one."""
+        self._process.kill()
+        self._process.join()
+        self._connection.close()
+        self._start_worker()
+
+    def wait_until_ready(self):
+        """Waits until the worker has imported the policy (not part of the decision time)."""
+        if not self._ready:
+            try:
+                message = self._connection.recv()
+            except (EOFError, OSError):
+                message = None
+            if message != "ready":
+                raise RuntimeError(f"Worker of {self.__name__} failed to start")
+            self._ready = True
+
+    def select_action(self, state):
+        self.wait_until_ready()
+
+        try:
+            self._connection.send((state, seeding.get_state()))
+            answered = self._connection.poll(self.time_limit)
+            message = self._connection.recv() if answered else None
+        except (EOFError, BrokenPipeError, OSError):
+            # The worker died during the call: the next calls get a new one
+            self._process.join(timeout=1)
+            exit_code = self._process.exitcode
+            self.crashes += 1
+            self._restart_worker()
+            raise RuntimeError(f"worker of {self.__name__} died (exit code {exit_code})")
+
+        if not answered:
+            self.timeouts += 1
+            self._restart_worker()
+            raise PolicyTimeout(f"no decision after {self.time_limit:.1f}s")
+
+        action, error, random_state, phases, metrics = message
+        seeding.set_state(random_state)
+        for name, duration in phases.items():
+            timing.add_phase(name, duration)
+        for name, values in metrics.items():
+            for value in values:
+                timing.add_metric(name, value)
+
+        if error is not None:
+            raise RuntimeError(error)
+        return action
+
+    def close(self):
+        if self._process.is_alive():
+            try:
+                self._connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self._process.join(timeout=5)
+            if self._process.is_alive():
+                self._process.kill()
+        self._connection.close()
+
+
 def check_and_sanitize_action(policy, state, PowerMax):
     """
     Performs the following checks (as required by the assignment):
       1. Times the policy execution.
          If too long → ignore output and return dummy action.
+         (A SupervisedPolicy is preempted at the deadline instead of running to completion.)
       2. Ensures the policy returns valid numeric values.
       3. Clips the actions to the feasible bounds in PowerMax.
       4. Maps ventilation value to {0,1}.
@@ -41,20 +171,36 @@ def check_and_sanitize_action(policy, state, PowerMax):
     # ---------------------------------------
     # 1. Ask the policy & time it
     # ---------------------------------------
+    # A supervised policy restarting its worker (after a timeout) is not timed until the worker is ready
+    if isinstance(policy, SupervisedPolicy):
+        policy.wait_until_ready()
+
+    # The latency of every decision is recorded (see Utils.timing), including the ones replaced by the dummy action
+    policy_name = getattr(policy, "__name__", type(policy).__name__)
+    timing.start_decision()
     t0 = time.time()
     try:
         action = policy.select_action(state)
         elapsed = time.time() - t0
 
         # If policy is too slow → dummy
-        if elapsed > 15.0:
+        if elapsed > POLICY_TIME_LIMIT:
+            timing.record_decision(policy_name, state, elapsed, status="too slow")
             print(f"[WARNING] Policy too slow ({elapsed:.2f}s). Using dummy action.")
             return DUMMY_ACTION.copy()
 
+    except PolicyTimeout as e:
+        timing.record_decision(policy_name, state, time.time() - t0, status="timeout")
+        print(f"[WARNING] Policy preempted: {e}. Using dummy action.")
+        return DUMMY_ACTION.copy()
+
     except Exception as e:
+        timing.record_decision(policy_name, state, time.time() - t0, status="crashed")
         print(f"[WARNING] Policy crashed: {e}. Using dummy action.")
         return DUMMY_ACTION.copy()
 
+    timing.record_decision(policy_name, state, elapsed)
+
     
 
     # ---------------------------------------
@@ -80,3 +226,57 @@ def check_and_sanitize_action(policy, state, PowerMax):
     return {"HeatPowerRoom1": action["HeatPowerRoom1"], "HeatPowerRoom2": action["HeatPowerRoom2"], "VentilationON": action["VentilationON"]}
 
 
+def check_and_sanitize_actions(policy, states, PowerMax):
+    """
+    Batch version of check_and_sanitize_action, for policies exposing .select_actions(states).
+    The time limit is applied per decision: every decision of the batch waits for the whole call, so the slowest
+    of them (the call itself) must stay within POLICY_TIME_LIMIT.
+
+    Inputs:
+      - policy: object with .select_actions(states)
+      - states: dictionary of arrays (one entry per day)
+      - PowerMax: dictionary like {1: max_room1, 2: max_room2}
+
+    Returns:
+      A sanitized action dictionary of arrays {"HeatPowerRoom1": float array, "HeatPowerRoom2": float array, "VentilationON": int array}
+    """
+    num_days = len(states["T1"])
+    dummy_actions = {key: np.full(num_days, value) for key, value in DUMMY_ACTION.items()}
+
+    # The batch call is recorded as one decision per day, each with the latency of the whole call (see Utils.timing)
+    policy_name = getattr(policy, "__name__", type(policy).__name__)
+    timing.start_decision()
+    t0 = time.time()
+    try:
+        action = policy.select_actions(states)
+        elapsed = time.time() - t0
+
+        # If the slowest decision is too slow → dummy
+        if timing.batch_latencies(states, elapsed).max() > POLICY_TIME_LIMIT:
+            timing.record_batch_decision(policy_name, states, elapsed, status="too slow")
+            print(f"[WARNING] Policy too slow ({elapsed:.2f}s for {num_days} days). Using dummy actions.")
+            return dummy_actions
+
+    except Exception as e:
+        timing.record_batch_decision(policy_name, states, time.time() - t0, status="crashed")
+        print(f"[WARNING] Policy crashed: {e}. Using dummy actions.")
+        return dummy_actions
+
+    timing.record_batch_decision(policy_name, states, elapsed)
+
+    try:
+        p1 = np.broadcast_to(np.asarray(action["HeatPowerRoom1"], dtype=float), (num_days,))
+        p2 = np.broadcast_to(np.asarray(action["HeatPowerRoom2"], dtype=float), (num_days,))
+        v  = np.broadcast_to(np.asarray(action["VentilationON"], dtype=float), (num_days,))
+
+        return {
+            "HeatPowerRoom1": np.clip(p1, 0, PowerMax[1]),
+            "HeatPowerRoom2": np.clip(p2, 0, PowerMax[2]),
+            "VentilationON":  (v > 0.5).astype(int)
+        }
+
+    except Exception as e:
+        print(f"[WARNING] Action clipping failed: {e}. Using dummy actions.")
+        return dummy_actions
+
+
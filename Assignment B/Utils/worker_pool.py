@@ -0,0 +1,77 @@
+"""
+Long-lived, pre-warmed process pool for policy evaluation.
+
+Creating a ProcessPoolExecutor for every evaluation means that every worker imports pyomo, sklearn and the
+policy modules again (which load their weights and the system characteristics at import), maps the data and
+starts the solver environment, which dominates short evaluations. get_pool returns a pool that is created once
+per session and reused by every later call (and by every policy): its initializer preloads the requested
+policies, the dataset and the solver in each worker. Policies that were not preloaded are imported by the
+workers on their first job and stay loaded. The pool is shut down at exit, or explicitly with shutdown_pool.
+"""
+
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+
+from Utils import dataset
+
+_pool = None
+_pool_workers = None
+
+
+def _warm_up_solver():
+    """Starts the Gurobi environment (license check included) by solving a tiny model."""
+    try:
+        from pyomo.environ import ConcreteModel, Var, Objective, NonNegativeReals, SolverFactory
+        model = ConcreteModel()
+        model.x = Var(within=NonNegativeReals)
+        model.obj = Objective(expr=model.x)
+        SolverFactory("gurobi").solve(model, options={"OutputFlag": 0})
+    except Exception as e:
+        print(f"[WARNING] Solver warm-up failed: {e}")
+
+
+def initialize_worker(policy_names=(), scenario_directory=None):
+    """Initializer of the pool workers: imports the policies and maps the data once per worker (kept by Utils.dataset)."""
+    for policy_name in policy_names:
+        import_module(policy_name)
+
+    if scenario_directory is None:
+        dataset.load_dataset()
+        dataset.load_matrix("results/OIH_daily_costs.csv", skip_header=0)
+    else:
+        dataset.load_generated_dataset(scenario_directory)
+
+    _warm_up_solver()
+
+
+def get_pool(n_workers, policy_names=(), scenario_directory=None):
+    """
+    Returns the shared pool of the session, creating it (with n_workers pre-warmed workers) on the first call.
+    A call asking for a different number of workers replaces the pool.
+    """
+    global _pool, _pool_workers
+
+    if _pool is None or _pool_workers != n_workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=initialize_worker,
+            initargs=(tuple(policy_names), scenario_directory)
+        )
+        _pool_workers = n_workers
+
+    return _pool
+
+
+def shutdown_pool():
+    """Stops the workers of the shared pool (a later get_pool starts a new one)."""
+    global _pool, _pool_workers
+
+    if _pool is not None:
+        _pool.shutdown()
+    _pool = None
+    _pool_workers = None
+
+
+atexit.register(shutdown_pool)
@@ -1,8 +1,11 @@
 from Policies import SP_policy_30, SP_policy_30, ADP_policy_30, DUMMY_policy_30, Two_stage, Hybrid_policy_30
-from Environment import run_environment
+from Environment import run_environment, run_environment_batch, merge_results
+from Utils.checkpoint import clear_checkpoint, load_run_metadata
+from Utils.timing import save_timings
+from Utils.worker_pool import get_pool
+from Utils import seeding
 from importlib import import_module
 
-from concurrent.futures import ProcessPoolExecutor
 from itertools import repeat
 import numpy as np
 import time
@@ -11,27 +14,25 @@ import os
 
 
 def save_results_to_csv(results, policy_name):
-    rows = []
-    for day_entry in results["logs"]:
-        day = day_entry["day"]
-        log = day_entry["log"]
-        for i in range(len(log["hour"])):
-            rows.append({
-                "Day": day,
-                "Hour": log["hour"][i],
-                "Price": log["price"][i],
-                "Occupancy_R1": log["occ1"][i],
-                "Occupancy_R2": log["occ2"][i],
-                "Temp_Room1": log["T1"][i],
-                "Temp_Room2": log["T2"][i],
-                "Power_Heater1": log["P1"][i],
-                "Power_Heater2": log["P2"][i],
-                "Ventilation_On": log["V"][i],
-                "Humidity": log["H"][i],
-                "cost" : log["cost"][i]
-            })
-
-    df = pd.DataFrame(rows)
+    days = np.asarray(results["days"])
+    logs = results["logs"]
+    num_days, num_hours = logs["cost"].shape
+
+    # The (days, hours) log arrays are flattened row by row, i.e. one row per day and hour
+    df = pd.DataFrame({
+        "Day": np.repeat(days, num_hours),
+        "Hour": np.tile(np.arange(num_hours), num_days),
+        "Price": logs["price"].ravel(),
+        "Occupancy_R1": logs["occ1"].ravel(),
+        "Occupancy_R2": logs["occ2"].ravel(),
+        "Temp_Room1": logs["T1"].ravel(),
+        "Temp_Room2": logs["T2"].ravel(),
+        "Power_Heater1": logs["P1"].ravel(),
+        "Power_Heater2": logs["P2"].ravel(),
+        "Ventilation_On": logs["V"].ravel(),
+        "Humidity": logs["H"].ravel(),
+        "cost" : logs["cost"].ravel()
+    })
 
     # Determine filename with version if necessary
     base_name = policy_name[9:] + "_logs"
@@ -45,6 +46,9 @@ def save_results_to_csv(results, policy_name):
     df.to_csv(saving_path, index=False)
     print(f"\nLogs saved to {saving_path}")
 
+    # Latency of the policy calls, next to the logs
+    save_timings(results.get("timings", []), saving_path)
+
 
 def import_policy_module(policy_name):
     if isinstance(policy_name, str):
@@ -52,48 +56,47 @@ def import_policy_module(policy_name):
     return policy_name
 
 
-def run_environment_with_policy_name(policy_name, start, end, plot=False):
+def run_environment_with_policy_name(policy_name, start, end, plot=False, checkpoint_dir=None, scenario_directory=None, seed=None, hard_timeout=False):
     policy_module = import_policy_module(policy_name)
-    return run_environment(policy_module, start, end, plot)
+    return run_environment(policy_module, start, end, plot, checkpoint_dir, scenario_directory, seed, hard_timeout)
+
+
+def run_environment_in_parallel(policy, n_experiments, n_workers, checkpoint_dir=None, scenario_directory=None, seed=None, hard_timeout=False, batch_size=1):
+    # Days are handed out in batches of batch_size days to whichever worker is free, instead of one fixed chunk per
+    # worker, so uneven day times and the remainder of the split do not leave the other workers idle at the end.
+    day_ranges = [(start, min(start + batch_size, n_experiments)) for start in range(0, n_experiments, batch_size)]
 
+    # Every policy call draws from the stream of its (day, hour) under a single master seed (see Utils.seeding),
+    # so the run does not depend on the number of workers and can be reproduced sequentially with that seed.
+    # Without a seed, a new master seed is drawn and printed (the workers never share the global random state),
+    # unlike sequential runs, which then draw from the global state (a resumed run keeps the seed of its checkpoint)
+    if seed is None:
+        recorded = load_run_metadata(checkpoint_dir) if checkpoint_dir else None
+        seed = recorded["seed"] if recorded and recorded["seed"] is not None else seeding.new_master_seed()
+        print(f"Master seed: {seed}")
 
-def run_environment_in_parallel(policy, n_experiments, n_workers):    
-    # Calculate chunk size for each worker
-    chunk_size = n_experiments // n_workers
-    day_ranges = [(i * chunk_size, (i + 1) * chunk_size) for i in range(n_workers)]
-    
-    # Handle any remaining days (if N_EXPERIMENTS not divisible by n_workers)
-    if n_experiments % n_workers != 0:
-        day_ranges[-1] = (day_ranges[-1][0], n_experiments)
-    
-    print(f"Day ranges for each worker: {day_ranges}")
+    print(f"{len(day_ranges)} batches of up to {batch_size} day(s) for {n_workers} workers")
 
     # Runs environment in parallel with workers handling different day ranges
+    # (the pool is kept alive and reused by later calls, also with other policies)
     policy_name = policy.__name__ if hasattr(policy, '__name__') else str(policy)
-    with ProcessPoolExecutor(max_workers=n_workers) as executor:
-        results = list(
-            executor.map(
-                run_environment_with_policy_name,
-                repeat(policy_name),
-                [start for start, end in day_ranges],
-                [end for start, end in day_ranges]
-            )
+    executor = get_pool(n_workers, [policy_name], scenario_directory)
+    results = list(
+        executor.map(
+            run_environment_with_policy_name,
+            repeat(policy_name),
+            [start for start, end in day_ranges],
+            [end for start, end in day_ranges],
+            repeat(False),
+            repeat(checkpoint_dir),
+            repeat(scenario_directory),
+            repeat(seed),
+            repeat(hard_timeout)
         )
+    )
 
-    # Combine results from all workers (each worker processed a chunk of days)
-    all_objectives = []
-    all_logs = []
-
-    for avg_value, worker_result in results:
-        all_objectives.extend(worker_result["objectives"])
-        all_logs.extend(worker_result["logs"])
-
-    avg_objective_value = np.mean(all_objectives)
-
-    return avg_objective_value, {
-        "objectives": all_objectives,
-        "logs": all_logs
-    }
+    # Combine results from all batches (executor.map returns them in day order)
+    return merge_results([worker_result for avg_value, worker_result in results])
 
 
 # Variables to set before running the environment:
@@ -101,7 +104,13 @@ POLICY          = Hybrid_policy_30
 N_EXPERIMENTS   = 100
 PLOT_RESULTS    = False
 RUN_IN_PARALLEL = False
+RUN_IN_BATCH    = False # simulates all days at once (policies can expose select_actions(states) to decide for all days in one call)
 N_WORKERS       = 8
+DAYS_PER_JOB    = 1 # days handed to a free worker at a time in parallel runs
+CHECKPOINT_DIR  = f"Checkpoints/{POLICY.__name__[9:]}" # completed days are saved here, so a crashed run resumes where it stopped, with the same settings (None to disable)
+HARD_TIMEOUT    = False # runs the policy in a subprocess that is killed when a decision exceeds the time limit
+SEED            = None # master seed of the random streams of the policies (None: sequential runs use the global random state, parallel runs always draw a new master seed and print it)
+SCENARIO_DIR    = None # e.g. "Data/Generated/" to evaluate on days generated by Utils.scenario_generator instead of the 100 fixed days
 
 
 if __name__ == "__main__":
@@ -114,16 +123,35 @@ if __name__ == "__main__":
         avg_objective_value, results = run_environment_in_parallel(
             policy=POLICY,
             n_experiments=N_EXPERIMENTS,
-            n_workers=N_WORKERS
+            n_workers=N_WORKERS,
+            checkpoint_dir=CHECKPOINT_DIR,
+            scenario_directory=SCENARIO_DIR,
+            seed=SEED,
+            hard_timeout=HARD_TIMEOUT,
+            batch_size=DAYS_PER_JOB
         )   
 
+    elif RUN_IN_BATCH:
+        print("Running all days in batch")
+        avg_objective_value, results = run_environment_batch(
+            policy=POLICY,
+            start=0,
+            end=N_EXPERIMENTS,
+            plot=PLOT_RESULTS,
+            scenario_directory=SCENARIO_DIR
+        )
+
     else:
         print("Running sequentially")
         avg_objective_value, results = run_environment(
             policy=POLICY,
             start=0,
             end=N_EXPERIMENTS,
-            plot=PLOT_RESULTS
+            plot=PLOT_RESULTS,
+            checkpoint_dir=CHECKPOINT_DIR,
+            scenario_directory=SCENARIO_DIR,
+            seed=SEED,
+            hard_timeout=HARD_TIMEOUT
         )
 
 
@@ -144,3 +172,7 @@ if __name__ == "__main__":
     # Save logs and objectives to a file for later analysis
     save_results_to_csv(results, POLICY.__name__)
 
+    # The logs are saved, the checkpoint of this run is not needed anymore
+    if CHECKPOINT_DIR:
+        clear_checkpoint(CHECKPOINT_DIR)
+
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from Utils.PriceProcessRestaurant import price_model
+from Utils.OccupancyProcessRestaurant import next_occupancy_levels
+from Utils.batch_processes import price_model_batch, next_occupancy_levels_batch
+
+
+@pytest.mark.parametrize("price, price_prev", [(4.0, 3.5), (0.4, 1.0), (11.5, 10.0)])
+def test_price_model_batch_matches_price_model(price, price_prev):
+    np.random.seed(1)
+    n = 20000
+    scalar = np.array([price_model(price, price_prev) for _ in range(n)])
+    batch = price_model_batch(price, price_prev, n, np.random.default_rng(1))
+
+    assert batch.shape == (n,)
+    assert batch.mean() == pytest.approx(scalar.mean(), abs=0.02)
+    assert batch.std() == pytest.approx(scalar.std(), abs=0.02)
+    assert batch.min() >= 0 and batch.max() <= 12
+
+
+def test_next_occupancy_levels_batch_matches_next_occupancy_levels():
+    np.random.seed(1)
+    n = 20000
+    scalar = np.array([next_occupancy_levels(48.0, 12.0) for _ in range(n)])
+    occ1, occ2 = next_occupancy_levels_batch(np.array([48.0]), np.array([12.0]), n, np.random.default_rng(1))
+
+    assert occ1.shape == occ2.shape == (1, n)
+    for batch, column in ((occ1[0], scalar[:, 0]), (occ2[0], scalar[:, 1])):
+        assert batch.mean() == pytest.approx(column.mean(), abs=0.1)
+        assert batch.std() == pytest.approx(column.std(), abs=0.1)
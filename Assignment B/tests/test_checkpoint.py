@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from Environment import run_environment
+from Policies import DUMMY_policy_30
+from Utils.checkpoint import append_day, load_checkpoint
+
+
+def test_resumed_run_matches_an_uninterrupted_run(tmp_path):
+    _, reference = run_environment(DUMMY_policy_30, 0, 4, seed=1)
+
+    run_environment(DUMMY_policy_30, 0, 2, checkpoint_dir=tmp_path, seed=1) # "crashes" after day 1
+    assert sorted(load_checkpoint(tmp_path)) == [0, 1]
+
+    _, resumed = run_environment(DUMMY_policy_30, 0, 4, checkpoint_dir=tmp_path, seed=1)
+    np.testing.assert_array_equal(resumed["days"], reference["days"])
+    np.testing.assert_allclose(resumed["objectives"], reference["objectives"], rtol=1e-12)
+    for field, values in reference["logs"].items():
+        np.testing.assert_allclose(resumed["logs"][field], values, rtol=1e-12, err_msg=field)
+
+    # only the days simulated again were timed
+    assert len(resumed["timings"]) == 2 * len(reference["timings"]) // 4
+    assert sorted(load_checkpoint(tmp_path)) == [0, 1, 2, 3]
+
+
+def test_resuming_with_other_settings_raises(tmp_path):
+    run_environment(DUMMY_policy_30, 0, 1, checkpoint_dir=tmp_path, seed=1)
+    with pytest.raises(ValueError):
+        run_environment(DUMMY_policy_30, 0, 2, checkpoint_dir=tmp_path, seed=2)
+
+
+def test_line_cut_by_a_crash_is_skipped(tmp_path):
+    path = tmp_path / "days_0_3.jsonl"
+    append_day(path, 0, 10.0, {"cost": np.ones(3)})
+    with open(path, "a") as f:
+        f.write('{"day": 1, "objective": 1') # crash in the middle of a write
+    append_day(path, 2, 12.0, {"cost": np.zeros(3)})
+
+    completed = load_checkpoint(tmp_path)
+    assert sorted(completed) == [0, 2]
+    assert completed[2][0] == 12.0
+    assert completed[0][1]["cost"] == [1.0, 1.0, 1.0]
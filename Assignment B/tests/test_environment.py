@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from Environment import LOG_FIELDS, RestaurantEnvironment, run_environment, run_environment_batch
+from Policies import DUMMY_policy_30
+
+DAYS = (0, 10)
+
+
+@pytest.fixture(scope="module")
+def scalar_run():
+    return run_environment(DUMMY_policy_30, *DAYS)
+
+
+def test_batch_run_matches_scalar_run(scalar_run):
+    scalar_average, scalar = scalar_run
+    batch_average, batch = run_environment_batch(DUMMY_policy_30, *DAYS)
+
+    assert batch_average == pytest.approx(scalar_average)
+    np.testing.assert_array_equal(batch["days"], scalar["days"])
+    np.testing.assert_allclose(batch["objectives"], scalar["objectives"], rtol=1e-12)
+    for field in LOG_FIELDS:
+        np.testing.assert_allclose(batch["logs"][field], scalar["logs"][field], rtol=1e-12, err_msg=field)
+
+
+def test_step_wise_environment_matches_scalar_run(scalar_run):
+    _, scalar = scalar_run
+    env = RestaurantEnvironment()
+
+    for i, day in enumerate(scalar["days"]):
+        env.reset(day=day)
+        done = False
+        while not done:
+            _, _, done = env.step(env.select_action(DUMMY_policy_30))
+        assert env.objective_value == pytest.approx(scalar["objectives"][i], rel=1e-12)
+
+
+def test_step_after_the_last_hour_raises():
+    env = RestaurantEnvironment()
+    with pytest.raises(RuntimeError):
+        env.step(DUMMY_policy_30.select_action(env.state()))
+
+    env.reset(day=0)
+    done = False
+    while not done:
+        _, _, done = env.step(env.select_action(DUMMY_policy_30))
+    cost = env.objective_value
+    with pytest.raises(RuntimeError):
+        env.step(env.select_action(DUMMY_policy_30))
+    assert env.objective_value == cost
+
+
+def test_restore_resumes_a_finished_episode_snapshot():
+    env = RestaurantEnvironment()
+    env.reset(day=1)
+    snapshot = env.snapshot()
+    done = False
+    while not done:
+        _, _, done = env.step(env.select_action(DUMMY_policy_30))
+    cost = env.objective_value
+
+    env.restore(snapshot)
+    done = False
+    while not done:
+        _, _, done = env.step(env.select_action(DUMMY_policy_30))
+    assert env.objective_value == pytest.approx(cost)
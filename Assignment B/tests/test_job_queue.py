@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from Utils import job_queue
+
+
+def make_jobs(n):
+    return [{"job_id": f"job_{k}", "day": k} for k in range(n)]
+
+
+def age(spool_dir, job_id, seconds):
+    path = spool_dir / "running" / f"{job_id}.json"
+    status = path.stat()
+    os.utime(path, (status.st_atime - seconds, status.st_mtime - seconds))
+
+
+def test_each_job_is_claimed_once(tmp_path):
+    assert job_queue.submit_jobs(tmp_path, make_jobs(3)) == 3
+    assert job_queue.submit_jobs(tmp_path, make_jobs(3)) == 0 # already pending
+
+    claimed = [job_queue.claim_job(tmp_path) for _ in range(3)]
+    assert [job["job_id"] for job in claimed] == ["job_0", "job_1", "job_2"]
+    assert all(job["attempts"] == 1 for job in claimed)
+    assert job_queue.claim_job(tmp_path) is None
+    assert job_queue.count_jobs(tmp_path) == {"pending": 0, "running": 3, "done": 0, "failed": 0}
+
+    job_queue.complete_job(tmp_path, "job_1", {"objective": 1.5})
+    assert job_queue.load_result(tmp_path, "job_1") == {"objective": 1.5}
+    assert job_queue.submit_jobs(tmp_path, make_jobs(3)) == 0 # running or done
+    assert job_queue.count_jobs(tmp_path)["done"] == 1
+
+
+def test_stale_jobs_are_requeued_and_claimed_again(tmp_path):
+    job_queue.submit_jobs(tmp_path, make_jobs(2))
+    job_queue.claim_job(tmp_path)
+    job_queue.claim_job(tmp_path)
+    age(tmp_path, "job_0", 120)
+
+    assert job_queue.requeue_stale_jobs(tmp_path, timeout=60) == ["job_0"]
+    assert job_queue.count_jobs(tmp_path) == {"pending": 1, "running": 1, "done": 0, "failed": 0}
+
+    job = job_queue.claim_job(tmp_path)
+    assert job["job_id"] == "job_0"
+    assert job["attempts"] == 2
+    assert job_queue.requeue_stale_jobs(tmp_path, timeout=60) == [] # the claim restarts the heartbeat
+
+
+def test_requeued_job_finished_meanwhile_is_not_claimed(tmp_path):
+    job_queue.submit_jobs(tmp_path, make_jobs(1))
+    job_queue.claim_job(tmp_path)
+    age(tmp_path, "job_0", 120)
+    job_queue.requeue_stale_jobs(tmp_path, timeout=60)
+    job_queue.complete_job(tmp_path, "job_0", {"objective": 2.0}) # the first worker was only slow
+
+    assert job_queue.claim_job(tmp_path) is None
+    assert job_queue.count_jobs(tmp_path) == {"pending": 0, "running": 0, "done": 1, "failed": 0}
+
+
+def test_job_is_failed_after_max_attempts(tmp_path):
+    job_queue.submit_jobs(tmp_path, make_jobs(1))
+    for _ in range(2):
+        job_queue.claim_job(tmp_path, max_attempts=2)
+        age(tmp_path, "job_0", 120)
+        job_queue.requeue_stale_jobs(tmp_path, timeout=60)
+
+    assert job_queue.claim_job(tmp_path, max_attempts=2) is None
+    record = job_queue.load_result(tmp_path, "job_0", subdirectory="failed")
+    assert record["attempts"] == 2
+    assert "2 attempts" in record["error"]
+    assert job_queue.count_jobs(tmp_path) == {"pending": 0, "running": 0, "done": 0, "failed": 1}
+
+
+def test_failed_job_keeps_the_error(tmp_path):
+    job_queue.submit_jobs(tmp_path, make_jobs(1))
+    job = job_queue.claim_job(tmp_path)
+    job_queue.fail_job(tmp_path, job, "Traceback: ZeroDivisionError")
+
+    record = job_queue.load_result(tmp_path, "job_0", subdirectory="failed")
+    assert record["error"] == "Traceback: ZeroDivisionError"
+    assert job_queue.load_result(tmp_path, "job_0") is None
+    assert job_queue.count_jobs(tmp_path)["running"] == 0
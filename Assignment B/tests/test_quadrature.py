@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from Utils.PriceProcessRestaurant import price_model
+from Utils.OccupancyProcessRestaurant import next_occupancy_levels
+from Utils.quadrature import moment_design, price_moments, occupancy_moments, quadrature_children
+
+# parents away from the bounds, so that clipping does not move the children
+PRICES      = np.array([2.0, 4.0, 6.5, 9.0])
+PRICES_PREV = np.array([2.5, 3.5, 6.0, 9.5])
+OCC1        = np.array([30.0, 35.0, 38.0, 33.0])
+OCC2        = np.array([20.0, 25.0, 22.0, 18.0])
+
+
+def weighted_moments(children, weights):
+    mean = children @ weights
+    std = np.sqrt(((children - mean[:, None]) ** 2) @ weights)
+    return mean, std
+
+
+@pytest.mark.parametrize("B", range(1, 11))
+def test_design_is_standardized_and_symmetric(B):
+    design, weights = moment_design(B)
+    assert design.shape == (B, 3)
+    assert weights.sum() == pytest.approx(1.0)
+    np.testing.assert_allclose(weights @ design, 0.0, atol=1e-12)
+    np.testing.assert_allclose(weights @ design ** 3, 0.0, atol=1e-12)
+    covariance = (design * weights[:, None]).T @ design
+    np.testing.assert_allclose(np.diag(covariance), 0.0 if B == 1 else 1.0, atol=1e-12)
+    if B >= 4:
+        np.testing.assert_allclose(covariance, np.eye(3), atol=1e-12)
+
+
+@pytest.mark.parametrize("B", [2, 3, 4, 5, 9])
+def test_children_match_closed_form_moments(B):
+    prices, occ1s, occ2s, weights = quadrature_children(PRICES, PRICES_PREV, OCC1, OCC2, B)
+
+    price_mean, price_std = price_moments(PRICES, PRICES_PREV)
+    mean1, std1, mean2, std2 = occupancy_moments(OCC1, OCC2)
+
+    for children, mean, std in ((prices, price_mean, price_std), (occ1s, mean1, std1), (occ2s, mean2, std2)):
+        child_mean, child_std = weighted_moments(children, weights)
+        np.testing.assert_allclose(child_mean, mean, rtol=1e-10)
+        np.testing.assert_allclose(child_std, std, rtol=1e-10)
+
+
+def test_closed_form_moments_match_process_models():
+    np.random.seed(0)
+    n = 20000
+    for price, price_prev in ((4.0, 3.5), (0.4, 1.0)): # the second one often goes below 0 and is redrawn
+        draws = np.array([price_model(price, price_prev) for _ in range(n)])
+        mean, std = price_moments(price, price_prev)
+        assert draws.mean() == pytest.approx(mean, abs=4 * std / np.sqrt(n))
+        assert draws.std() == pytest.approx(std, rel=0.03)
+
+    draws = np.array([next_occupancy_levels(45.0, 12.0) for _ in range(n)])
+    mean1, std1, mean2, std2 = occupancy_moments(45.0, 12.0)
+    assert draws[:, 0].mean() == pytest.approx(mean1, abs=4 * std1 / np.sqrt(n))
+    assert draws[:, 1].mean() == pytest.approx(mean2, abs=4 * std2 / np.sqrt(n))
+    assert draws[:, 0].std() == pytest.approx(std1, rel=0.03)
+    assert draws[:, 1].std() == pytest.approx(std2, rel=0.03)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from Utils.batch_processes import price_model_batch, next_occupancy_levels_batch
+from Utils.scenario_reduction import REDUCTION_METHODS, reduce_scenarios
+
+
+@pytest.fixture(scope="module")
+def samples():
+    rng = np.random.default_rng(0)
+    parents, N = 6, 200
+    prices, prices_prev = rng.uniform(2, 8, parents), rng.uniform(2, 8, parents)
+    occ1, occ2 = rng.uniform(25, 35, parents), rng.uniform(15, 25, parents)
+    return np.stack([
+        price_model_batch(prices, prices_prev, N, rng),
+        *next_occupancy_levels_batch(occ1, occ2, N, rng)
+    ], axis=2)
+
+
+@pytest.mark.parametrize("method", REDUCTION_METHODS)
+@pytest.mark.parametrize("B", [1, 3, 5])
+def test_reduced_probabilities_sum_to_one(samples, method, B):
+    centers, probs, distances = reduce_scenarios(samples, B, method)
+    parents, _, features = samples.shape
+
+    assert centers.shape == (parents, B, features)
+    assert probs.shape == (parents, B)
+    assert distances.shape == (parents,)
+    assert (probs >= 0).all()
+    np.testing.assert_allclose(probs.sum(axis=1), 1.0, rtol=1e-12)
+    assert (distances >= 0).all()
+
+
+@pytest.mark.parametrize("method", REDUCTION_METHODS)
+def test_reduced_centers_keep_the_sample_mean(samples, method):
+    centers, probs, _ = reduce_scenarios(samples, 4, method)
+    np.testing.assert_allclose(np.einsum("pb,pbf->pf", probs, centers), samples.mean(axis=1), rtol=1e-6)
+
+
+def test_unknown_method_raises(samples):
+    with pytest.raises(ValueError):
+        reduce_scenarios(samples, 3, "unknown")
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from Utils.scenario_tree import LEVEL_FIELDS, ScenarioTree, build_levels
+
+ROOT = {"price_t": 5.0, "price_previous": 4.5, "Occ1": 30.0, "Occ2": 20.0}
+L, B = 3, 3
+
+
+@pytest.fixture(scope="module")
+def tree():
+    return ScenarioTree.from_levels(build_levels(ROOT, L, B, N_samples=50, rng=np.random.default_rng(7)))
+
+
+def assert_same_tree(a, b):
+    np.testing.assert_array_equal(a.parent, b.parent)
+    np.testing.assert_array_equal(a.tau, b.tau)
+    np.testing.assert_array_equal(a.ancestors, b.ancestors)
+    for field in LEVEL_FIELDS[1:]:
+        np.testing.assert_allclose(getattr(a, field), getattr(b, field), rtol=1e-12, err_msg=field)
+
+
+def test_levels_hold_the_reduction_distances():
+    levels = build_levels(ROOT, L, B, N_samples=50, rng=np.random.default_rng(7))
+    for tau in range(1, L + 1):
+        assert levels[tau]["distance"].shape == (B ** (tau - 1),)
+        assert (levels[tau]["distance"] > 0).all()
+    assert np.isnan(build_levels(ROOT, 1, B, generator="quadrature")[1]["distance"]).all()
+
+
+def test_nodes_round_trip(tree):
+    nodes = tree.to_nodes()
+    assert len(nodes) == sum(B ** tau for tau in range(L + 1))
+    assert nodes[0]["parent_id"] is None
+    assert_same_tree(ScenarioTree.from_nodes(nodes), tree)
+    assert_same_tree(ScenarioTree.from_nodes(nodes[::-1]), tree) # any order of the ids
+
+
+def test_every_level_sums_to_one(tree):
+    for tau in range(L + 1):
+        assert tree.prob[tree.tau == tau].sum() == pytest.approx(1.0)
+
+
+def test_reroot_at_the_child_keeps_its_subtree(tree):
+    child = int(np.flatnonzero(tree.tau == 1)[1])
+    state = {
+        "price_t": tree.price[child], "price_previous": tree.price_prev[child],
+        "Occ1": tree.occ1[child], "Occ2": tree.occ2[child]
+    }
+    subtree = tree.reroot(child, state)
+
+    assert len(subtree) == sum(B ** tau for tau in range(L))
+    assert subtree.depth == L - 1
+    assert subtree.parent[0] == -1 and subtree.prob[0] == pytest.approx(1.0)
+    for tau in range(L):
+        assert subtree.prob[subtree.tau == tau].sum() == pytest.approx(1.0)
+
+    # the descendants of the child, in order, with unchanged values
+    grandchildren = np.flatnonzero(tree.parent == child)
+    np.testing.assert_allclose(subtree.price[subtree.tau == 1], tree.price[grandchildren], rtol=1e-12)
+    np.testing.assert_allclose(subtree.occ1[subtree.tau == 1], tree.occ1[grandchildren], rtol=1e-12)
+    np.testing.assert_array_equal(subtree.parent[subtree.tau == 1], 0)
+
+
+def test_reroot_moves_the_subtree_to_the_realized_state(tree):
+    child = int(np.flatnonzero(tree.tau == 1)[0])
+    state = {
+        "price_t": tree.price[child] + 0.3, "price_previous": tree.price_prev[child],
+        "Occ1": tree.occ1[child] - 1.0, "Occ2": tree.occ2[child] + 0.5
+    }
+    subtree = tree.reroot(child, state)
+
+    assert subtree.price[0] == pytest.approx(state["price_t"])
+    assert subtree.occ1[0] == pytest.approx(state["Occ1"])
+    assert subtree.occ2[0] == pytest.approx(state["Occ2"])
+    np.testing.assert_allclose(subtree.price_prev[subtree.tau == 1], state["price_t"])
+    for tau in range(L):
+        assert subtree.prob[subtree.tau == tau].sum() == pytest.approx(1.0)
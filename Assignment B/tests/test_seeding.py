@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from Environment import run_environment
+from Policies import Two_stage # draws its scenarios from the stream of every call
+from Utils.worker_pool import shutdown_pool
+
+SEED = 7
+NUM_DAYS = 2
+
+
+@pytest.fixture(scope="module")
+def sequential_run():
+    return run_environment(Two_stage, 0, NUM_DAYS, seed=SEED)
+
+
+def test_seeded_sequential_runs_are_reproducible(sequential_run):
+    _, first = sequential_run
+    _, second = run_environment(Two_stage, 0, NUM_DAYS, seed=SEED)
+    np.testing.assert_array_equal(second["objectives"], first["objectives"])
+
+
+def test_other_seed_gives_other_decisions(sequential_run):
+    _, first = sequential_run
+    _, other = run_environment(Two_stage, 0, 1, seed=SEED + 1)
+    assert other["objectives"][0] != first["objectives"][0]
+
+
+def test_seeded_run_does_not_depend_on_the_previous_days(sequential_run):
+    _, full = sequential_run
+    _, last_day = run_environment(Two_stage, NUM_DAYS - 1, NUM_DAYS, seed=SEED)
+    assert last_day["objectives"][0] == full["objectives"][-1]
+
+
+def test_seeded_parallel_run_matches_sequential_run(sequential_run):
+    from main import run_environment_in_parallel # imports every policy
+
+    _, sequential = sequential_run
+    try:
+        _, parallel = run_environment_in_parallel(Two_stage, NUM_DAYS, n_workers=2, seed=SEED)
+    finally:
+        shutdown_pool()
+
+    np.testing.assert_array_equal(parallel["days"], sequential["days"])
+    np.testing.assert_array_equal(parallel["objectives"], sequential["objectives"])
+    for field, values in sequential["logs"].items():
+        np.testing.assert_array_equal(parallel["logs"][field], values, err_msg=field)
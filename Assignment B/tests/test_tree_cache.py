@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from Utils.scenario_tree import ScenarioTree, build_levels
+from Utils.tree_cache import TreeCache
+
+
+def state(price, occ1=30.0):
+    return {"price_t": price, "price_previous": 4.0, "Occ1": occ1, "Occ2": 20.0}
+
+
+class CountingBuilder:
+    def __init__(self):
+        self.roots = []
+
+    def __call__(self, root):
+        self.roots.append(root)
+        return ScenarioTree.from_levels(build_levels(root, 2, 2, generator="quadrature"))
+
+
+def test_least_recently_used_tree_is_evicted():
+    cache, build = TreeCache(), CountingBuilder()
+    a, b, c = state(3.0), state(5.0), state(7.0)
+
+    cache.get(a, 2, 2, build, maxsize=2)
+    cache.get(b, 2, 2, build, maxsize=2)
+    cache.get(a, 2, 2, build, maxsize=2) # hit: b is now the least recently used
+    cache.get(c, 2, 2, build, maxsize=2) # evicts b
+    assert cache.stats() == {"hits": 1, "misses": 3, "evictions": 1, "size": 2, "hit_rate": 0.25}
+
+    cache.get(a, 2, 2, build, maxsize=2) # still cached
+    cache.get(b, 2, 2, build, maxsize=2) # built again, evicts c
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["evictions"] == 2
+    assert len(build.roots) == 4
+
+
+def test_roots_of_a_cell_share_a_tree_shifted_to_the_root():
+    cache, build = TreeCache(), CountingBuilder()
+    first = cache.get(state(5.01, 30.1), 2, 2, build)
+    second = cache.get(state(4.99, 29.9), 2, 2, build)
+
+    assert len(build.roots) == 1
+    assert build.roots[0]["price_t"] == pytest.approx(5.0)
+    assert (first.price[0], first.occ1[0]) == (5.01, 30.1)
+    assert (second.price[0], second.occ1[0]) == (4.99, 29.9)
+    np.testing.assert_allclose(first.prob, second.prob)
+
+
+def test_settings_are_part_of_the_key():
+    cache, build = TreeCache(), CountingBuilder()
+    cache.get(state(5.0), 2, 2, build, settings=(100, "batch"))
+    cache.get(state(5.0), 2, 2, build, settings=(100, "sklearn"))
+    cache.get(state(5.0), 2, 3, build, settings=(100, "batch"))
+    assert cache.stats()["misses"] == 3
+
+    cache.clear()
+    assert cache.stats() == {"hits": 0, "misses": 0, "evictions": 0, "size": 0, "hit_rate": 0.0}